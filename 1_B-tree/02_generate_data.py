@@ -13,47 +13,50 @@ from faker import Faker
 import random
 from datetime import datetime, timedelta
 from database_config import DB_CONFIG
-from utils import get_db_connection
+from utils import get_db_connection, progress_interval, reference_now, scaled
+from load_phases import finalize_load, prepare_load
+from sharding import load_tables_parallel
+from value_pools import pool_sampler
 
-def generate_users_data(num_records):
+def generate_users_data(num_records, start=0):
     """Генерация данных пользователей"""
     fake = Faker()
-    users = []
+    progress = progress_interval()
+    user_name = pool_sampler('user_name')
+    email = pool_sampler('email')
     
     # Определяем диапазон дат
-    end_date = datetime.now()
+    end_date = reference_now()
     start_date_5y = end_date - timedelta(days=5*365)
     start_date_1y = end_date - timedelta(days=365)
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         user = (
-            fake.user_name()[:50],
-            fake.email()[:100],
+            user_name()[:50],
+            email()[:100],
             random.randint(18, 80),  # возраст
             round(random.uniform(30000, 150000), 2),  # зарплата
             fake.date_between(start_date=start_date_5y, end_date=end_date),  # дата создания
             fake.date_time_between(start_date=start_date_1y, end_date=end_date),  # последний вход
             random.choice([True, False])  # активность
         )
-        users.append(user)
+        yield user
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} пользователей")
-    
-    return users
 
-def generate_orders_data(num_records, max_user_id):
+def generate_orders_data(num_records, max_user_id, start=0):
     """Генерация данных заказов"""
     fake = Faker()
-    orders = []
+    progress = progress_interval()
     statuses = ['pending', 'completed', 'shipped', 'cancelled']
     categories = ['electronics', 'books', 'clothing', 'home', 'sports']
     
     # Диапазон дат для заказов
-    end_date = datetime.now()
+    end_date = reference_now()
     start_date_2y = end_date - timedelta(days=2*365)
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         order = (
             random.randint(1, max_user_id),  # user_id
             fake.date_between(start_date=start_date_2y, end_date=end_date),  # order_date
@@ -61,12 +64,26 @@ def generate_orders_data(num_records, max_user_id):
             random.choice(statuses),  # status
             random.choice(categories)  # product_category
         )
-        orders.append(order)
+        yield order
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} заказов")
-    
-    return orders
+
+def load_tasks():
+    """Таблицы исследования: параметры load_tables_parallel для каждой таблицы"""
+    # user_id заказов - в диапазоне id пользователей (SERIAL в новой схеме)
+    num_users = scaled(100000)
+    return [
+        # Генерация пользователей
+        {'title': 'пользователей', 'table': 'users',
+         'columns': ['username', 'email', 'age', 'salary', 'created_date', 'last_login', 'is_active'],
+         'generator': generate_users_data, 'num_records': num_users},
+        # Генерация заказов
+        {'title': 'заказов', 'table': 'orders',
+         'columns': ['user_id', 'order_date', 'amount', 'status', 'product_category'],
+         'generator': generate_orders_data, 'num_records': scaled(200000),
+         'args': (num_users,)}
+    ]
 
 def main():
     config = DB_CONFIG.copy()
@@ -80,42 +97,13 @@ def main():
         
         print("Генерация данных для B-tree индексов...")
         
-        # Генерация пользователей
-        print("Генерация 100,000 пользователей...")
-        users_data = generate_users_data(100000)
-        
-        print("Вставка пользователей в БД...")
-        users_sql = """
-            INSERT INTO users (username, email, age, salary, created_date, last_login, is_active) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        batch_size = 1000
-        for i in range(0, len(users_data), batch_size):
-            batch = users_data[i:i + batch_size]
-            cursor.executemany(users_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} пользователей")
-        
-        # Получаем максимальный ID пользователя
-        cursor.execute("SELECT MAX(id) FROM users")
-        max_user_id = cursor.fetchone()[0]
-        
-        # Генерация заказов
-        print("Генерация 200,000 заказов...")
-        orders_data = generate_orders_data(200000, max_user_id)
+        # Подготовка таблиц к загрузке (в режиме phased - UNLOGGED без PK/UNIQUE)
+        phases = prepare_load(conn)
         
-        print("Вставка заказов в БД...")
-        orders_sql = """
-            INSERT INTO orders (user_id, order_date, amount, status, product_category) 
-            VALUES (%s, %s, %s, %s, %s)
-        """
+        load_tables_parallel(conn, load_tasks())
         
-        for i in range(0, len(orders_data), batch_size):
-            batch = orders_data[i:i + batch_size]
-            cursor.executemany(orders_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} заказов")
+        # Ограничения, ANALYZE и возврат в LOGGED; время каждой фазы
+        finalize_load(conn, phases)
         
         print("Данные успешно сгенерированы!")
         
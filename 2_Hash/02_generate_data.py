@@ -14,64 +14,63 @@ import random
 import hashlib
 from datetime import datetime, timedelta
 from database_config import DB_CONFIG
-from utils import get_db_connection
+from utils import get_db_connection, bulk_load, progress_interval, reference_now, scaled
+from load_phases import finalize_load, prepare_load
+from sharding import load_tables_parallel
+from unique_keys import unique_codes
+from value_pools import pool_sampler
 
-def generate_products_data(num_records):
+def generate_products_data(num_records, start=0):
     """Генерация данных продуктов"""
     fake = Faker()
-    products = []
+    progress = progress_interval()
+    company = pool_sampler('company')
     categories = ['electronics', 'books', 'clothing', 'home', 'sports', 'beauty', 'toys', 'food']
     
-    # Создаем набор уникальных кодов продуктов
-    product_codes = set()
-    while len(product_codes) < num_records:
-        product_codes.add(f"PROD{random.randint(100000, 999999)}")
+    # Уникальные коды продуктов по номеру строки
+    product_code = unique_codes('hash_product_code', 6, 'PROD')
     
-    product_codes = list(product_codes)
-    
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         product = (
-            product_codes[i],
-            fake.company()[:100],
+            product_code(i),
+            company()[:100],
             random.choice(categories),
             round(random.uniform(1, 1000), 2),
             random.randint(1, 1000),  # supplier_id
             random.choice([True, False])  # in_stock
         )
-        products.append(product)
+        yield product
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} продуктов")
-    
-    return products
 
-def generate_sessions_data(num_records, max_user_id):
+def generate_sessions_data(num_records, max_user_id, start=0):
     """Генерация данных сессий"""
     fake = Faker()
-    sessions = []
+    progress = progress_interval()
+    ipv4 = pool_sampler('ipv4')
+    user_agent = pool_sampler('user_agent')
     
     # Диапазоны дат
-    end_date = datetime.now()
+    end_date = reference_now()
     start_date_30d = end_date - timedelta(days=30)
     future_date_30d = end_date + timedelta(days=30)
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         session_id = hashlib.sha256(f"{i}{fake.uuid4()}".encode()).hexdigest()
         session = (
             session_id,
             random.randint(1, max_user_id),
             fake.date_time_between(start_date=start_date_30d, end_date=end_date),
             fake.date_time_between(start_date=end_date, end_date=future_date_30d),
-            fake.ipv4(),
-            fake.user_agent(),
+            ipv4(),
+            user_agent(),
             random.choice([True, False])
         )
-        sessions.append(session)
+        yield session
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} сессий")
-    
-    return sessions
 
 def generate_config_data():
     """Генерация конфигурационных данных"""
@@ -94,6 +93,20 @@ def generate_config_data():
     ]
     return configs
 
+def load_tasks():
+    """Таблицы исследования: параметры load_tables_parallel для каждой таблицы"""
+    return [
+        # Генерация продуктов
+        {'title': 'продуктов', 'table': 'products',
+         'columns': ['product_code', 'name', 'category', 'price', 'supplier_id', 'in_stock'],
+         'generator': generate_products_data, 'num_records': scaled(50000)},
+        # Генерация сессий
+        {'title': 'сессий', 'table': 'user_sessions',
+         'columns': ['session_id', 'user_id', 'created_at', 'expires_at', 'ip_address', 'user_agent', 'is_valid'],
+         'generator': generate_sessions_data, 'num_records': scaled(100000),
+         'args': (scaled(50000),)}
+    ]
+
 def main():
     config = DB_CONFIG.copy()
     
@@ -106,45 +119,18 @@ def main():
         
         print("Генерация данных для Hash индексов...")
         
-        # Генерация продуктов
-        print("Генерация 50,000 продуктов...")
-        products_data = generate_products_data(50000)
-        
-        print("Вставка продуктов в БД...")
-        products_sql = """
-            INSERT INTO products (product_code, name, category, price, supplier_id, in_stock) 
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """
+        # Подготовка таблиц к загрузке (в режиме phased - UNLOGGED без PK/UNIQUE)
+        phases = prepare_load(conn)
         
-        batch_size = 1000
-        for i in range(0, len(products_data), batch_size):
-            batch = products_data[i:i + batch_size]
-            cursor.executemany(products_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} продуктов")
-        
-        # Генерация сессий
-        print("Генерация 100,000 сессий...")
-        sessions_data = generate_sessions_data(100000, 50000)
-        
-        print("Вставка сессий в БД...")
-        sessions_sql = """
-            INSERT INTO user_sessions (session_id, user_id, created_at, expires_at, ip_address, user_agent, is_valid) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        for i in range(0, len(sessions_data), batch_size):
-            batch = sessions_data[i:i + batch_size]
-            cursor.executemany(sessions_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} сессий")
+        load_tables_parallel(conn, load_tasks())
         
         # Вставка конфигурации
         print("Вставка конфигурационных данных...")
         config_data = generate_config_data()
-        config_sql = "INSERT INTO config (config_key, config_value) VALUES (%s, %s)"
-        cursor.executemany(config_sql, config_data)
-        conn.commit()
+        bulk_load(conn, 'config', ['config_key', 'config_value'], config_data)
+        
+        # Ограничения, ANALYZE и возврат в LOGGED; время каждой фазы
+        finalize_load(conn, phases)
         
         print("Данные успешно сгенерированы!")
         
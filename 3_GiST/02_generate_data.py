@@ -13,20 +13,26 @@ from faker import Faker
 import random
 from datetime import datetime, timedelta
 from database_config import DB_CONFIG
-from utils import get_db_connection
+from utils import get_db_connection, progress_interval, reference_now, scaled
+from load_phases import finalize_load, prepare_load
+from sharding import load_tables_parallel
+from value_pools import pool_sampler
 
-def generate_documents_data(num_records):
+# Вектор полнотекстового поиска: заполняется после загрузки, в копиях shared/ingest.py - триггером
+SEARCH_VECTOR = "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(content, ''))"
+
+def generate_documents_data(num_records, start=0):
     """Генерация документов для полнотекстового поиска"""
     fake = Faker()
-    documents = []
+    progress = progress_interval()
     tags_pool = ['technology', 'science', 'health', 'education', 'business', 
                  'entertainment', 'sports', 'politics', 'travel', 'food']
     
     # Определяем диапазон дат
-    end_date = datetime.now()
+    end_date = reference_now()
     start_date_5y = end_date - timedelta(days=5*365)
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         # Генерируем контент разной длины
         content_paragraphs = []
         for _ in range(random.randint(3, 8)):
@@ -45,27 +51,25 @@ def generate_documents_data(num_records):
             fake.date_between(start_date=start_date_5y, end_date=end_date),  # publication_date
             tags  # tags array
         )
-        documents.append(document)
+        yield document
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} документов")
-    
-    return documents
 
-def generate_events_data(num_records):
+def generate_events_data(num_records, start=0):
     """Генерация событий с временными диапазонами"""
     fake = Faker()
-    events = []
+    progress = progress_interval()
     event_types = ['conference', 'meeting', 'workshop', 'seminar', 'exhibition', 
                    'concert', 'festival', 'sports_event', 'webinar', 'training']
     cities = ['Moscow', 'Saint Petersburg', 'Novosibirsk', 'Yekaterinburg', 'Kazan']
     
     # Диапазон дат для событий
-    end_date = datetime.now()
+    end_date = reference_now()
     start_date_1y = end_date - timedelta(days=365)
     future_date_1y = end_date + timedelta(days=365)
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         start_date = fake.date_time_between(start_date=start_date_1y, end_date=future_date_1y)
         duration_hours = random.randint(1, 72)  # от 1 часа до 3 дней
         end_date_event = start_date + timedelta(hours=duration_hours)
@@ -77,17 +81,17 @@ def generate_events_data(num_records):
             random.randint(10, 1000),
             fake.text()[:500]
         )
-        events.append(event)
+        yield event
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} событий")
-    
-    return events
 
-def generate_network_devices_data(num_records):
+def generate_network_devices_data(num_records, start=0):
     """Генерация данных сетевых устройств"""
     fake = Faker()
-    devices = []
+    progress = progress_interval()
+    word = pool_sampler('word')
+    city = pool_sampler('city')
     statuses = ['active', 'inactive', 'maintenance', 'offline']
     
     # Базовые сети для генерации IP
@@ -99,7 +103,7 @@ def generate_network_devices_data(num_records):
         '10.10.0.0/16'
     ]
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         base_network = random.choice(base_networks)
         ip_parts = base_network.split('.')
         ip_suffix = random.randint(1, 254)
@@ -110,23 +114,22 @@ def generate_network_devices_data(num_records):
             ip_range = f"{ip_parts[0]}.{ip_parts[1]}.{random.randint(0, 255)}.{ip_suffix}"
         
         device = (
-            f"{fake.word().capitalize()}-{fake.word().capitalize()}-{random.randint(1000, 9999)}",
+            f"{word().capitalize()}-{word().capitalize()}-{random.randint(1000, 9999)}",
             ip_range,
             fake.mac_address(),
-            fake.city(),
+            city(),
             random.choice(statuses)
         )
-        devices.append(device)
+        yield device
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} сетевых устройств")
-    
-    return devices
 
-def generate_simple_locations_data(num_records):
+def generate_simple_locations_data(num_records, start=0):
     """Генерация простых геоданных (без PostGIS)"""
     fake = Faker()
-    locations = []
+    progress = progress_interval()
+    company = pool_sampler('company')
     categories = ['restaurant', 'hotel', 'museum', 'park', 'shop', 'hospital', 'school', 'office']
     cities = ['Moscow', 'Saint Petersburg', 'Novosibirsk', 'Yekaterinburg', 'Kazan']
     
@@ -139,7 +142,7 @@ def generate_simple_locations_data(num_records):
         'Kazan': (55.7963, 49.1089)
     }
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         city = random.choice(cities)
         base_x, base_y = city_coordinates[city]
         
@@ -148,19 +151,39 @@ def generate_simple_locations_data(num_records):
         y = base_y + random.uniform(-0.5, 0.5)
         
         location = (
-            fake.company()[:100],
+            company()[:100],
             x,  # x_coord
             y,  # y_coord
             fake.address(),
             city,
             random.choice(categories)
         )
-        locations.append(location)
+        yield location
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} простых локаций")
-    
-    return locations
+
+def load_tasks():
+    """Таблицы исследования: параметры load_tables_parallel для каждой таблицы"""
+    return [
+        # Генерация документов (ОСНОВНОЙ ТЕСТ)
+        {'title': 'документов', 'table': 'documents',
+         'columns': ['title', 'content', 'author', 'publication_date', 'tags'],
+         'generator': generate_documents_data, 'num_records': scaled(40000),
+         'computed': {'search_vector': SEARCH_VECTOR}},
+        # Генерация событий
+        {'title': 'событий', 'table': 'events',
+         'columns': ['event_name', 'event_period', 'location', 'max_participants', 'description'],
+         'generator': generate_events_data, 'num_records': scaled(25000)},
+        # Генерация сетевых устройств
+        {'title': 'сетевых устройств', 'table': 'network_devices',
+         'columns': ['device_name', 'ip_range', 'mac_address', 'location', 'status'],
+         'generator': generate_network_devices_data, 'num_records': scaled(20000)},
+        # Генерация простых локаций
+        {'title': 'простых локаций', 'table': 'simple_locations',
+         'columns': ['name', 'x_coord', 'y_coord', 'address', 'city', 'category'],
+         'generator': generate_simple_locations_data, 'num_records': scaled(15000)}
+    ]
 
 def main():
     config = DB_CONFIG.copy()
@@ -174,80 +197,23 @@ def main():
         
         print("Генерация данных для GiST индексов...")
         
-        # Генерация документов (ОСНОВНОЙ ТЕСТ)
-        print("Генерация 40,000 документов...")
-        documents_data = generate_documents_data(40000)
-        
-        print("Вставка документов в БД...")
-        documents_sql = """
-            INSERT INTO documents (title, content, author, publication_date, tags) 
-            VALUES (%s, %s, %s, %s, %s)
-        """
+        # Подготовка таблиц к загрузке (в режиме phased - UNLOGGED без PK/UNIQUE)
+        phases = prepare_load(conn)
         
-        batch_size = 1000
-        for i in range(0, len(documents_data), batch_size):
-            batch = documents_data[i:i + batch_size]
-            cursor.executemany(documents_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} документов")
-        
-        # Генерация событий
-        print("Генерация 25,000 событий...")
-        events_data = generate_events_data(25000)
-        
-        print("Вставка событий в БД...")
-        events_sql = """
-            INSERT INTO events (event_name, event_period, location, max_participants, description) 
-            VALUES (%s, %s, %s, %s, %s)
-        """
-        
-        for i in range(0, len(events_data), batch_size):
-            batch = events_data[i:i + batch_size]
-            cursor.executemany(events_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} событий")
-        
-        # Генерация сетевых устройств
-        print("Генерация 20,000 сетевых устройств...")
-        devices_data = generate_network_devices_data(20000)
-        
-        print("Вставка сетевых устройств в БД...")
-        devices_sql = """
-            INSERT INTO network_devices (device_name, ip_range, mac_address, location, status) 
-            VALUES (%s, %s, %s, %s, %s)
-        """
-        
-        for i in range(0, len(devices_data), batch_size):
-            batch = devices_data[i:i + batch_size]
-            cursor.executemany(devices_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} сетевых устройств")
-        
-        # Генерация простых локаций
-        print("Генерация 15,000 простых локаций...")
-        locations_data = generate_simple_locations_data(15000)
-        
-        print("Вставка простых локаций в БД...")
-        locations_sql = """
-            INSERT INTO simple_locations (name, x_coord, y_coord, address, city, category) 
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        
-        for i in range(0, len(locations_data), batch_size):
-            batch = locations_data[i:i + batch_size]
-            cursor.executemany(locations_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} простых локаций")
+        load_tables_parallel(conn, load_tasks())
         
         # Обновляем search_vector для полнотекстового поиска
         print("Обновление search_vector для полнотекстового поиска...")
-        cursor.execute("""
+        cursor.execute(f"""
             UPDATE documents 
-            SET search_vector = to_tsvector('english', coalesce(title, '') || ' ' || coalesce(content, ''))
+            SET search_vector = {SEARCH_VECTOR}
             WHERE search_vector IS NULL
         """)
         conn.commit()
         
+        # Ограничения, ANALYZE и возврат в LOGGED; время каждой фазы
+        finalize_load(conn, phases)
+        
         print("Данные успешно сгенерированы!")
         
     except Exception as e:
@@ -14,38 +14,60 @@ import random
 import json
 from datetime import datetime, timedelta
 from database_config import DB_CONFIG
-from utils import get_db_connection
+from utils import get_db_connection, progress_interval, reference_now, scaled
+from load_phases import finalize_load, prepare_load
+from sharding import load_tables_parallel
+from value_pools import load_pool, pool_sampler
+from vectorized import np, choice, concat, fmt_int
 
-def generate_spatial_data(num_records):
+def generate_spatial_data(num_records, start=0):
     """Генерация пространственных данных (точки)"""
     fake = Faker()
-    spatial_data = []
+    progress = progress_interval()
+    word = pool_sampler('word')
     object_types = ['building', 'tree', 'vehicle', 'person', 'sensor', 'landmark', 'station']
     
     # Генерируем точки в пределах заданной области
     min_x, max_x = 0, 1000  # X координаты
     min_y, max_y = 0, 1000  # Y координаты
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         x = random.uniform(min_x, max_x)
         y = random.uniform(min_y, max_y)
         
         record = (
-            fake.word().capitalize() + ' ' + fake.word().capitalize(),
+            word().capitalize() + ' ' + word().capitalize(),
             f'({x},{y})',  # POINT format
             random.choice(object_types)
         )
-        spatial_data.append(record)
+        yield record
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} пространственных записей")
+
+def _word_pool():
+    """Пул слов Faker с заглавной буквы для векторной генерации названий"""
+    return np.char.capitalize(np.array(load_pool('word')))
+
+def generate_spatial_block(rng, count, start):
+    """Векторная генерация блока пространственных данных (NumPy)"""
+    words = _word_pool()
+    object_types = ['building', 'tree', 'vehicle', 'person', 'sensor', 'landmark', 'station']
     
-    return spatial_data
+    # Точки в пределах области 1000 x 1000
+    x = rng.uniform(0, 1000, count)
+    y = rng.uniform(0, 1000, count)
+    
+    return [
+        concat(choice(rng, words, count), ' ', choice(rng, words, count)),  # location_name
+        concat('(', x.astype(str), ',', y.astype(str), ')'),  # POINT
+        choice(rng, object_types, count)  # object_type
+    ]
 
-def generate_multidimensional_data(num_records):
+def generate_multidimensional_data(num_records, start=0):
     """Генерация многомерных данных"""
     fake = Faker()
-    multidimensional_data = []
+    progress = progress_interval()
     categories = ['cluster_A', 'cluster_B', 'cluster_C', 'outlier', 'noise']
     
     # Создаем несколько кластеров для реалистичных данных
@@ -56,7 +78,7 @@ def generate_multidimensional_data(num_records):
         (800, 700, 40)
     ]
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         # 80% точек в кластерах, 20% случайных
         if random.random() < 0.8:
             cluster = random.choice(clusters)
@@ -74,7 +96,7 @@ def generate_multidimensional_data(num_records):
             category = random.choice(['outlier', 'noise'])
         
         metadata = {
-            'generated_at': datetime.now().isoformat(),
+            'generated_at': reference_now().isoformat(),
             'cluster_id': hash((x, y)) % 1000,
             'density': random.uniform(0.1, 1.0)
         }
@@ -84,17 +106,47 @@ def generate_multidimensional_data(num_records):
             category,
             json.dumps(metadata)
         )
-        multidimensional_data.append(record)
+        yield record
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} многомерных записей")
+
+def generate_multidimensional_block(rng, count, start):
+    """Векторная генерация блока многомерных данных с кластерами (NumPy)"""
+    # центр (x,y) и радиус, как в построчном генераторе
+    clusters = np.array([(200, 200, 50), (700, 300, 80), (400, 600, 60), (800, 700, 40)], dtype=float)
+    cluster_names = np.array(['cluster_A', 'cluster_B', 'cluster_C'])
+    
+    # 80% точек в кластерах (нормальное распределение), 20% случайных
+    in_cluster = rng.random(count) < 0.8
+    cluster_idx = rng.integers(0, len(clusters), count)
+    centers = clusters[cluster_idx]
+    x = np.where(in_cluster,
+                 np.clip(rng.normal(centers[:, 0], centers[:, 2] / 3), 0, 1000),
+                 rng.uniform(0, 1000, count))
+    y = np.where(in_cluster,
+                 np.clip(rng.normal(centers[:, 1], centers[:, 2] / 3), 0, 1000),
+                 rng.uniform(0, 1000, count))
+    category = np.where(in_cluster, cluster_names[cluster_idx % 3],
+                        choice(rng, ['outlier', 'noise'], count))
+    
+    # Псевдо-идентификатор ячейки по координатам вместо hash((x, y))
+    cluster_id = (np.floor(x).astype(np.int64) * 1000 + np.floor(y).astype(np.int64)) % 1000
+    metadata = concat('{"generated_at": "', reference_now().isoformat(),
+                      '", "cluster_id": ', fmt_int(cluster_id),
+                      ', "density": ', rng.uniform(0.1, 1.0, count).astype(str), '}')
     
-    return multidimensional_data
+    return [
+        concat('(', x.astype(str), ',', y.astype(str), ')'),  # data_point
+        category,
+        metadata
+    ]
 
-def generate_text_data(num_records):
+def generate_text_data(num_records, start=0):
     """Генерация текстовых данных для префиксных деревьев"""
     fake = Faker()
-    text_data = []
+    progress = progress_interval()
+    word = pool_sampler('word')
     languages = ['english', 'russian', 'german', 'french', 'spanish']
     parts_of_speech = ['noun', 'verb', 'adjective', 'adverb', 'preposition', 'conjunction']
     
@@ -105,15 +157,15 @@ def generate_text_data(num_records):
     
     for prefix in prefixes:
         for suffix in suffixes:
-            base_words.append(f"{prefix}{fake.word()}{suffix}")
+            base_words.append(f"{prefix}{word()}{suffix}")
     
     # Добавляем случайные слова
     for _ in range(1000):
-        base_words.append(fake.word())
+        base_words.append(word())
     
     base_words = list(set(base_words))  # Уникальные слова
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         word = random.choice(base_words)
         # Иногда добавляем префиксы для тестирования поиска по префиксам
         if random.random() < 0.3:
@@ -125,17 +177,16 @@ def generate_text_data(num_records):
             random.randint(1, 10000),  # frequency
             random.choice(parts_of_speech)
         )
-        text_data.append(record)
+        yield record
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} текстовых записей")
-    
-    return text_data
 
-def generate_network_data(num_records):
+def generate_network_data(num_records, start=0):
     """Генерация сетевых данных"""
     fake = Faker()
-    network_data = []
+    progress = progress_interval()
+    ipv4 = pool_sampler('ipv4')
     country_codes = ['US', 'RU', 'DE', 'FR', 'CN', 'JP', 'BR', 'IN', 'GB', 'CA']
     
     # Базовые сети для генерации
@@ -147,7 +198,7 @@ def generate_network_data(num_records):
         '198.51.100.0/24'
     ]
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         base_network = random.choice(base_networks)
         
         if base_network.startswith('192.168'):
@@ -161,7 +212,7 @@ def generate_network_data(num_records):
             network_range = '10.0.0.0/8'
         else:
             # Для других сетей используем Faker
-            ip_address = fake.ipv4()
+            ip_address = ipv4()
             network_range = base_network
         
         record = (
@@ -170,20 +221,19 @@ def generate_network_data(num_records):
             network_range,
             random.choice(country_codes)
         )
-        network_data.append(record)
+        yield record
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} сетевых записей")
-    
-    return network_data
 
-def generate_bounding_boxes(num_records):
+def generate_bounding_boxes(num_records, start=0):
     """Генерация данных с ограничивающими прямоугольниками"""
     fake = Faker()
-    bounding_boxes = []
+    progress = progress_interval()
+    word = pool_sampler('word')
     object_types = ['window', 'button', 'image', 'text', 'container', 'panel', 'dialog']
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         # Генерируем прямоугольник (x1, y1, x2, y2)
         x1 = random.uniform(0, 800)
         y1 = random.uniform(0, 600)
@@ -193,16 +243,59 @@ def generate_bounding_boxes(num_records):
         y2 = y1 + height
         
         record = (
-            fake.word().capitalize() + ' ' + fake.word().capitalize(),
+            word().capitalize() + ' ' + word().capitalize(),
             f'({x1},{y1},{x2},{y2})',  # BOX format
             random.choice(object_types)
         )
-        bounding_boxes.append(record)
+        yield record
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} прямоугольников")
+
+def generate_bounding_boxes_block(rng, count, start):
+    """Векторная генерация блока прямоугольников (NumPy)"""
+    words = _word_pool()
+    object_types = ['window', 'button', 'image', 'text', 'container', 'panel', 'dialog']
     
-    return bounding_boxes
+    x1 = rng.uniform(0, 800, count)
+    y1 = rng.uniform(0, 600, count)
+    x2 = x1 + rng.uniform(10, 200, count)  # ширина
+    y2 = y1 + rng.uniform(10, 150, count)  # высота
+    
+    return [
+        concat(choice(rng, words, count), ' ', choice(rng, words, count)),  # box_name
+        concat('(', x1.astype(str), ',', y1.astype(str), ',',
+               x2.astype(str), ',', y2.astype(str), ')'),  # BOX
+        choice(rng, object_types, count)  # object_type
+    ]
+
+def load_tasks():
+    """Таблицы исследования: параметры load_tables_parallel для каждой таблицы"""
+    return [
+        # Генерация пространственных данных
+        {'title': 'пространственных записей', 'table': 'spatial_data',
+         'columns': ['location_name', 'coordinates', 'object_type'],
+         'generator': generate_spatial_data, 'num_records': scaled(30000),
+         'vectorized': generate_spatial_block},
+        # Генерация многомерных данных
+        {'title': 'многомерных записей', 'table': 'multidimensional_data',
+         'columns': ['data_point', 'category', 'metadata'],
+         'generator': generate_multidimensional_data, 'num_records': scaled(25000),
+         'vectorized': generate_multidimensional_block},
+        # Генерация текстовых данных
+        {'title': 'текстовых записей', 'table': 'text_data',
+         'columns': ['word', 'language', 'frequency', 'part_of_speech'],
+         'generator': generate_text_data, 'num_records': scaled(20000)},
+        # Генерация сетевых данных
+        {'title': 'сетевых записей', 'table': 'network_data',
+         'columns': ['ip_address', 'hostname', 'network_range', 'country_code'],
+         'generator': generate_network_data, 'num_records': scaled(15000)},
+        # Генерация данных с прямоугольниками
+        {'title': 'прямоугольников', 'table': 'bounding_boxes',
+         'columns': ['box_name', 'bbox', 'object_type'],
+         'generator': generate_bounding_boxes, 'num_records': scaled(10000),
+         'vectorized': generate_bounding_boxes_block}
+    ]
 
 def main():
     config = DB_CONFIG.copy()
@@ -216,86 +309,13 @@ def main():
         
         print("Генерация данных для SP-GiST индексов...")
         
-        # Генерация пространственных данных
-        print("Генерация 30,000 пространственных записей...")
-        spatial_data = generate_spatial_data(30000)
-        
-        print("Вставка пространственных данных в БД...")
-        spatial_sql = """
-            INSERT INTO spatial_data (location_name, coordinates, object_type) 
-            VALUES (%s, %s, %s)
-        """
-        
-        batch_size = 1000
-        for i in range(0, len(spatial_data), batch_size):
-            batch = spatial_data[i:i + batch_size]
-            cursor.executemany(spatial_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} пространственных записей")
-        
-        # Генерация многомерных данных
-        print("Генерация 25,000 многомерных записей...")
-        multidimensional_data = generate_multidimensional_data(25000)
-        
-        print("Вставка многомерных данных в БД...")
-        multidimensional_sql = """
-            INSERT INTO multidimensional_data (data_point, category, metadata) 
-            VALUES (%s, %s, %s)
-        """
-        
-        for i in range(0, len(multidimensional_data), batch_size):
-            batch = multidimensional_data[i:i + batch_size]
-            cursor.executemany(multidimensional_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} многомерных записей")
-        
-        # Генерация текстовых данных
-        print("Генерация 20,000 текстовых записей...")
-        text_data = generate_text_data(20000)
-        
-        print("Вставка текстовых данных в БД...")
-        text_sql = """
-            INSERT INTO text_data (word, language, frequency, part_of_speech) 
-            VALUES (%s, %s, %s, %s)
-        """
-        
-        for i in range(0, len(text_data), batch_size):
-            batch = text_data[i:i + batch_size]
-            cursor.executemany(text_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} текстовых записей")
-        
-        # Генерация сетевых данных
-        print("Генерация 15,000 сетевых записей...")
-        network_data = generate_network_data(15000)
-        
-        print("Вставка сетевых данных в БД...")
-        network_sql = """
-            INSERT INTO network_data (ip_address, hostname, network_range, country_code) 
-            VALUES (%s, %s, %s, %s)
-        """
-        
-        for i in range(0, len(network_data), batch_size):
-            batch = network_data[i:i + batch_size]
-            cursor.executemany(network_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} сетевых записей")
-        
-        # Генерация данных с прямоугольниками
-        print("Генерация 10,000 прямоугольников...")
-        bounding_boxes_data = generate_bounding_boxes(10000)
+        # Подготовка таблиц к загрузке (в режиме phased - UNLOGGED без PK/UNIQUE)
+        phases = prepare_load(conn)
         
-        print("Вставка прямоугольников в БД...")
-        bounding_sql = """
-            INSERT INTO bounding_boxes (box_name, bbox, object_type) 
-            VALUES (%s, %s, %s)
-        """
+        load_tables_parallel(conn, load_tasks())
         
-        for i in range(0, len(bounding_boxes_data), batch_size):
-            batch = bounding_boxes_data[i:i + batch_size]
-            cursor.executemany(bounding_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} прямоугольников")
+        # Ограничения, ANALYZE и возврат в LOGGED; время каждой фазы
+        finalize_load(conn, phases)
         
         print("Данные успешно сгенерированы!")
         
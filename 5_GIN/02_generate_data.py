@@ -14,12 +14,19 @@ import random
 import json
 from datetime import datetime, timedelta
 from database_config import DB_CONFIG
-from utils import get_db_connection
+from utils import get_db_connection, progress_interval, reference_now, scaled
+from load_phases import finalize_load, prepare_load
+from sharding import load_tables_parallel
+from unique_keys import unique_codes
+from value_pools import pool_sampler
 
-def generate_products_data(num_records):
+# Вектор полнотекстового поиска: заполняется после загрузки, в копиях shared/ingest.py - триггером
+SEARCH_VECTOR = "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(content, ''))"
+
+def generate_products_data(num_records, start=0):
     """Генерация данных продуктов с массивами и JSON"""
     fake = Faker()
-    products = []
+    progress = progress_interval()
     
     # Базовые наборы данных
     all_tags = ['electronics', 'home', 'kitchen', 'sports', 'books', 'clothing', 
@@ -34,7 +41,7 @@ def generate_products_data(num_records):
         'books': ['fiction', 'non-fiction', 'educational', 'children']
     }
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         # Выбираем основную категорию
         main_category = random.choice(list(categories.keys()))
         subcategories = categories[main_category]
@@ -75,26 +82,26 @@ def generate_products_data(num_records):
             prices,
             json.dumps(attributes)
         )
-        products.append(product)
+        yield product
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} продуктов")
-    
-    return products
 
-def generate_user_profiles(num_records):
+def generate_user_profiles(num_records, start=0):
     """Генерация профилей пользователей с JSON данными"""
     fake = Faker()
-    profiles = []
-    used_usernames = set()  # Множество для отслеживания использованных имен
+    progress = progress_interval()
+    city = pool_sampler('city')
+    company = pool_sampler('company')
+    ipv4 = pool_sampler('ipv4')
+    user_agent = pool_sampler('user_agent')
+    user_name = pool_sampler('user_name')
+    user_code = unique_codes('gin_username', 6)  # уникальный суффикс имени по номеру строки
     
-    for i in range(num_records):
-        # Генерируем уникальное имя пользователя
-        while True:
-            username = fake.user_name()[:50]
-            if username not in used_usernames:
-                used_usernames.add(username)
-                break
+    for i in range(start, start + num_records):
+        # Уникальное имя пользователя
+        suffix = user_code(i)
+        username = user_name()[:50 - len(suffix)] + suffix
         
         # Основные данные профиля
         profile_data = {
@@ -107,12 +114,12 @@ def generate_user_profiles(num_records):
             },
             'address': {
                 'street': fake.street_address(),
-                'city': fake.city(),
+                'city': city(),
                 'country': fake.country(),
                 'zipcode': fake.zipcode()
             },
             'employment': {
-                'company': fake.company(),
+                'company': company(),
                 'position': fake.job(),
                 'industry': random.choice(['IT', 'Finance', 'Healthcare', 'Education', 'Retail'])
             }
@@ -140,8 +147,8 @@ def generate_user_profiles(num_records):
             activity = {
                 'action': random.choice(['login', 'view', 'purchase', 'search', 'update_profile']),
                 'timestamp': fake.iso8601(),
-                'ip': fake.ipv4(),
-                'user_agent': fake.user_agent()
+                'ip': ipv4(),
+                'user_agent': user_agent()
             }
             activity_log.append(activity)
         
@@ -151,17 +158,15 @@ def generate_user_profiles(num_records):
             json.dumps(preferences),
             json.dumps(activity_log)
         )
-        profiles.append(profile)
+        yield profile
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} профилей")
-    
-    return profiles
 
-def generate_articles_data(num_records):
+def generate_articles_data(num_records, start=0):
     """Генерация статей для полнотекстового поиска"""
     fake = Faker()
-    articles = []
+    progress = progress_interval()
     
     # Ключевые слова для статей
     all_keywords = ['technology', 'science', 'health', 'education', 'business', 
@@ -169,7 +174,7 @@ def generate_articles_data(num_records):
                    'AI', 'machine learning', 'blockchain', 'cloud', 'security',
                    'innovation', 'startup', 'digital', 'sustainable', 'global']
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         # Генерируем контент статьи
         title = fake.sentence()[:300]
         
@@ -201,22 +206,21 @@ def generate_articles_data(num_records):
             keywords,
             json.dumps(metadata)
         )
-        articles.append(article)
+        yield article
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} статей")
-    
-    return articles
 
-def generate_documents_data(num_records):
+def generate_documents_data(num_records, start=0):
     """Генерация документов с различными свойствами"""
     fake = Faker()
-    documents = []
+    progress = progress_interval()
+    word = pool_sampler('word')
     
     doc_types = ['contract', 'report', 'proposal', 'manual', 'policy', 'guideline']
     access_levels = ['public', 'internal', 'confidential', 'secret']
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         doc_type = random.choice(doc_types)
         
         # Свойства документа
@@ -236,7 +240,7 @@ def generate_documents_data(num_records):
         attachments = []
         for _ in range(num_attachments):
             attachment_type = random.choice(['pdf', 'doc', 'xls', 'image', 'zip'])
-            attachment_name = f"{fake.word()}.{attachment_type}"
+            attachment_name = f"{word()}.{attachment_type}"
             attachments.append(attachment_name)
         
         # Права доступа
@@ -251,23 +255,25 @@ def generate_documents_data(num_records):
             attachments,
             access_control
         )
-        documents.append(document)
+        yield document
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} документов")
-    
-    return documents
 
-def generate_log_entries(num_records):
+def generate_log_entries(num_records, start=0):
     """Генерация лог-записей"""
     fake = Faker()
-    log_entries = []
+    progress = progress_interval()
+    sentence = pool_sampler('sentence')
+    uri_path = pool_sampler('uri_path')
+    ipv4 = pool_sampler('ipv4')
+    user_agent = pool_sampler('user_agent')
     
     log_levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
     all_tags = ['authentication', 'database', 'api', 'security', 'performance', 
                'payment', 'notification', 'cache', 'network', 'storage']
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         log_level = random.choice(log_levels)
         
         # Контекст лога
@@ -275,7 +281,7 @@ def generate_log_entries(num_records):
             'request_id': fake.uuid4(),
             'session_id': fake.uuid4(),
             'user_id': random.randint(1, 10000),
-            'endpoint': f"/api/{fake.uri_path()}",
+            'endpoint': f"/api/{uri_path()}",
             'method': random.choice(['GET', 'POST', 'PUT', 'DELETE']),
             'status_code': random.choice([200, 201, 400, 401, 403, 404, 500]),
             'response_time_ms': random.randint(10, 5000),
@@ -289,18 +295,42 @@ def generate_log_entries(num_records):
         
         log_entry = (
             log_level,
-            fake.sentence(),
+            sentence(),
             json.dumps(context),
             tags,
-            fake.ipv4(),
-            fake.user_agent()
+            ipv4(),
+            user_agent()
         )
-        log_entries.append(log_entry)
+        yield log_entry
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} лог-записей")
-    
-    return log_entries
+
+def load_tasks():
+    """Таблицы исследования: параметры load_tables_parallel для каждой таблицы"""
+    return [
+        # Генерация продуктов
+        {'title': 'продуктов', 'table': 'products',
+         'columns': ['name', 'description', 'tags', 'categories', 'prices', 'attributes'],
+         'generator': generate_products_data, 'num_records': scaled(25000)},
+        # Генерация профилей пользователей
+        {'title': 'профилей', 'table': 'user_profiles',
+         'columns': ['username', 'profile_data', 'preferences', 'activity_log'],
+         'generator': generate_user_profiles, 'num_records': scaled(20000)},
+        # Генерация статей
+        {'title': 'статей', 'table': 'articles',
+         'columns': ['title', 'content', 'author', 'keywords', 'metadata'],
+         'generator': generate_articles_data, 'num_records': scaled(30000),
+         'computed': {'search_vector': SEARCH_VECTOR}},
+        # Генерация документов
+        {'title': 'документов', 'table': 'documents',
+         'columns': ['doc_type', 'title', 'content', 'properties', 'attachments', 'access_control'],
+         'generator': generate_documents_data, 'num_records': scaled(15000)},
+        # Генерация лог-записей
+        {'title': 'лог-записей', 'table': 'log_entries',
+         'columns': ['log_level', 'message', 'context', 'tags', 'ip_address', 'user_agent'],
+         'generator': generate_log_entries, 'num_records': scaled(40000)}
+    ]
 
 def main():
     config = DB_CONFIG.copy()
@@ -314,117 +344,23 @@ def main():
         
         print("Генерация данных для GIN индексов...")
         
-        # Генерация продуктов
-        print("Генерация 25,000 продуктов...")
-        products_data = generate_products_data(25000)
-        
-        print("Вставка продуктов в БД...")
-        products_sql = """
-            INSERT INTO products (name, description, tags, categories, prices, attributes) 
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        
-        batch_size = 1000
-        for i in range(0, len(products_data), batch_size):
-            batch = products_data[i:i + batch_size]
-            cursor.executemany(products_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} продуктов")
+        # Подготовка таблиц к загрузке (в режиме phased - UNLOGGED без PK/UNIQUE)
+        phases = prepare_load(conn)
         
-        # Генерация профилей пользователей
-        print("Генерация 20,000 профилей...")
-        profiles_data = generate_user_profiles(20000)
-        
-        print("Вставка профилей в БД...")
-        profiles_sql = """
-            INSERT INTO user_profiles (username, profile_data, preferences, activity_log) 
-            VALUES (%s, %s, %s, %s)
-        """
-        
-        success_count = 0
-        for i in range(0, len(profiles_data), batch_size):
-            batch = profiles_data[i:i + batch_size]
-            try:
-                cursor.executemany(profiles_sql, batch)
-                conn.commit()
-                success_count += len(batch)
-                print(f"Вставлено {success_count} профилей")
-            except psycopg2.IntegrityError as e:
-                conn.rollback()
-                print(f"Обнаружены дубликаты в пакете, вставляем по одному...")
-                # Вставляем по одному, пропуская дубликаты
-                for record in batch:
-                    try:
-                        cursor.execute(profiles_sql, record)
-                        conn.commit()
-                        success_count += 1
-                    except psycopg2.IntegrityError:
-                        conn.rollback()
-                        continue
-                print(f"Вставлено {success_count} профилей (некоторые дубликаты пропущены)")
-            except Exception as e:
-                conn.rollback()
-                print(f"Ошибка при вставке профилей: {e}")
-                # Продолжаем с следующим пакетом
-                continue
-        
-        # Генерация статей
-        print("Генерация 30,000 статей...")
-        articles_data = generate_articles_data(30000)
-        
-        print("Вставка статей в БД...")
-        articles_sql = """
-            INSERT INTO articles (title, content, author, keywords, metadata) 
-            VALUES (%s, %s, %s, %s, %s)
-        """
-        
-        for i in range(0, len(articles_data), batch_size):
-            batch = articles_data[i:i + batch_size]
-            cursor.executemany(articles_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} статей")
-        
-        # Генерация документов
-        print("Генерация 15,000 документов...")
-        documents_data = generate_documents_data(15000)
-        
-        print("Вставка документов в БД...")
-        documents_sql = """
-            INSERT INTO documents (doc_type, title, content, properties, attachments, access_control) 
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        
-        for i in range(0, len(documents_data), batch_size):
-            batch = documents_data[i:i + batch_size]
-            cursor.executemany(documents_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} документов")
-        
-        # Генерация лог-записей
-        print("Генерация 40,000 лог-записей...")
-        log_entries_data = generate_log_entries(40000)
-        
-        print("Вставка лог-записей в БД...")
-        log_sql = """
-            INSERT INTO log_entries (log_level, message, context, tags, ip_address, user_agent) 
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        
-        for i in range(0, len(log_entries_data), batch_size):
-            batch = log_entries_data[i:i + batch_size]
-            cursor.executemany(log_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} лог-записей")
+        load_tables_parallel(conn, load_tasks())
         
         # Обновляем search_vector для полнотекстового поиска
         print("Обновление search_vector для полнотекстового поиска...")
-        cursor.execute("""
+        cursor.execute(f"""
             UPDATE articles 
-            SET search_vector = to_tsvector('english', coalesce(title, '') || ' ' || coalesce(content, ''))
+            SET search_vector = {SEARCH_VECTOR}
             WHERE search_vector IS NULL
         """)
         conn.commit()
         
+        # Ограничения, ANALYZE и возврат в LOGGED; время каждой фазы
+        finalize_load(conn, phases)
+        
         print("Данные успешно сгенерированы!")
         
     except Exception as e:
@@ -13,29 +13,42 @@ from faker import Faker
 import random
 from datetime import datetime, timedelta
 from database_config import DB_CONFIG
-from utils import get_db_connection
+from utils import get_db_connection, progress_interval, reference_now, scaled
+from load_phases import finalize_load, prepare_load
+from sharding import load_tables_parallel
+from time_order import appended_seconds, appended_seconds_block, is_appended, report_correlation, time_order
+from value_pools import pool_sampler
+from vectorized import np, choice, fmt_bool, fmt_date, fmt_float, fmt_int, fmt_timestamp
 
-def generate_time_series_data(num_records):
-    """Генерация данных временных рядов"""
+def generate_time_series_data(num_records, total=None, order=None, start=0):
+    """Генерация данных временных рядов
+
+    total и order - число строк таблицы и порядок строк во времени (time_order.py).
+    """
     fake = Faker()
-    time_series = []
+    progress = progress_interval(50000)
     
     sensor_types = ['temperature', 'pressure', 'humidity', 'voltage', 'current', 'rpm']
     sensor_ids = list(range(1, 101))  # 100 сенсоров
     
     # Начальная дата для временных рядов
-    start_date = datetime.now() - timedelta(days=365)
+    start_date = reference_now() - timedelta(days=365)
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         sensor_id = random.choice(sensor_ids)
         
-        # Создаем последовательные временные метки
-        measurement_time = start_date + timedelta(
-            days=random.randint(0, 364),
-            hours=random.randint(0, 23),
-            minutes=random.randint(0, 59),
-            seconds=random.randint(0, 59)
-        )
+        if is_appended(order):
+            # Метки времени по номеру строки: строки идут в порядке времени
+            measurement_time = start_date + timedelta(
+                seconds=appended_seconds(i, total, 365 * 24 * 3600, order)
+            )
+        else:
+            measurement_time = start_date + timedelta(
+                days=random.randint(0, 364),
+                hours=random.randint(0, 23),
+                minutes=random.randint(0, 59),
+                seconds=random.randint(0, 59)
+            )
         
         # Генерируем значения в зависимости от типа сенсора
         sensor_type = random.choice(sensor_types)
@@ -59,17 +72,44 @@ def generate_time_series_data(num_records):
             sensor_type,
             random.choice([True, False])  # quality_flag
         )
-        time_series.append(record)
+        yield record
         
-        if i % 50000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} записей временных рядов")
+
+def generate_time_series_block(rng, count, start, total=None, order=None):
+    """Векторная генерация блока временных рядов (NumPy)"""
+    sensor_types = np.array(['temperature', 'pressure', 'humidity', 'voltage', 'current', 'rpm'])
+    # Диапазоны значений в том же порядке, что и типы сенсоров
+    low = np.array([-20, 950, 0, 220, 0, 0])
+    high = np.array([50, 1050, 100, 240, 100, 3000])
     
-    return time_series
+    start_date = np.datetime64(reference_now() - timedelta(days=365), 's')
+    if is_appended(order):
+        offsets = appended_seconds_block(rng, start, count, total, 365 * 24 * 3600, order).astype('timedelta64[s]')
+    else:
+        offsets = rng.integers(0, 365 * 24 * 3600, count).astype('timedelta64[s]')
+    type_idx = rng.integers(0, len(sensor_types), count)
+    values = low[type_idx] + rng.random(count) * (high - low)[type_idx]
+    
+    return [
+        fmt_int(rng.integers(1, 101, count)),  # sensor_id (100 сенсоров)
+        fmt_timestamp(start_date + offsets),  # measurement_time
+        fmt_float(values, 4),  # value
+        sensor_types[type_idx],  # sensor_type
+        fmt_bool(rng.random(count) < 0.5)  # quality_flag
+    ]
+
+def generate_access_logs(num_records, total=None, order=None, start=0):
+    """Генерация логов доступа
 
-def generate_access_logs(num_records):
-    """Генерация логов доступа"""
+    total и order - число строк таблицы и порядок строк во времени (time_order.py).
+    """
     fake = Faker()
-    access_logs = []
+    progress = progress_interval(50000)
+    uri_path = pool_sampler('uri_path')
+    ipv4 = pool_sampler('ipv4')
+    user_agent = pool_sampler('user_agent')
     
     http_methods = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH']
     status_codes = [200, 201, 400, 401, 403, 404, 500]
@@ -79,45 +119,48 @@ def generate_access_logs(num_records):
     ]
     
     # Начальная дата для логов
-    start_date = datetime.now() - timedelta(days=180)
+    start_date = reference_now() - timedelta(days=180)
     
-    for i in range(num_records):
-        access_time = start_date + timedelta(
-            days=random.randint(0, 179),
-            hours=random.randint(0, 23),
-            minutes=random.randint(0, 59),
-            seconds=random.randint(0, 59)
-        )
+    for i in range(start, start + num_records):
+        if is_appended(order):
+            access_time = start_date + timedelta(seconds=appended_seconds(i, total, 180 * 24 * 3600, order))
+        else:
+            access_time = start_date + timedelta(
+                days=random.randint(0, 179),
+                hours=random.randint(0, 23),
+                minutes=random.randint(0, 59),
+                seconds=random.randint(0, 59)
+            )
         
         record = (
             random.randint(1, 10000),  # user_id
             access_time,
-            f"{random.choice(resource_paths)}/{fake.uri_path()}",
+            f"{random.choice(resource_paths)}/{uri_path()}",
             random.choice(http_methods),
             random.choice(status_codes),
             random.randint(10, 5000),  # response_time_ms
-            fake.ipv4(),
-            fake.user_agent()
+            ipv4(),
+            user_agent()
         )
-        access_logs.append(record)
+        yield record
         
-        if i % 50000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} логов доступа")
-    
-    return access_logs
 
-def generate_financial_transactions(num_records):
+def generate_financial_transactions(num_records, start=0):
     """Генерация финансовых транзакций"""
     fake = Faker()
-    transactions = []
+    progress = progress_interval(50000)
+    sentence = pool_sampler('sentence')
+    company = pool_sampler('company')
     
     transaction_types = ['debit', 'credit', 'transfer', 'payment', 'withdrawal']
     categories = ['food', 'transport', 'entertainment', 'utilities', 'shopping', 'healthcare']
     
     # Начальная дата для транзакций
-    start_date = datetime.now() - timedelta(days=730)  # 2 года
+    start_date = reference_now() - timedelta(days=730)  # 2 года
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         transaction_date = (start_date + timedelta(days=random.randint(0, 729))).date()
         
         amount = round(random.uniform(1, 5000), 2)
@@ -129,28 +172,26 @@ def generate_financial_transactions(num_records):
             transaction_date,
             amount,
             random.choice(transaction_types),
-            fake.sentence(),
+            sentence(),
             random.choice(categories),
-            fake.company()
+            company()
         )
-        transactions.append(record)
+        yield record
         
-        if i % 50000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} финансовых транзакций")
-    
-    return transactions
 
-def generate_system_metrics(num_records):
+def generate_system_metrics(num_records, start=0):
     """Генерация метрик системы"""
     fake = Faker()
-    metrics = []
+    progress = progress_interval(50000)
     
     server_ids = list(range(1, 51))  # 50 серверов
     
     # Начальная дата для метрик
-    start_date = datetime.now() - timedelta(days=30)
+    start_date = reference_now() - timedelta(days=30)
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         server_id = random.choice(server_ids)
         metric_time = start_date + timedelta(
             hours=random.randint(0, 719),  # 30 дней * 24 часа
@@ -167,17 +208,32 @@ def generate_system_metrics(num_records):
             round(random.uniform(0, 500), 2),   # network_tx_mbps
             random.randint(0, 10000)  # active_connections
         )
-        metrics.append(record)
+        yield record
         
-        if i % 50000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} метрик системы")
+
+def generate_system_metrics_block(rng, count, start):
+    """Векторная генерация блока метрик системы (NumPy)"""
+    start_date = np.datetime64(reference_now() - timedelta(days=30), 's')
+    # 30 дней * 24 часа, шаг - минута
+    minutes = rng.integers(0, 720, count) * 60 + rng.integers(0, 60, count)
     
-    return metrics
+    return [
+        fmt_int(rng.integers(1, 51, count)),  # server_id (50 серверов)
+        fmt_timestamp(start_date + (minutes * 60).astype('timedelta64[s]')),  # metric_time
+        fmt_float(rng.uniform(0, 100, count), 2),  # cpu_usage
+        fmt_float(rng.uniform(0, 100, count), 2),  # memory_usage
+        fmt_float(rng.uniform(0, 100, count), 2),  # disk_usage
+        fmt_float(rng.uniform(0, 1000, count), 2),  # network_rx_mbps
+        fmt_float(rng.uniform(0, 500, count), 2),  # network_tx_mbps
+        fmt_int(rng.integers(0, 10001, count))  # active_connections
+    ]
 
-def generate_geographic_data(num_records):
+def generate_geographic_data(num_records, start=0):
     """Генерация географических данных"""
     fake = Faker()
-    geographic_data = []
+    progress = progress_interval(50000)
     
     location_types = ['weather_station', 'sensor_node', 'research_site', 'monitoring_point']
     
@@ -186,9 +242,9 @@ def generate_geographic_data(num_records):
     base_longitudes = [37.6173, 30.3351, 73.3242, 60.6057, 49.1089]
     
     # Начальная дата
-    start_date = datetime.now() - timedelta(days=365)
+    start_date = reference_now() - timedelta(days=365)
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         base_idx = i % len(base_latitudes)
         latitude = base_latitudes[base_idx] + random.uniform(-0.5, 0.5)
         longitude = base_longitudes[base_idx] + random.uniform(-0.5, 0.5)
@@ -204,12 +260,66 @@ def generate_geographic_data(num_records):
             round(random.uniform(-30, 40), 2),  # temperature
             round(random.uniform(0, 100), 2)    # humidity
         )
-        geographic_data.append(record)
+        yield record
         
-        if i % 50000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} географических записей")
+
+def generate_geographic_block(rng, count, start):
+    """Векторная генерация блока географических данных (NumPy)"""
+    location_types = ['weather_station', 'sensor_node', 'research_site', 'monitoring_point']
+    base_latitudes = np.array([55.7558, 59.9343, 54.9885, 56.8389, 55.7963])
+    base_longitudes = np.array([37.6173, 30.3351, 73.3242, 60.6057, 49.1089])
+    
+    # Как и в построчном генераторе, базовая точка чередуется по номеру строки
+    base_idx = (start + np.arange(count)) % len(base_latitudes)
+    start_date = np.datetime64((reference_now() - timedelta(days=365)).date(), 'D')
+    days = rng.integers(0, 365, count).astype('timedelta64[D]')
     
-    return geographic_data
+    return [
+        fmt_float(base_latitudes[base_idx] + rng.uniform(-0.5, 0.5, count), 6),  # latitude
+        fmt_float(base_longitudes[base_idx] + rng.uniform(-0.5, 0.5, count), 6),  # longitude
+        fmt_int(rng.integers(-100, 3001, count)),  # elevation
+        choice(rng, location_types, count),  # location_type
+        fmt_date(start_date + days),  # recorded_date
+        fmt_float(rng.uniform(-30, 40, count), 2),  # temperature
+        fmt_float(rng.uniform(0, 100, count), 2)  # humidity
+    ]
+
+def load_tasks():
+    """Таблицы исследования: параметры load_tables_parallel для каждой таблицы"""
+    order = time_order()
+    return [
+        # Генерация временных рядов (большая таблица)
+        {'title': 'записей временных рядов', 'table': 'time_series_data',
+         'columns': ['sensor_id', 'measurement_time', 'value', 'sensor_type', 'quality_flag'],
+         'generator': generate_time_series_data, 'num_records': scaled(500000),
+         'args': (scaled(500000), order), 'vectorized': generate_time_series_block,
+         'ordered': is_appended(order)},
+        # Генерация логов доступа
+        {'title': 'логов доступа', 'table': 'access_logs',
+         'columns': ['user_id', 'access_time', 'resource_path', 'http_method', 'status_code',
+                     'response_time_ms', 'ip_address', 'user_agent'],
+         'generator': generate_access_logs, 'num_records': scaled(300000),
+         'args': (scaled(300000), order), 'ordered': is_appended(order)},
+        # Генерация финансовых транзакций
+        {'title': 'финансовых транзакций', 'table': 'financial_transactions',
+         'columns': ['account_id', 'transaction_date', 'amount', 'transaction_type', 'description',
+                     'category', 'merchant_name'],
+         'generator': generate_financial_transactions, 'num_records': scaled(400000)},
+        # Генерация метрик системы
+        {'title': 'метрик системы', 'table': 'system_metrics',
+         'columns': ['server_id', 'metric_time', 'cpu_usage', 'memory_usage', 'disk_usage',
+                     'network_rx_mbps', 'network_tx_mbps', 'active_connections'],
+         'generator': generate_system_metrics, 'num_records': scaled(200000),
+         'vectorized': generate_system_metrics_block},
+        # Генерация географических данных
+        {'title': 'географических записей', 'table': 'geographic_data',
+         'columns': ['latitude', 'longitude', 'elevation', 'location_type', 'recorded_date',
+                     'temperature', 'humidity'],
+         'generator': generate_geographic_data, 'num_records': scaled(150000),
+         'vectorized': generate_geographic_block}
+    ]
 
 def main():
     config = DB_CONFIG.copy()
@@ -223,101 +333,16 @@ def main():
         
         print("Генерация данных для BRIN индексов...")
         
-        # Генерация временных рядов (большая таблица)
-        print("Генерация 500,000 записей временных рядов...")
-        time_series_data = generate_time_series_data(500000)
-        
-        print("Вставка временных рядов в БД...")
-        time_series_sql = """
-            INSERT INTO time_series_data (sensor_id, measurement_time, value, sensor_type, quality_flag) 
-            VALUES (%s, %s, %s, %s, %s)
-        """
-        
-        batch_size = 5000
-        for i in range(0, len(time_series_data), batch_size):
-            batch = time_series_data[i:i + batch_size]
-            cursor.executemany(time_series_sql, batch)
-            conn.commit()
-            if (i // batch_size) % 10 == 0:  # Логируем каждые 10 пакетов
-                print(f"Вставлено {i + len(batch)} записей временных рядов")
-        
-        print("Вставлено 500,000 записей временных рядов")
-        
-        # Генерация логов доступа
-        print("Генерация 300,000 логов доступа...")
-        access_logs_data = generate_access_logs(300000)
-        
-        print("Вставка логов доступа в БД...")
-        access_logs_sql = """
-            INSERT INTO access_logs (user_id, access_time, resource_path, http_method, status_code, response_time_ms, ip_address, user_agent) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        for i in range(0, len(access_logs_data), batch_size):
-            batch = access_logs_data[i:i + batch_size]
-            cursor.executemany(access_logs_sql, batch)
-            conn.commit()
-            if (i // batch_size) % 10 == 0:
-                print(f"Вставлено {i + len(batch)} логов доступа")
-        
-        print("Вставлено 300,000 логов доступа")
-        
-        # Генерация финансовых транзакций
-        print("Генерация 400,000 финансовых транзакций...")
-        transactions_data = generate_financial_transactions(400000)
-        
-        print("Вставка финансовых транзакций в БД...")
-        transactions_sql = """
-            INSERT INTO financial_transactions (account_id, transaction_date, amount, transaction_type, description, category, merchant_name) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        for i in range(0, len(transactions_data), batch_size):
-            batch = transactions_data[i:i + batch_size]
-            cursor.executemany(transactions_sql, batch)
-            conn.commit()
-            if (i // batch_size) % 10 == 0:
-                print(f"Вставлено {i + len(batch)} финансовых транзакций")
-        
-        print("Вставлено 400,000 финансовых транзакций")
-        
-        # Генерация метрик системы
-        print("Генерация 200,000 метрик системы...")
-        metrics_data = generate_system_metrics(200000)
-        
-        print("Вставка метрик системы в БД...")
-        metrics_sql = """
-            INSERT INTO system_metrics (server_id, metric_time, cpu_usage, memory_usage, disk_usage, network_rx_mbps, network_tx_mbps, active_connections) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        for i in range(0, len(metrics_data), batch_size):
-            batch = metrics_data[i:i + batch_size]
-            cursor.executemany(metrics_sql, batch)
-            conn.commit()
-            if (i // batch_size) % 10 == 0:
-                print(f"Вставлено {i + len(batch)} метрик системы")
-        
-        print("Вставлено 200,000 метрик системы")
-        
-        # Генерация географических данных
-        print("Генерация 150,000 географических записей...")
-        geographic_data = generate_geographic_data(150000)
+        # Подготовка таблиц к загрузке (в режиме phased - UNLOGGED без PK/UNIQUE)
+        phases = prepare_load(conn)
         
-        print("Вставка географических данных в БД...")
-        geographic_sql = """
-            INSERT INTO geographic_data (latitude, longitude, elevation, location_type, recorded_date, temperature, humidity) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """
+        load_tables_parallel(conn, load_tasks())
         
-        for i in range(0, len(geographic_data), batch_size):
-            batch = geographic_data[i:i + batch_size]
-            cursor.executemany(geographic_sql, batch)
-            conn.commit()
-            if (i // batch_size) % 10 == 0:
-                print(f"Вставлено {i + len(batch)} географических записей")
+        # Ограничения, ANALYZE и возврат в LOGGED; время каждой фазы
+        finalize_load(conn, phases)
         
-        print("Вставлено 150,000 географических записей")
+        # Корреляция порядка строк со временем (после ANALYZE)
+        report_correlation(conn, [('time_series_data', 'measurement_time'), ('access_logs', 'access_time')])
         
         print("Данные успешно сгенерированы!")
         
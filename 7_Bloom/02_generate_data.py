@@ -13,60 +13,57 @@ from faker import Faker
 import random
 from datetime import datetime, timedelta
 from database_config import DB_CONFIG
-from utils import get_db_connection
+from utils import get_db_connection, progress_interval, reference_now, scaled
+from load_phases import finalize_load, prepare_load
+from sharding import load_tables_parallel
+from unique_keys import unique_codes
+from value_pools import pool_sampler
 
-def generate_users_data(num_records):
+def generate_users_data(num_records, start=0):
     """Генерация данных пользователей"""
     fake = Faker()
-    users = []
+    progress = progress_interval()
+    city = pool_sampler('city')
     
     countries = ['US', 'RU', 'DE', 'FR', 'CN', 'JP', 'BR', 'IN', 'GB', 'CA']
     registration_sources = ['web', 'mobile', 'social', 'referral', 'organic']
     
-    used_usernames = set()
-    used_emails = set()
+    # Уникальность username и email обеспечивает уникальный суффикс по номеру строки
+    user_code = unique_codes('bloom_user', 6)
+    user_name = pool_sampler('user_name')
+    email = pool_sampler('email')
     
     # Определяем диапазон дат
-    end_date = datetime.now()
+    end_date = reference_now()
     start_date_1y = end_date - timedelta(days=365)
     
-    for i in range(num_records):
-        # Генерируем уникальные username и email
-        while True:
-            username = fake.user_name()[:50]
-            if username not in used_usernames:
-                used_usernames.add(username)
-                break
-        
-        while True:
-            email = fake.email()[:100]
-            if email not in used_emails:
-                used_emails.add(email)
-                break
+    for i in range(start, start + num_records):
+        # Уникальные username и email
+        suffix = user_code(i)
+        email_local, email_domain = email().split('@')
         
         record = (
-            username,
-            email,
+            user_name()[:50 - len(suffix)] + suffix,
+            f"{email_local[:80]}.{suffix}@{email_domain}",
             fake.phone_number()[:20],
             fake.first_name(),
             fake.last_name(),
             fake.date_of_birth(minimum_age=18, maximum_age=80),
             random.choice(countries),
-            fake.city(),
+            city(),
             random.choice(registration_sources),
             fake.date_time_between(start_date=start_date_1y, end_date=end_date)
         )
-        users.append(record)
+        yield record
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} пользователей")
-    
-    return users
 
-def generate_products_data(num_records):
+def generate_products_data(num_records, start=0):
     """Генерация данных продуктов"""
     fake = Faker()
-    products = []
+    progress = progress_interval()
+    company = pool_sampler('company')
     
     categories = {
         'electronics': ['smartphones', 'laptops', 'tablets', 'headphones', 'cameras'],
@@ -87,7 +84,7 @@ def generate_products_data(num_records):
     colors = ['black', 'white', 'red', 'blue', 'green', 'yellow', 'purple', 'pink', 'gray', 'brown']
     sizes = ['XS', 'S', 'M', 'L', 'XL', 'XXL', 'XXXL']
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         category = random.choice(list(categories.keys()))
         subcategory = random.choice(categories[category])
         brand = random.choice(brands[category])
@@ -99,47 +96,38 @@ def generate_products_data(num_records):
             category,
             subcategory,
             random.randint(1, 100),
-            fake.company(),
+            company(),
             random.choice(colors),
             random.choice(sizes) if category == 'clothing' else None,
             round(random.uniform(0.1, 50.0), 3),
             round(random.uniform(10, 2000), 2),
             random.choice([True, False])
         )
-        products.append(record)
+        yield record
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} продуктов")
-    
-    return products
 
-def generate_orders_data(num_records, max_customer_id):
+def generate_orders_data(num_records, max_customer_id, start=0):
     """Генерация данных заказов"""
     fake = Faker()
-    orders = []
+    progress = progress_interval()
     
     order_statuses = ['pending', 'confirmed', 'shipped', 'delivered', 'cancelled', 'returned']
     payment_methods = ['credit_card', 'debit_card', 'paypal', 'bank_transfer', 'cash']
     shipping_methods = ['standard', 'express', 'overnight', 'pickup']
     
-    used_order_numbers = set()
+    order_number = unique_codes('bloom_order_number', 6, 'ORD')
     
     # Диапазон дат для заказов
-    end_date = datetime.now()
+    end_date = reference_now()
     start_date_2y = end_date - timedelta(days=2*365)
     
-    for i in range(num_records):
-        # Генерируем уникальный номер заказа
-        while True:
-            order_number = f"ORD{random.randint(100000, 999999)}"
-            if order_number not in used_order_numbers:
-                used_order_numbers.add(order_number)
-                break
-        
+    for i in range(start, start + num_records):
         order_date = fake.date_between(start_date=start_date_2y, end_date=end_date)
         
         record = (
-            order_number,
+            order_number(i),  # уникальный номер заказа
             random.randint(1, max_customer_id),
             random.choice(order_statuses),
             random.choice(payment_methods),
@@ -151,17 +139,18 @@ def generate_orders_data(num_records, max_customer_id):
             order_date,
             order_date + timedelta(days=random.randint(1, 14)) if random.random() > 0.2 else None
         )
-        orders.append(record)
+        yield record
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} заказов")
-    
-    return orders
 
-def generate_security_logs(num_records, max_user_id):
+def generate_security_logs(num_records, max_user_id, start=0):
     """Генерация логов безопасности"""
     fake = Faker()
-    security_logs = []
+    progress = progress_interval()
+    ipv4 = pool_sampler('ipv4')
+    user_agent = pool_sampler('user_agent')
+    city = pool_sampler('city')
     
     event_types = ['login', 'logout', 'password_change', 'profile_update', 'failed_login', 
                    'suspicious_activity', 'permission_change', 'data_access']
@@ -171,54 +160,45 @@ def generate_security_logs(num_records, max_user_id):
     countries = ['United States', 'Russia', 'Germany', 'France', 'China', 'Japan', 'Brazil', 'India']
     
     # Диапазон дат для логов
-    end_date = datetime.now()
+    end_date = reference_now()
     start_date_1y = end_date - timedelta(days=365)
     
-    for i in range(num_records):
+    for i in range(start, start + num_records):
         record = (
             random.choice(event_types),
             random.randint(1, max_user_id) if random.random() > 0.1 else None,
-            fake.ipv4(),
-            fake.user_agent(),
+            ipv4(),
+            user_agent(),
             random.choice(device_types),
             random.choice(browsers),
             random.choice(operating_systems),
             random.choice(countries),
-            fake.city(),
+            city(),
             random.choice([True, False]),
             fake.text()[:500]
         )
-        security_logs.append(record)
+        yield record
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} логов безопасности")
-    
-    return security_logs
 
-def generate_inventory_data(num_records, max_product_id):
+def generate_inventory_data(num_records, max_product_id, start=0):
     """Генерация данных инвентаря"""
     fake = Faker()
-    inventory = []
+    progress = progress_interval()
     
     location_codes = ['A', 'B', 'C', 'D', 'E', 'F']
     bin_numbers = ['01', '02', '03', '04', '05', '06', '07', '08', '09', '10']
     
-    used_skus = set()
+    sku = unique_codes('bloom_sku', 5, 'SKU')
     
     # Диапазон дат для инвентаря
-    end_date = datetime.now()
+    end_date = reference_now()
     start_date_future = end_date + timedelta(days=365)
     
-    for i in range(num_records):
-        # Генерируем уникальный SKU
-        while True:
-            sku = f"SKU{random.randint(10000, 99999)}"
-            if sku not in used_skus:
-                used_skus.add(sku)
-                break
-        
+    for i in range(start, start + num_records):
         record = (
-            sku,
+            sku(i),  # уникальный SKU
             random.randint(1, max_product_id),
             random.randint(1, 10),
             f"{random.choice(location_codes)}{random.randint(1, 20)}",
@@ -230,12 +210,48 @@ def generate_inventory_data(num_records, max_product_id):
             fake.date_between(start_date=end_date, end_date=start_date_future) if random.random() > 0.7 else None,
             f"SUP{random.randint(100, 999)}"
         )
-        inventory.append(record)
+        yield record
         
-        if i % 10000 == 0 and i > 0:
+        if i % progress == 0 and i > 0:
             print(f"Сгенерировано {i} записей инвентаря")
-    
-    return inventory
+
+def load_tasks():
+    """Таблицы исследования: параметры load_tables_parallel для каждой таблицы"""
+    # Диапазоны внешних ключей соответствуют числу пользователей и продуктов
+    num_users = scaled(100000)
+    num_products = scaled(80000)
+    return [
+        # Генерация пользователей
+        {'title': 'пользователей', 'table': 'users',
+         'columns': ['username', 'email', 'phone', 'first_name', 'last_name', 'date_of_birth',
+                     'country_code', 'city', 'registration_source', 'last_login'],
+         'generator': generate_users_data, 'num_records': num_users},
+        # Генерация продуктов
+        {'title': 'продуктов', 'table': 'products',
+         'columns': ['product_code', 'name', 'brand', 'category', 'subcategory', 'supplier_id',
+                     'manufacturer', 'color', 'size', 'weight_kg', 'price', 'in_stock'],
+         'generator': generate_products_data, 'num_records': num_products},
+        # Генерация заказов
+        {'title': 'заказов', 'table': 'orders',
+         'columns': ['order_number', 'customer_id', 'order_status', 'payment_method', 'shipping_method',
+                     'warehouse_id', 'sales_rep_id', 'total_amount', 'discount_amount', 'order_date',
+                     'delivery_date'],
+         'generator': generate_orders_data, 'num_records': scaled(150000),
+         'args': (num_users,)},
+        # Генерация логов безопасности
+        {'title': 'логов безопасности', 'table': 'security_logs',
+         'columns': ['event_type', 'user_id', 'ip_address', 'user_agent', 'device_type', 'browser',
+                     'os', 'country', 'city', 'success', 'details'],
+         'generator': generate_security_logs, 'num_records': scaled(200000),
+         'args': (num_users,)},
+        # Генерация данных инвентаря
+        {'title': 'записей инвентаря', 'table': 'inventory',
+         'columns': ['sku', 'product_id', 'warehouse_id', 'location_code', 'bin_number', 'quantity',
+                     'reserved_quantity', 'reorder_level', 'batch_number', 'expiry_date',
+                     'supplier_batch'],
+         'generator': generate_inventory_data, 'num_records': scaled(80000),
+         'args': (num_products,)}
+    ]
 
 def main():
     config = DB_CONFIG.copy()
@@ -249,101 +265,13 @@ def main():
         
         print("Генерация данных для Bloom индексов...")
         
-        # Генерация пользователей
-        print("Генерация 100,000 пользователей...")
-        users_data = generate_users_data(100000)
-        
-        print("Вставка пользователей в БД...")
-        users_sql = """
-            INSERT INTO users (username, email, phone, first_name, last_name, date_of_birth, country_code, city, registration_source, last_login) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        batch_size = 1000
-        success_count = 0
-        for i in range(0, len(users_data), batch_size):
-            batch = users_data[i:i + batch_size]
-            try:
-                cursor.executemany(users_sql, batch)
-                conn.commit()
-                success_count += len(batch)
-                print(f"Вставлено {success_count} пользователей")
-            except Exception as e:
-                conn.rollback()
-                print(f"Ошибка в пакете, вставляем по одному...")
-                for record in batch:
-                    try:
-                        cursor.execute(users_sql, record)
-                        conn.commit()
-                        success_count += 1
-                    except:
-                        conn.rollback()
-                        continue
-                print(f"Вставлено {success_count} пользователей")
-        
-        # Генерация продуктов
-        print("Генерация 80,000 продуктов...")
-        products_data = generate_products_data(80000)
-        
-        print("Вставка продуктов в БД...")
-        products_sql = """
-            INSERT INTO products (product_code, name, brand, category, subcategory, supplier_id, manufacturer, color, size, weight_kg, price, in_stock) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        for i in range(0, len(products_data), batch_size):
-            batch = products_data[i:i + batch_size]
-            cursor.executemany(products_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} продуктов")
-        
-        # Генерация заказов
-        print("Генерация 150,000 заказов...")
-        orders_data = generate_orders_data(150000, 100000)
-        
-        print("Вставка заказов в БД...")
-        orders_sql = """
-            INSERT INTO orders (order_number, customer_id, order_status, payment_method, shipping_method, warehouse_id, sales_rep_id, total_amount, discount_amount, order_date, delivery_date) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        for i in range(0, len(orders_data), batch_size):
-            batch = orders_data[i:i + batch_size]
-            cursor.executemany(orders_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} заказов")
-        
-        # Генерация логов безопасности
-        print("Генерация 200,000 логов безопасности...")
-        security_logs_data = generate_security_logs(200000, 100000)
-        
-        print("Вставка логов безопасности в БД...")
-        security_sql = """
-            INSERT INTO security_logs (event_type, user_id, ip_address, user_agent, device_type, browser, os, country, city, success, details) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        for i in range(0, len(security_logs_data), batch_size):
-            batch = security_logs_data[i:i + batch_size]
-            cursor.executemany(security_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} логов безопасности")
-        
-        # Генерация данных инвентаря (уменьшаем до 80,000 чтобы избежать проблем с уникальностью)
-        print("Генерация 80,000 записей инвентаря...")
-        inventory_data = generate_inventory_data(80000, 80000)
+        # Подготовка таблиц к загрузке (в режиме phased - UNLOGGED без PK/UNIQUE)
+        phases = prepare_load(conn)
         
-        print("Вставка инвентаря в БД...")
-        inventory_sql = """
-            INSERT INTO inventory (sku, product_id, warehouse_id, location_code, bin_number, quantity, reserved_quantity, reorder_level, batch_number, expiry_date, supplier_batch) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
+        load_tables_parallel(conn, load_tasks())
         
-        for i in range(0, len(inventory_data), batch_size):
-            batch = inventory_data[i:i + batch_size]
-            cursor.executemany(inventory_sql, batch)
-            conn.commit()
-            print(f"Вставлено {i + len(batch)} записей инвентаря")
+        # Ограничения, ANALYZE и возврат в LOGGED; время каждой фазы
+        finalize_load(conn, phases)
         
         print("Данные успешно сгенерированы!")
         
@@ -0,0 +1,447 @@
+"""
+Запуск файлов запросов 03/05 с повторами и сбором EXPLAIN в JSON
+
+Файл делится на отдельные команды. SET и прочие команды без результата
+выполняются один раз как подготовка, каждый запрос (с EXPLAIN или без него)
+выполняется как EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON): сначала
+BENCHMARK_CONFIG['warmups'] прогревочных запусков, затем
+BENCHMARK_CONFIG['runs'] измеряемых. Для каждого запуска сохраняются время
+выполнения и планирования, shared hit/read буферы, верхний узел плана и
+использованные индексы; по запускам считаются медиана, p95 и стандартное
+отклонение.
+
+Запросы нумеруются по комментариям вида "-- Запрос N: ...", поэтому запрос N
+из 03_queries_before_indexes.sql сопоставляется с запросом N из
+05_queries_after_indexes.sql. Запросы без номера получают идентификатор по
+позиции в файле (x1, x2, ...).
+
+Режим кэша (--cache-mode или BENCHMARK_CONFIG['cache_mode']) задает, что
+находится в кэше перед замерами: none - как есть, warm - отношения плана
+прогреты pg_prewarm, cold - вытеснены из shared_buffers и кэша ОС перед
+каждым замером (см. cache_modes.py). Режим и доля попаданий в кэш
+(hit_ratio = hit / (hit + read)) записываются в результат, как и число
+страниц таблиц, прочитанных по битовой карте (heap_blocks, для BRIN - все
+страницы диапазонов, подходящих под условие).
+Если запрос завершился ошибкой (например, по statement_timeout), в результат
+записываются его текст ошибки (error) и stats = None, и замер файла
+продолжается со следующего запроса.
+
+Пример:
+    python shared/benchmark.py 1_B-tree/03_queries_before_indexes.sql --runs 10
+    python shared/benchmark.py 6_BRIN --format csv
+    python shared/benchmark.py 7_Bloom --cache-mode cold
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import psycopg2
+
+from database_config import BENCHMARK_CONFIG
+from utils import get_db_connection
+from cache_modes import CACHE_MODES, cache_mode, make_cold, plan_relations, prewarm
+from results_store import record_run
+
+QUERY_FILES = ['03_queries_before_indexes.sql', '05_queries_after_indexes.sql']
+QUERY_NUMBER = re.compile(r'Запрос\s+(\d+)\s*:?\s*(.*)')
+EXPLAIN_PREFIX = re.compile(r'^\s*EXPLAIN\s*(\([^)]*\)|\s+ANALYZE\b|\s+VERBOSE\b)*\s*', re.I)
+# Метрики запуска, по которым считается статистика
+METRICS = ['execution_ms', 'planning_ms', 'shared_hit', 'shared_read', 'hit_ratio', 'heap_blocks']
+
+def split_statements(sql):
+    """Разбиение SQL на команды: список пар (комментарии перед командой, команда)
+
+    Учитываются строки в кавычках, $$-строки и комментарии, поэтому ';'
+    внутри них не разделяет команды.
+    """
+    statements = []
+    comments = []
+    current = []
+    i = 0
+    length = len(sql)
+    while i < length:
+        char = sql[i]
+        if sql.startswith('--', i):
+            end = sql.find('\n', i)
+            end = length if end == -1 else end
+            if not ''.join(current).strip():
+                comments.append(sql[i + 2:end].strip())
+            else:
+                current.append(sql[i:end])
+            i = end
+        elif sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+        elif char in ("'", '"'):
+            end = i + 1
+            while end < length:
+                if sql[end] == char:
+                    if end + 1 < length and sql[end + 1] == char:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            current.append(sql[i:end + 1])
+            i = end + 1
+        elif char == '$':
+            match = re.match(r'\$[A-Za-z_]*\$', sql[i:])
+            if match:
+                tag = match.group(0)
+                end = sql.find(tag, i + len(tag))
+                end = length if end == -1 else end + len(tag)
+                current.append(sql[i:end])
+                i = end
+            else:
+                current.append(char)
+                i += 1
+        elif char == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append((comments, statement))
+            comments = []
+            current = []
+            i += 1
+        else:
+            current.append(char)
+            i += 1
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append((comments, statement))
+    return statements
+
+def strip_explain(statement):
+    """Запрос без префикса EXPLAIN (...), если он есть"""
+    if re.match(r'\s*EXPLAIN\b', statement, re.I):
+        return EXPLAIN_PREFIX.sub('', statement, count=1)
+    return statement
+
+def _is_query(statement):
+    """Возвращает ли команда строки (запрос для замера)"""
+    return bool(re.match(r'\s*(SELECT|WITH|VALUES|TABLE)\b', strip_explain(statement), re.I))
+
+def load_queries(path):
+    """Команды файла: подготовительные (setup) и запросы с идентификаторами"""
+    with open(path, 'r', encoding='utf-8') as file:
+        statements = split_statements(file.read())
+
+    setup = []
+    queries = []
+    unnumbered = 0
+    for comments, statement in statements:
+        if not _is_query(statement):
+            setup.append(statement)
+            continue
+        query_id, title = None, ''
+        for comment in reversed(comments):
+            match = QUERY_NUMBER.search(comment)
+            if match:
+                query_id, title = match.group(1), match.group(2).strip()
+                break
+        if query_id is None:
+            unnumbered += 1
+            query_id = f"x{unnumbered}"
+            title = comments[-1] if comments else ''
+        queries.append({
+            'id': query_id,
+            'title': title,
+            'sql': strip_explain(statement)
+        })
+    return setup, queries
+
+def _plan_nodes(node):
+    """Все узлы плана (обход в глубину)"""
+    yield node
+    for child in node.get('Plans', []):
+        yield from _plan_nodes(child)
+
+def explain_query(cursor, sql):
+    """Один запуск EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON): метрики запуска"""
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+    result = cursor.fetchone()[0]
+    if isinstance(result, str):
+        result = json.loads(result)
+    explain = result[0]
+    plan = explain['Plan']
+    nodes = list(_plan_nodes(plan))
+    hit = plan.get('Shared Hit Blocks', 0)
+    read = plan.get('Shared Read Blocks', 0)
+    return {
+        'execution_ms': explain.get('Execution Time'),
+        'planning_ms': explain.get('Planning Time'),
+        'shared_hit': hit,
+        'shared_read': read,
+        'hit_ratio': hit / (hit + read) if hit + read else None,
+        # Страницы таблиц, прочитанные по битовой карте (для BRIN - все страницы подходящих диапазонов)
+        'heap_blocks': sum(node.get('Exact Heap Blocks', 0) + node.get('Lossy Heap Blocks', 0)
+                           for node in nodes if node['Node Type'] == 'Bitmap Heap Scan'),
+        'node_type': plan['Node Type'],
+        'scan_types': sorted({node['Node Type'] for node in nodes if 'Relation Name' in node}),
+        'indexes': sorted({node['Index Name'] for node in nodes if 'Index Name' in node}),
+        'relations': sorted({node['Relation Name'] for node in nodes if 'Relation Name' in node}),
+        'plan': plan
+    }
+
+def percentile(values, fraction):
+    """Перцентиль с линейной интерполяцией (fraction от 0 до 1)"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * fraction
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def summarize(values):
+    """Медиана, p95, стандартное отклонение, минимум, максимум и среднее"""
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {
+        'median': statistics.median(values),
+        'p95': percentile(values, 0.95),
+        'stddev': statistics.stdev(values) if len(values) > 1 else 0.0,
+        'min': min(values),
+        'max': max(values),
+        'mean': statistics.mean(values)
+    }
+
+def benchmark_query(cursor, query, runs=None, warmups=None, before_run=None):
+    """Прогрев и замеры одного запроса: запуски, их статистика и план
+
+    before_run(cursor) вызывается перед каждым замером и возвращает курсор
+    для него (см. режим cold в cache_modes.py).
+    """
+    runs = runs or BENCHMARK_CONFIG['runs']
+    warmups = BENCHMARK_CONFIG['warmups'] if warmups is None else warmups
+    for _ in range(warmups):
+        explain_query(cursor, query['sql'])
+    samples = []
+    for _ in range(runs):
+        if before_run:
+            cursor = before_run(cursor)
+        samples.append(explain_query(cursor, query['sql']))
+    last = samples[-1]
+    return {
+        'id': query['id'],
+        'title': query['title'],
+        'sql': query['sql'],
+        'node_type': last['node_type'],
+        'scan_types': last['scan_types'],
+        'indexes': sorted({name for sample in samples for name in sample['indexes']}),
+        'relations': last['relations'],
+        'stats': {metric: summarize([sample[metric] for sample in samples]) for metric in METRICS},
+        'samples': [{key: sample[key] for key in METRICS} for sample in samples],
+        'plan': last['plan'] if BENCHMARK_CONFIG.get('keep_plans', True) else None
+    }
+
+def failed_query(query, error):
+    """Результат запроса, замер которого завершился ошибкой: stats = None и текст ошибки"""
+    return {
+        'id': query['id'],
+        'title': query['title'],
+        'sql': query['sql'],
+        'node_type': None,
+        'scan_types': [],
+        'indexes': [],
+        'relations': [],
+        'stats': None,
+        'samples': [],
+        'plan': None,
+        'error': str(error).strip().splitlines()[0]
+    }
+
+def run_benchmark(conn, path, runs=None, warmups=None, query_ids=None, mode=None):
+    """Замер всех запросов файла; возвращает результат в виде словаря
+
+    mode - режим кэша (none, warm, cold; по умолчанию BENCHMARK_CONFIG['cache_mode']).
+    Если для холодного замера перезапускался кластер, conn после замера закрыт
+    (в результате reconnected = True): продолжать следует с соединением от reconnect().
+    """
+    setup, queries = load_queries(path)
+    if query_ids:
+        queries = [query for query in queries if query['id'] in query_ids]
+    runs = runs or BENCHMARK_CONFIG['runs']
+    warmups = BENCHMARK_CONFIG['warmups'] if warmups is None else warmups
+    mode = cache_mode(mode)
+    if mode == 'cold':
+        warmups = 0
+    if BENCHMARK_CONFIG.get('statement_timeout'):
+        setup = setup + [f"SET statement_timeout = '{BENCHMARK_CONFIG['statement_timeout']}'"]
+
+    conn.autocommit = True
+    results = []
+    cursor = conn.cursor()
+    try:
+        for statement in setup:
+            cursor.execute(statement)
+        cursor.execute("SELECT current_schema()")
+        schema = cursor.fetchone()[0]
+        for query in queries:
+            print(f"Запрос {query['id']}: {query['title'] or query['sql'].splitlines()[0]}")
+            try:
+                relations = plan_relations(cursor, query['sql']) if mode != 'none' else []
+                before_run = None
+                if mode == 'warm':
+                    prewarm(cursor, relations)
+                elif mode == 'cold':
+                    def before_run(run_cursor):
+                        nonlocal cursor
+                        cursor = make_cold(run_cursor, relations, setup)
+                        return cursor
+                result = benchmark_query(cursor, query, runs, warmups, before_run)
+            except psycopg2.Error as e:
+                # Ошибка или statement_timeout одного запроса не прерывает замер файла;
+                # потерянное соединение - прерывает
+                if cursor.connection.closed:
+                    raise
+                result = failed_query(query, e)
+                print(f"  ошибка: {result['error']}")
+                result['cache_mode'] = mode
+                results.append(result)
+                continue
+            result['error'] = None
+            result['cache_mode'] = mode
+            stats = result['stats']['execution_ms']
+            hits = result['stats']['hit_ratio']
+            print(f"  медиана {stats['median']:.3f} мс, p95 {stats['p95']:.3f} мс, "
+                  f"stddev {stats['stddev']:.3f} мс, узел {result['node_type']}, "
+                  f"попадания в кэш {hits['median'] * 100 if hits else 0:.0f}%")
+            results.append(result)
+    finally:
+        reconnected = cursor.connection is not conn
+        if reconnected:
+            cursor.connection.close()
+        cursor.close()
+
+    return {
+        'file': os.path.relpath(path),
+        'study': os.path.basename(os.path.dirname(os.path.abspath(path))),
+        'schema': schema,
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'runs': runs,
+        'warmups': warmups,
+        'cache_mode': mode,
+        'reconnected': reconnected,
+        'queries': results
+    }
+
+def reconnect(conn, result):
+    """Соединение для работы после run_benchmark: conn или, если кластер перезапускался, новое
+    с search_path схемы замера"""
+    if not result.get('reconnected'):
+        return conn
+    conn.close()
+    conn = get_db_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(f"SET search_path TO {result['schema']}")
+    conn.commit()
+    return conn
+
+def csv_rows(result):
+    """Строки сводной таблицы (по одной на запрос) для CSV"""
+    for query in result['queries']:
+        row = {
+            'study': result['study'],
+            'file': os.path.basename(result['file']),
+            'query_id': query['id'],
+            'title': query['title'],
+            'node_type': query['node_type'],
+            'scan_types': ' '.join(query['scan_types']),
+            'indexes': ' '.join(query['indexes']),
+            'cache_mode': result.get('cache_mode', 'none'),
+            'runs': result['runs'],
+            'error': query.get('error')
+        }
+        for metric in METRICS:
+            stats = (query['stats'] or {}).get(metric) or {}
+            for name in ('median', 'p95', 'stddev'):
+                row[f"{metric}_{name}"] = stats.get(name)
+        yield row
+
+def write_output(name, result, rows, output_dir=None, output_format=None, store=True):
+    """Запись результата в JSON и строк в CSV как {name}_{время}; возвращает пути к файлам
+
+    При store и заданном BENCHMARK_CONFIG['results_store'] результат также
+    сохраняется как запуск в хранилище результатов (см. results_store.py).
+    """
+    output_dir = output_dir or BENCHMARK_CONFIG['output_dir']
+    output_format = output_format or BENCHMARK_CONFIG.get('output_format', 'both')
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    paths = []
+    if output_format in ('json', 'both'):
+        with open(base + '.json', 'w', encoding='utf-8') as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+        paths.append(base + '.json')
+    if output_format in ('csv', 'both'):
+        rows = list(rows)
+        with open(base + '.csv', 'w', encoding='utf-8', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=list(rows[0]) if rows else ['study'])
+            writer.writeheader()
+            writer.writerows(rows)
+        paths.append(base + '.csv')
+    if store and BENCHMARK_CONFIG.get('results_store'):
+        try:
+            print(f"Запуск {record_run(name, result)} сохранен в {BENCHMARK_CONFIG['results_store']}")
+        except Exception as e:
+            print(f"Результат не сохранен в хранилище: {str(e).strip()}")
+    return paths
+
+def write_results(result, output_dir=None, output_format=None):
+    """Запись результата в JSON и/или CSV; возвращает пути к файлам"""
+    stem = os.path.splitext(os.path.basename(result['file']))[0]
+    return write_output(f"{result['study']}_{stem}", result, csv_rows(result), output_dir, output_format)
+
+def query_files(paths):
+    """Файлы запросов: указанные файлы и файлы 03/05 из указанных каталогов"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, name) for name in QUERY_FILES
+                      if os.path.exists(os.path.join(path, name))]
+        else:
+            files.append(path)
+    return files
+
+def main():
+    parser = argparse.ArgumentParser(description="Повторный запуск запросов с EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)")
+    parser.add_argument('paths', nargs='+', help="файлы запросов или каталоги исследований")
+    parser.add_argument('--runs', type=int, default=BENCHMARK_CONFIG['runs'], help="число замеров")
+    parser.add_argument('--warmups', type=int, default=BENCHMARK_CONFIG['warmups'],
+                        help="число прогревочных запусков")
+    parser.add_argument('--queries', nargs='*', help="идентификаторы запросов (по умолчанию все)")
+    parser.add_argument('--output-dir', default=BENCHMARK_CONFIG['output_dir'], help="каталог результатов")
+    parser.add_argument('--cache-mode', choices=CACHE_MODES, default=BENCHMARK_CONFIG.get('cache_mode', 'none'),
+                        help="состояние кэша перед замерами")
+    parser.add_argument('--format', choices=['json', 'csv', 'both'],
+                        default=BENCHMARK_CONFIG.get('output_format', 'both'), help="формат результатов")
+    options = parser.parse_args()
+
+    try:
+        for path in query_files(options.paths):
+            print(f"=== {path} ===")
+            start_time = time.time()
+            # Отдельное соединение на файл: в режиме cold кластер может перезапускаться
+            conn = get_db_connection()
+            try:
+                result = run_benchmark(conn, path, options.runs, options.warmups, options.queries,
+                                       options.cache_mode)
+            finally:
+                conn.close()
+            for output in write_results(result, options.output_dir, options.format):
+                print(f"Результаты: {output}")
+            print(f"Время: {time.time() - start_time:.1f} с")
+    except Exception as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Деградация BRIN при нарушении порядка строк во времени
+
+Для таблиц 6_BRIN с меткой времени (time_series_data, access_logs) данные
+генерируются заново в копию brin_order_<таблица> в режиме append
+(time_order.py) для каждой доли "опоздавших" строк из
+BENCHMARK_CONFIG['brin_order_late_fractions'], а для сравнения - в режиме
+random. На копии есть только BRIN-индекс по столбцу времени (pages_per_range
+по умолчанию), а Seq Scan отключен, так что замеряется именно BRIN.
+
+Для каждого порядка записываются корреляция столбца (pg_stats.correlation
+после ANALYZE) и, для окон времени из brin_order_windows (часов; начало окна
+- время существующей строки, как в workload.py), среднее по запросам:
+    heap_blocks   - страниц, прочитанных по BRIN (Bitmap Heap Scan);
+    ideal_blocks  - страниц, на которых действительно лежат подходящие строки;
+    amplification - heap_blocks / ideal_blocks, во сколько раз BRIN читает больше нужного;
+    rechecked     - строк, отброшенных перепроверкой условия;
+    execution_ms  - медиана времени выполнения.
+
+Исходные таблицы не меняются, копии удаляются после замера.
+
+Пример:
+    python shared/brin_order.py
+    python shared/brin_order.py --tables access_logs --late-fractions 0 0.01 0.1 --rows 200000
+"""
+
+import argparse
+import random
+import statistics
+import sys
+from datetime import datetime, timedelta
+
+from database_config import BENCHMARK_CONFIG, GENERATION_CONFIG
+from utils import get_db_connection
+from benchmark import _plan_nodes, explain_query, write_output
+from compare import SCHEMAS
+from ingest import create_copy, study_module
+from sharding import load_generated
+from time_order import column_correlation, time_order
+from workload import window
+
+STUDY = '6_BRIN'
+# Таблицы с меткой времени, порядок строк которых задает time_order.py
+TIME_COLUMNS = {'time_series_data': 'measurement_time', 'access_logs': 'access_time'}
+
+def load_ordered_copy(conn, task, copy, column, num_records, order):
+    """Копия таблицы, сгенерированная в заданном порядке, с BRIN-индексом по времени"""
+    create_copy(conn, task['table'], copy, [], [])
+    # Одно соединение: при параллельной загрузке частей страницы перемешиваются, и порядок строк теряется
+    load_generated(conn, copy, task['columns'], task['generator'], num_records,
+                   args=(num_records, order), vectorized=task.get('vectorized'), connections=1)
+    index = f"{copy}_{column}_brin"
+    with conn.cursor() as cursor:
+        cursor.execute(f"CREATE INDEX {index} ON {copy} USING BRIN ({column})")
+        cursor.execute(f"ANALYZE {copy}")
+        cursor.execute("""
+            SELECT pg_relation_size(%s::regclass),
+                   pg_relation_size(%s::regclass) / current_setting('block_size')::int
+        """, (index, copy))
+        index_size, table_blocks = cursor.fetchone()
+    conn.commit()
+    return index_size, table_blocks
+
+def measure_window(cursor, copy, column, hours, queries, sample_size):
+    """Запросы-окна одной ширины: средние страницы, перепроверки и медиана времени"""
+    rng = random.Random(f"{GENERATION_CONFIG['seed']}:{copy}:{hours}")
+    draw = window(copy, column, timedelta(hours=hours))(cursor, rng, sample_size)
+    samples = []
+    for _ in range(queries):
+        params = draw()
+        condition = cursor.mogrify(f"{column} BETWEEN %(start)s AND %(end)s", params).decode()
+        explain = explain_query(cursor, f"SELECT * FROM {copy} WHERE {condition}")
+        cursor.execute(f"""
+            SELECT count(DISTINCT (ctid::text::point)[0]) FROM {copy} WHERE {condition}
+        """)
+        samples.append({
+            'heap_blocks': explain['heap_blocks'],
+            'ideal_blocks': cursor.fetchone()[0],
+            'rechecked': sum(node.get('Rows Removed by Index Recheck', 0) for node in _plan_nodes(explain['plan'])),
+            'execution_ms': explain['execution_ms'],
+            'brin': bool(explain['indexes'])
+        })
+    heap = sum(sample['heap_blocks'] for sample in samples)
+    ideal = sum(sample['ideal_blocks'] for sample in samples)
+    return {
+        'window_hours': hours,
+        'heap_blocks': heap / len(samples),
+        'ideal_blocks': ideal / len(samples),
+        'amplification': heap / ideal if ideal else None,
+        'rechecked': statistics.mean(sample['rechecked'] for sample in samples),
+        'execution_ms': statistics.median(sample['execution_ms'] for sample in samples),
+        'brin_used': all(sample['brin'] for sample in samples)
+    }
+
+def benchmark_table(conn, task, orders, windows, queries, num_records, sample_size):
+    """Замеры одной таблицы для всех порядков строк"""
+    table = task['table']
+    column = TIME_COLUMNS[table]
+    copy = f"brin_order_{table}"
+    rows = []
+    try:
+        for label, order in orders:
+            print(f"--- {table}: {label} ---")
+            index_size, table_blocks = load_ordered_copy(conn, task, copy, column, num_records, order)
+            correlation = column_correlation(conn, copy, column)
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+                for hours in windows:
+                    row = {
+                        'table': table,
+                        'order': label,
+                        'late_fraction': order[1] if order[0] == 'append' else None,
+                        'jitter': order[3] if order[0] == 'append' else None,
+                        'correlation': correlation,
+                        'index_size': index_size,
+                        'table_blocks': table_blocks,
+                        **measure_window(cursor, copy, column, hours, queries, sample_size)
+                    }
+                    rows.append(row)
+                    print_row(row)
+                cursor.execute("RESET enable_seqscan")
+            conn.autocommit = False
+    finally:
+        conn.autocommit = False
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {copy}")
+        conn.commit()
+    return rows
+
+def print_row(row):
+    """Строка результата одного порядка и ширины окна"""
+    amplification = f"{row['amplification']:.1f}x" if row['amplification'] is not None else '-'
+    note = '' if row['brin_used'] else '  (BRIN не использован)'
+    print(f"  корреляция {row['correlation']:>7.4f}  окно {row['window_hours']:>5g} ч  "
+          f"страниц {row['heap_blocks']:>9.0f} из {row['table_blocks']:,} (нужно {row['ideal_blocks']:.0f}, "
+          f"{amplification})  перепроверено {row['rechecked']:>9.0f}  {row['execution_ms']:>8.3f} мс{note}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Деградация BRIN при нарушении порядка строк во времени")
+    parser.add_argument('--tables', nargs='+', default=list(TIME_COLUMNS), choices=list(TIME_COLUMNS),
+                        help="таблицы 6_BRIN")
+    parser.add_argument('--late-fractions', nargs='+', type=float,
+                        default=BENCHMARK_CONFIG['brin_order_late_fractions'], help="доли опоздавших строк")
+    parser.add_argument('--late-max-delay', type=int, default=GENERATION_CONFIG.get('late_max_delay', 3600),
+                        help="наибольшее опоздание, секунд")
+    parser.add_argument('--jitter', type=int, default=GENERATION_CONFIG.get('time_jitter', 0),
+                        help="разброс времени соседних строк, +- секунд")
+    parser.add_argument('--windows', nargs='+', type=float, default=BENCHMARK_CONFIG['brin_order_windows'],
+                        help="ширины окон запросов, часов")
+    parser.add_argument('--queries', type=int, default=BENCHMARK_CONFIG['brin_order_queries'],
+                        help="запросов на каждую ширину окна")
+    parser.add_argument('--rows', type=int, help="ограничение числа строк на таблицу")
+    parser.add_argument('--output-dir', default=BENCHMARK_CONFIG['output_dir'], help="каталог результатов")
+    options = parser.parse_args()
+
+    orders = [(f"append, опоздавших {fraction * 100:g}%",
+               time_order('append', fraction, options.late_max_delay, options.jitter))
+              for fraction in options.late_fractions]
+    orders.append(('random', time_order('random')))
+
+    conn = get_db_connection()
+    started = datetime.now().isoformat(timespec='seconds')
+    rows = []
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SET search_path TO {SCHEMAS[STUDY]}")
+        conn.commit()
+        for task in study_module(STUDY).load_tasks():
+            if task['table'] not in options.tables:
+                continue
+            num_records = min(task['num_records'], options.rows) if options.rows else task['num_records']
+            rows += benchmark_table(conn, task, orders, options.windows, options.queries, num_records,
+                                    BENCHMARK_CONFIG['workload_sample'])
+        result = {'started': started, 'late_max_delay': options.late_max_delay, 'jitter': options.jitter,
+                  'brin_order': rows}
+        for output in write_output('brin_order', result, rows, options.output_dir):
+            print(f"Результаты: {output}")
+    except Exception as e:
+        conn.rollback()
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Непрерывная дозапись в таблицу 6_BRIN и отставание суммаризации BRIN
+
+Новые строки попадают в диапазоны страниц, которые BRIN еще не
+суммаризировал, а такие диапазоны индекс всегда отдает как подходящие: пока
+суммаризации нет, запрос к свежим данным читает все несуммаризированные
+страницы. Здесь копия brin_stream_<таблица> (access_logs или
+time_series_data) сначала загружается BENCHMARK_CONFIG['brin_stream_initial_rows']
+строками в порядке времени (time_order.py), затем на ней одновременно
+работают:
+    писатель     - вставляет строки генератора исследования с текущим
+                   временем со скоростью brin_stream_rate строк в секунду
+                   (пачки каждые 0.1 с, каждая - одна команда INSERT с
+                   несколькими VALUES в отдельной транзакции); достигнутая
+                   скорость записывается рядом с заданной;
+    читатель     - каждые brin_stream_read_interval секунд выполняет запрос
+                   к последним brin_stream_window секундам и пробный запрос,
+                   которому не подходит ни одна строка: страницы, прочитанные
+                   пробным запросом, - это несуммаризированные страницы;
+    суммаризация - в зависимости от режима:
+        autosummarize - индекс WITH (autosummarize = on), диапазоны
+                        суммаризирует autovacuum (не чаще autovacuum_naptime);
+        function      - brin_summarize_new_values() каждые
+                        brin_stream_summarize_interval секунд;
+        vacuum        - VACUUM копии с тем же интервалом;
+        none          - без суммаризации (база для сравнения).
+Во всех режимах, кроме autosummarize, autovacuum для копии отключен.
+Seq Scan у читателя отключен, чтобы замерялся именно путь через BRIN.
+
+Для каждого режима записываются задержки чтения свежих данных (медиана, p95,
+максимум), страницы, прочитанные по BRIN, и несуммаризированные страницы
+(среднее и максимум), число и суммарное время вызовов суммаризации и ее доля
+от длительности замера, а также временной ряд замеров читателя.
+
+Пример:
+    python shared/brin_stream.py
+    python shared/brin_stream.py --table time_series_data --modes function vacuum --rate 5000 --duration 60
+"""
+
+import argparse
+import itertools
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from psycopg2.extras import execute_values
+
+from database_config import BENCHMARK_CONFIG
+from utils import get_db_connection
+from benchmark import explain_query, percentile, write_output
+from brin_order import STUDY, TIME_COLUMNS
+from compare import SCHEMAS
+from ingest import create_copy, study_module
+from sharding import load_generated
+from time_order import time_order
+
+SUMMARIZE_MODES = ['autosummarize', 'function', 'vacuum', 'none']
+# Период пачек писателя, секунд
+WRITE_TICK = 0.1
+
+def prepare_copy(conn, task, copy, column, mode, pages_per_range, initial_rows):
+    """Копия с начальными строками в порядке времени и BRIN-индексом для режима"""
+    create_copy(conn, task['table'], copy, [], [])
+    if initial_rows:
+        # Одно соединение, чтобы строки легли в кучу в порядке времени и свежие данные были в ее конце
+        load_generated(conn, copy, task['columns'], task['generator'], initial_rows,
+                       args=(initial_rows, time_order('append')), vectorized=task.get('vectorized'),
+                       connections=1)
+    index = f"{copy}_{column}_brin"
+    autosummarize = 'on' if mode == 'autosummarize' else 'off'
+    with conn.cursor() as cursor:
+        cursor.execute(f"CREATE INDEX {index} ON {copy} USING BRIN ({column}) "
+                       f"WITH (pages_per_range = {int(pages_per_range)}, autosummarize = {autosummarize})")
+        if mode != 'autosummarize':
+            cursor.execute(f"ALTER TABLE {copy} SET (autovacuum_enabled = off)")
+        cursor.execute(f"ANALYZE {copy}")
+    conn.commit()
+    return index
+
+def _connect(schema, autocommit=True):
+    """Соединение потока в схеме исследования"""
+    conn = get_db_connection()
+    conn.autocommit = autocommit
+    with conn.cursor() as cursor:
+        cursor.execute(f"SET search_path TO {schema}")
+    conn.commit()
+    return conn
+
+def _writer(schema, copy, task, column, rate, initial_rows, duration, stop):
+    """Вставка строк с текущим временем со скоростью rate строк в секунду; возвращает число строк"""
+    conn = _connect(schema, autocommit=False)
+    position = task['columns'].index(column)
+    # Продолжение той же последовательности, что и в начальной загрузке копии
+    count = int(rate * (duration + 1))
+    rows = task['generator'](count, initial_rows + count, time_order('append'), start=initial_rows)
+    sql = f"INSERT INTO {copy} ({', '.join(task['columns'])}) VALUES %s"
+    inserted = 0
+    try:
+        with conn.cursor() as cursor:
+            start_time = time.perf_counter()
+            while not stop.is_set():
+                due = int(rate * (time.perf_counter() - start_time)) - inserted
+                if due > 0:
+                    # Время строки - текущее: окно читателя отсчитывается от часов
+                    now = datetime.now()
+                    batch = [row[:position] + (now,) + row[position + 1:] for row in itertools.islice(rows, due)]
+                    if not batch:
+                        break
+                    execute_values(cursor, sql, batch, page_size=len(batch))
+                    conn.commit()
+                    inserted += len(batch)
+                stop.wait(WRITE_TICK)
+    finally:
+        conn.rollback()
+        conn.close()
+    return inserted
+
+def _reader(schema, copy, column, window, interval, started, stop):
+    """Запросы к свежему окну и пробные запросы; возвращает замеры"""
+    conn = _connect(schema)
+    samples = []
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET enable_seqscan = off")
+            while not stop.is_set():
+                since = datetime.now() - timedelta(seconds=window)
+                fresh = explain_query(cursor, cursor.mogrify(
+                    f"SELECT count(*) FROM {copy} WHERE {column} >= %s", (since,)).decode())
+                # Суммаризированные диапазоны пробному запросу не подходят, несуммаризированные - всегда
+                probe = explain_query(cursor, f"SELECT count(*) FROM {copy} WHERE {column} > 'infinity'")
+                cursor.execute("SELECT pg_relation_size(%s::regclass) / current_setting('block_size')::int",
+                               (copy,))
+                samples.append({
+                    'seconds': time.time() - started,
+                    'execution_ms': fresh['execution_ms'],
+                    'heap_blocks': fresh['heap_blocks'],
+                    'unsummarized_blocks': probe['heap_blocks'],
+                    'table_blocks': cursor.fetchone()[0],
+                    'brin_used': bool(fresh['indexes'])
+                })
+                stop.wait(interval)
+    finally:
+        conn.close()
+    return samples
+
+def _summarizer(schema, copy, index, mode, interval, started, stop):
+    """Периодическая суммаризация (function или vacuum); возвращает вызовы"""
+    conn = _connect(schema)
+    calls = []
+    try:
+        with conn.cursor() as cursor:
+            while not stop.wait(interval):
+                start_time = time.perf_counter()
+                ranges = None
+                if mode == 'function':
+                    cursor.execute("SELECT brin_summarize_new_values(%s::regclass)", (index,))
+                    ranges = cursor.fetchone()[0]
+                else:
+                    cursor.execute(f"VACUUM {copy}")
+                calls.append({'seconds': time.time() - started, 'duration': time.perf_counter() - start_time,
+                              'ranges': ranges})
+    finally:
+        conn.close()
+    return calls
+
+def summarize_mode(mode, duration, rate, inserted, samples, calls):
+    """Итог режима по замерам читателя и вызовам суммаризации"""
+    latencies = sorted(sample['execution_ms'] for sample in samples)
+    unsummarized = [sample['unsummarized_blocks'] for sample in samples]
+    # Моменты, когда несуммаризированных страниц стало меньше, - суммаризация (в том числе autovacuum)
+    drops = sum(1 for previous, current in zip(unsummarized, unsummarized[1:]) if current < previous)
+    summarize_seconds = sum(call['duration'] for call in calls)
+    return {
+        'mode': mode,
+        'rows_inserted': inserted,
+        'target_rate': rate,
+        'rows_per_second': inserted / duration,
+        'reads': len(samples),
+        'p50_ms': percentile(latencies, 0.5),
+        'p95_ms': percentile(latencies, 0.95),
+        'max_ms': latencies[-1] if latencies else None,
+        'heap_blocks': statistics.mean(sample['heap_blocks'] for sample in samples) if samples else None,
+        'unsummarized_blocks': statistics.mean(unsummarized) if unsummarized else None,
+        'max_unsummarized_blocks': max(unsummarized) if unsummarized else None,
+        'summarizations_seen': drops,
+        'summarize_calls': len(calls),
+        'summarize_seconds': summarize_seconds,
+        'summarize_share': summarize_seconds / duration,
+        'brin_used': all(sample['brin_used'] for sample in samples),
+        'timeline': samples,
+        'calls': calls
+    }
+
+def run_mode(conn, task, mode, options):
+    """Один режим суммаризации на свежей копии"""
+    table = task['table']
+    column = TIME_COLUMNS[table]
+    copy = f"brin_stream_{table}"
+    schema = SCHEMAS[STUDY]
+    print(f"--- {table}: {mode} ---")
+    try:
+        index = prepare_copy(conn, task, copy, column, mode, options.pages_per_range, options.initial_rows)
+        stop = threading.Event()
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            writer = executor.submit(_writer, schema, copy, task, column, options.rate, options.initial_rows,
+                                     options.duration, stop)
+            reader = executor.submit(_reader, schema, copy, column, options.window, options.read_interval,
+                                     started, stop)
+            summarizer = None
+            if mode in ('function', 'vacuum'):
+                summarizer = executor.submit(_summarizer, schema, copy, index, mode, options.summarize_interval,
+                                             started, stop)
+            # Ошибка любого потока прерывает замер
+            deadline = started + options.duration
+            while time.time() < deadline and not any(
+                    future.done() for future in (writer, reader, summarizer) if future):
+                time.sleep(0.2)
+            stop.set()
+            inserted = writer.result()
+            samples = reader.result()
+            calls = summarizer.result() if summarizer else []
+        row = summarize_mode(mode, time.time() - started, options.rate, inserted, samples, calls)
+        row['table'] = table
+        print_row(row)
+        return row
+    finally:
+        conn.rollback()
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {copy}")
+        conn.commit()
+
+def print_row(row):
+    """Строка результата одного режима"""
+    # Писатель не успевает за заданной скоростью - свежих строк меньше, чем предполагает окно
+    note = '  (ниже заданной)' if row['rows_per_second'] < row['target_rate'] * 0.95 else ''
+    print(f"  вставлено {row['rows_inserted']:,} ({row['rows_per_second']:.0f} из {row['target_rate']} строк/с{note}), "
+          f"чтений {row['reads']}")
+    if row['reads']:
+        print(f"  свежие данные: медиана {row['p50_ms']:.3f} мс, p95 {row['p95_ms']:.3f} мс, "
+              f"максимум {row['max_ms']:.3f} мс, страниц по BRIN {row['heap_blocks']:.0f}")
+        print(f"  несуммаризировано страниц: в среднем {row['unsummarized_blocks']:.0f}, "
+              f"максимум {row['max_unsummarized_blocks']}, суммаризаций замечено {row['summarizations_seen']}")
+    if row['summarize_calls']:
+        print(f"  суммаризация: {row['summarize_calls']} вызовов, {row['summarize_seconds']:.2f} с "
+              f"({row['summarize_share'] * 100:.1f}% времени)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Отставание суммаризации BRIN при непрерывной дозаписи")
+    parser.add_argument('--table', default='access_logs', choices=list(TIME_COLUMNS), help="таблица 6_BRIN")
+    parser.add_argument('--modes', nargs='+', default=BENCHMARK_CONFIG['brin_stream_modes'],
+                        choices=SUMMARIZE_MODES, help="режимы суммаризации")
+    parser.add_argument('--rate', type=int, default=BENCHMARK_CONFIG['brin_stream_rate'],
+                        help="строк в секунду")
+    parser.add_argument('--duration', type=float, default=BENCHMARK_CONFIG['brin_stream_duration'],
+                        help="секунд на режим")
+    parser.add_argument('--window', type=float, default=BENCHMARK_CONFIG['brin_stream_window'],
+                        help="окно свежих данных, секунд")
+    parser.add_argument('--read-interval', type=float, default=BENCHMARK_CONFIG['brin_stream_read_interval'],
+                        help="период запросов читателя, секунд")
+    parser.add_argument('--summarize-interval', type=float,
+                        default=BENCHMARK_CONFIG['brin_stream_summarize_interval'],
+                        help="период суммаризации в режимах function и vacuum, секунд")
+    parser.add_argument('--pages-per-range', type=int, default=128, help="pages_per_range индекса")
+    parser.add_argument('--initial-rows', type=int, default=BENCHMARK_CONFIG['brin_stream_initial_rows'],
+                        help="строк в копии до начала дозаписи")
+    parser.add_argument('--output-dir', default=BENCHMARK_CONFIG['output_dir'], help="каталог результатов")
+    options = parser.parse_args()
+
+    conn = get_db_connection()
+    started = datetime.now().isoformat(timespec='seconds')
+    rows = []
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SET search_path TO {SCHEMAS[STUDY]}")
+            cursor.execute("SELECT current_setting('autovacuum_naptime')")
+            naptime = cursor.fetchone()[0]
+        conn.commit()
+        if 'autosummarize' in options.modes:
+            print(f"autovacuum_naptime = {naptime}: в режиме autosummarize диапазоны суммаризируются не чаще")
+        task = next(task for task in study_module(STUDY).load_tasks() if task['table'] == options.table)
+        for mode in options.modes:
+            rows.append(run_mode(conn, task, mode, options))
+        result = {
+            'started': started,
+            'table': options.table,
+            'rate': options.rate,
+            'window': options.window,
+            'pages_per_range': options.pages_per_range,
+            'autovacuum_naptime': naptime,
+            'stream': rows
+        }
+        csv_rows = [{key: value for key, value in row.items() if key not in ('timeline', 'calls')}
+                    for row in rows]
+        for output in write_output('brin_stream', result, csv_rows, options.output_dir):
+            print(f"Результаты: {output}")
+    except Exception as e:
+        conn.rollback()
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Подбор класса операторов и pages_per_range для BRIN-индексов 6_BRIN
+
+Для каждого столбца, по которому в 04_create_indexes.sql строится
+одностолбцовый BRIN-индекс (временные метки и числовые столбцы), строятся
+варианты индекса:
+    minmax       - класс по умолчанию (<тип>_minmax_ops);
+    minmax_multi - <тип>_minmax_multi_ops с каждым values_per_range из
+                   BENCHMARK_CONFIG['brin_tuning_values_per_range'];
+    bloom        - <тип>_bloom_ops (подходит только для равенства);
+каждый - с каждым pages_per_range из brin_tuning_pages_per_range. Классы
+берутся из pg_opclass по типу столбца, так что отсутствующие для типа
+варианты пропускаются.
+
+Вариант строится в транзакции, в которой остальные индексы таблицы (кроме
+индексов ограничений) удалены, а Seq Scan отключен; в конце транзакция
+откатывается, так что исходные индексы не меняются. Для варианта
+записываются время построения, размер индекса и для каждого запроса
+с условием на столбец - медиана времени выполнения, страницы таблицы,
+прочитанные по битовой карте (heap_blocks; у BRIN все они неточные,
+lossy_blocks), строки, отброшенные перепроверкой, и использован ли индекс.
+
+Запросы - запросы 05_queries_after_indexes.sql с условием на столбец и такие же
+шаблоны workload.py для 6_BRIN: литералы файла 05 (даты 2023 года) могут
+не совпадать с данными, а параметры шаблонов берутся из загруженных строк
+(BENCHMARK_CONFIG['brin_tuning_draws'] наборов, одинаковых для всех вариантов).
+
+Для каждого столбца рекомендуется вариант с наименьшим индексом среди тех,
+суммарное время запросов которых не больше лучшего более чем на
+brin_tuning_tolerance; сравниваются варианты, использованные в наибольшем
+числе запросов (bloom, например, для диапазонов не используется). Запрос,
+завершившийся ошибкой, в сумму не входит.
+
+Пример:
+    python shared/brin_tuning.py
+    python shared/brin_tuning.py --columns measurement_time amount --pages-per-range 16 128
+"""
+
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from database_config import BENCHMARK_CONFIG, GENERATION_CONFIG
+from utils import get_db_connection
+from benchmark import _plan_nodes, explain_query, load_queries, write_output
+from compare import INDEX_FILE, ROOT, SCHEMAS
+from index_build import parse_index_file
+from workload import WORKLOADS
+
+STUDY = '6_BRIN'
+QUERY_FILE = '05_queries_after_indexes.sql'
+BRIN_COLUMN = re.compile(r'USING\s+BRIN\s*\(\s*(\w+)\s*\)', re.I)
+# Виды классов операторов BRIN по окончанию имени (minmax_multi проверяется раньше minmax)
+OPCLASS_KINDS = [('minmax_multi', '_minmax_multi_ops'), ('minmax', '_minmax_ops'), ('bloom', '_bloom_ops')]
+TUNING_INDEX = 'brin_tuning_variant'
+
+def tuned_columns():
+    """Столбцы одностолбцовых BRIN-индексов файла 04: [(таблица, столбец), ...]"""
+    _, indexes = parse_index_file(os.path.join(ROOT, STUDY, INDEX_FILE))
+    columns = []
+    for index in indexes:
+        match = BRIN_COLUMN.search(index['sql'])
+        if match and (index['table'], match.group(1)) not in columns:
+            columns.append((index['table'], match.group(1)))
+    return columns
+
+def column_opclasses(cursor, table, column):
+    """Классы операторов BRIN для типа столбца: {вид: имя класса}"""
+    cursor.execute("""
+        SELECT opc.opcname
+        FROM pg_attribute a
+        JOIN pg_opclass opc ON opc.opcintype = a.atttypid
+        JOIN pg_am am ON am.oid = opc.opcmethod AND am.amname = 'brin'
+        WHERE a.attrelid = %s::regclass AND a.attname = %s
+    """, (table, column))
+    opclasses = {}
+    for (name,) in cursor.fetchall():
+        for kind, suffix in OPCLASS_KINDS:
+            if name.endswith(suffix):
+                opclasses.setdefault(kind, name)
+                break
+    return opclasses
+
+def variants(opclasses, pages_list, values_list):
+    """Варианты индекса: вид класса, его параметры и pages_per_range"""
+    result = []
+    for pages in pages_list:
+        if 'minmax' in opclasses:
+            result.append({'opclass': 'minmax', 'values_per_range': None, 'pages_per_range': pages,
+                           'operator_class': opclasses['minmax']})
+        if 'minmax_multi' in opclasses:
+            for values in values_list:
+                result.append({'opclass': 'minmax_multi', 'values_per_range': values, 'pages_per_range': pages,
+                               'operator_class': f"{opclasses['minmax_multi']}(values_per_range = {int(values)})"})
+        if 'bloom' in opclasses:
+            result.append({'opclass': 'bloom', 'values_per_range': None, 'pages_per_range': pages,
+                           'operator_class': opclasses['bloom']})
+    return result
+
+def index_sql(table, column, variant, name=TUNING_INDEX):
+    """Команда CREATE INDEX для варианта"""
+    return (f"CREATE INDEX {name} ON {table} USING BRIN ({column} {variant['operator_class']}) "
+            f"WITH (pages_per_range = {int(variant['pages_per_range'])})")
+
+def _filters_on(sql, table, column):
+    """Запрос к таблице с условием на столбец"""
+    return re.search(rf'\b{table}\b', sql) and re.search(rf'\bWHERE\b.*\b{column}\b', sql, re.S | re.I)
+
+def column_queries(cursor, table, column, draws):
+    """Запросы со столбцом: из файла 05 и шаблонов workload.py (с выбранными параметрами)"""
+    _, file_queries = load_queries(os.path.join(ROOT, STUDY, QUERY_FILE))
+    queries = [{'id': query['id'], 'source': QUERY_FILE, 'sqls': [query['sql']]}
+               for query in file_queries if _filters_on(query['sql'], table, column)]
+    for template in WORKLOADS[STUDY]['queries']:
+        if not _filters_on(template['sql'], table, column):
+            continue
+        rng = random.Random(f"{GENERATION_CONFIG['seed']}:{template['id']}")
+        draw_functions = [prepare(cursor, rng, BENCHMARK_CONFIG['workload_sample'])
+                          for prepare in template['params']]
+        sqls = []
+        for _ in range(draws):
+            params = {}
+            for draw in draw_functions:
+                params.update(draw())
+            sqls.append(cursor.mogrify(template['sql'], params).decode())
+        queries.append({'id': template['id'], 'source': 'workload', 'sqls': sqls})
+    return queries
+
+def droppable_indexes(cursor, table):
+    """Индексы таблицы, не связанные с ограничениями"""
+    cursor.execute("""
+        SELECT i.indexrelid::regclass::text
+        FROM pg_index i
+        WHERE i.indrelid = %s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+    """, (table,))
+    return [row[0] for row in cursor.fetchall()]
+
+def measure_query(cursor, query, runs):
+    """Замеры одного запроса: прогрев, затем runs запусков каждого текста"""
+    for sql in query['sqls']:
+        explain_query(cursor, sql)
+    samples = [explain_query(cursor, sql) for _ in range(runs) for sql in query['sqls']]
+    nodes = [list(_plan_nodes(sample['plan'])) for sample in samples]
+    return {
+        'query': query['id'],
+        'source': query['source'],
+        'execution_ms': statistics.median(sample['execution_ms'] for sample in samples),
+        'heap_blocks': statistics.mean(sample['heap_blocks'] for sample in samples),
+        'lossy_blocks': statistics.mean(sum(node.get('Lossy Heap Blocks', 0) for node in plan) for plan in nodes),
+        'rechecked': statistics.mean(sum(node.get('Rows Removed by Index Recheck', 0) for node in plan)
+                                     for plan in nodes),
+        'index_used': all(TUNING_INDEX in sample['indexes'] for sample in samples)
+    }
+
+def measure_variant(conn, table, column, variant, queries, runs):
+    """Построение и замер варианта в откатываемой транзакции"""
+    row = {
+        'table': table,
+        'column': column,
+        'opclass': variant['opclass'],
+        'values_per_range': variant['values_per_range'],
+        'pages_per_range': variant['pages_per_range'],
+        'sql': index_sql(table, column, variant, f"{table}_{column}_brin"),
+        'build_seconds': None,
+        'index_size': None,
+        'queries': [],
+        'total_ms': None,
+        'index_used': 0,
+        'error': None
+    }
+    try:
+        with conn.cursor() as cursor:
+            for name in droppable_indexes(cursor, table):
+                cursor.execute(f"DROP INDEX {name}")
+            start_time = time.time()
+            cursor.execute(index_sql(table, column, variant))
+            row['build_seconds'] = time.time() - start_time
+            cursor.execute("SELECT pg_relation_size(%s::regclass)", (TUNING_INDEX,))
+            row['index_size'] = cursor.fetchone()[0]
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            for query in queries:
+                # Ошибка одного запроса не прерывает замер остальных
+                cursor.execute("SAVEPOINT tuning_query")
+                try:
+                    row['queries'].append(measure_query(cursor, query, runs))
+                    cursor.execute("RELEASE SAVEPOINT tuning_query")
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT tuning_query")
+                    row['queries'].append({'query': query['id'], 'source': query['source'],
+                                           'error': str(e).strip().splitlines()[0]})
+    except Exception as e:
+        row['error'] = str(e).strip()
+    finally:
+        conn.rollback()
+    measured = [query for query in row['queries'] if 'error' not in query]
+    if measured:
+        row['total_ms'] = sum(query['execution_ms'] for query in measured)
+        row['index_used'] = sum(query['index_used'] for query in measured)
+    return row
+
+def recommend(rows, tolerance):
+    """Рекомендуемый вариант столбца или None, если индекс не использован ни в одном варианте
+
+    Сравниваются только варианты, использованные в наибольшем числе запросов.
+    """
+    measured = [row for row in rows if not row['error'] and row['total_ms'] is not None]
+    most_used = max((row['index_used'] for row in measured), default=0)
+    if not most_used:
+        return None
+    usable = [row for row in measured if row['index_used'] == most_used]
+    best = min(row['total_ms'] for row in usable)
+    close = [row for row in usable if row['total_ms'] <= best * (1 + tolerance)]
+    return min(close, key=lambda row: (row['index_size'], row['total_ms']))
+
+def print_row(row):
+    """Строка результата одного варианта"""
+    values = f" v{row['values_per_range']}" if row['values_per_range'] else ''
+    settings = f"  {row['opclass'] + values:<17} ppr {row['pages_per_range']:>4}"
+    if row['error']:
+        print(f"{settings}  ошибка: {row['error']}")
+        return
+    line = f"{settings}  {row['build_seconds']:>7.2f} с  {row['index_size'] / 1024:>9.0f} КБ"
+    measured = [query for query in row['queries'] if 'error' not in query]
+    if measured:
+        lossy = sum(query['lossy_blocks'] for query in measured)
+        line += (f"  запросы {row['total_ms']:>9.3f} мс  lossy-страниц {lossy:>9.0f}  "
+                 f"индекс в {row['index_used']} из {len(measured)}")
+    failed = [query for query in row['queries'] if 'error' in query]
+    for query in failed:
+        line += f"\n    запрос {query['query']}: ошибка: {query['error']}"
+    print(line)
+
+def tune_column(conn, table, column, pages_list, values_list, runs, draws):
+    """Все варианты одного столбца"""
+    with conn.cursor() as cursor:
+        opclasses = column_opclasses(cursor, table, column)
+        queries = column_queries(cursor, table, column, draws)
+    conn.commit()
+    print(f"--- {table}.{column}: классы {', '.join(opclasses.values())}; "
+          f"запросы {', '.join(query['id'] for query in queries) or 'нет'} ---")
+    rows = []
+    for variant in variants(opclasses, pages_list, values_list):
+        row = measure_variant(conn, table, column, variant, queries, runs)
+        rows.append(row)
+        print_row(row)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Подбор класса операторов и pages_per_range для BRIN")
+    parser.add_argument('--columns', nargs='+', help="столбцы (по умолчанию все BRIN-столбцы файла 04)")
+    parser.add_argument('--pages-per-range', nargs='+', type=int,
+                        default=BENCHMARK_CONFIG['brin_tuning_pages_per_range'], help="значения pages_per_range")
+    parser.add_argument('--values-per-range', nargs='+', type=int,
+                        default=BENCHMARK_CONFIG['brin_tuning_values_per_range'],
+                        help="значения values_per_range для minmax_multi")
+    parser.add_argument('--runs', type=int, default=BENCHMARK_CONFIG['brin_tuning_runs'],
+                        help="замеров каждого запроса")
+    parser.add_argument('--draws', type=int, default=BENCHMARK_CONFIG['brin_tuning_draws'],
+                        help="наборов параметров на шаблон workload.py")
+    parser.add_argument('--output-dir', default=BENCHMARK_CONFIG['output_dir'], help="каталог результатов")
+    options = parser.parse_args()
+
+    columns = tuned_columns()
+    if options.columns:
+        columns = [(table, column) for table, column in columns if column in options.columns]
+
+    conn = get_db_connection()
+    started = datetime.now().isoformat(timespec='seconds')
+    rows = []
+    recommendations = []
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SET search_path TO {SCHEMAS[STUDY]}")
+        conn.commit()
+        for table, column in columns:
+            column_rows = tune_column(conn, table, column, options.pages_per_range, options.values_per_range,
+                                      options.runs, options.draws)
+            rows += column_rows
+            best = recommend(column_rows, BENCHMARK_CONFIG['brin_tuning_tolerance'])
+            recommendations.append({'table': table, 'column': column, 'sql': best['sql'] if best else None})
+
+        print("=== Рекомендации ===")
+        for recommendation in recommendations:
+            target = f"{recommendation['table']}.{recommendation['column']}"
+            print(f"  {target:<40} {recommendation['sql'] or 'BRIN не используется запросами столбца'}")
+        result = {'started': started, 'study': STUDY, 'runs': options.runs, 'draws': options.draws,
+                  'variants': rows, 'recommendations': recommendations}
+        csv_rows = [{key: value for key, value in row.items() if key != 'queries'} for row in rows]
+        for output in write_output('brin_tuning', result, csv_rows, options.output_dir):
+            print(f"Результаты: {output}")
+    except Exception as e:
+        conn.rollback()
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
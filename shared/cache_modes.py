@@ -0,0 +1,174 @@
+"""
+Режимы кэша при замерах benchmark.py
+
+    none - как есть: запросы выполняются после прогревочных запусков, в кэше
+           остается то, что прочитали предыдущие запросы;
+    warm - перед замерами таблицы и индексы из плана запроса целиком
+           загружаются в shared_buffers через pg_prewarm;
+    cold - перед каждым замером страницы таблиц и индексов плана вытесняются
+           из shared_buffers и из кэша ОС, прогревочные запуски не выполняются.
+
+Вытеснение из shared_buffers: pg_buffercache_evict_relation (PostgreSQL 18)
+или pg_buffercache_evict по буферам отношения (PostgreSQL 17). Если их нет,
+а в BENCHMARK_CONFIG['cold_restart_command'] задана команда перезапуска
+локального тестового кластера (например 'pg_ctl -D /path/to/data restart -m fast -w'),
+кластер перезапускается перед каждым замером. Перезапуск закрывает все
+соединения, поэтому замер продолжается через новое соединение, а переданное
+в run_benchmark соединение после него использовать нельзя.
+
+Кэш ОС: команда BENCHMARK_CONFIG['drop_os_cache_command'] (например
+"sync && echo 3 > /proc/sys/vm/drop_caches"), иначе posix_fadvise(DONTNEED)
+для файлов отношений - если сервер на той же машине и файлы каталога данных
+доступны на чтение. Чего сделать нельзя, о том выводится предупреждение
+(один раз), и замер продолжается.
+"""
+
+import json
+import os
+import subprocess
+import time
+
+import psycopg2
+
+from database_config import BENCHMARK_CONFIG, DB_CONFIG
+
+CACHE_MODES = ['none', 'warm', 'cold']
+# Размер сегмента файла отношения PostgreSQL по умолчанию
+SEGMENT_SIZE = 1024 ** 3
+
+_warnings = set()
+
+def _warn_once(message):
+    """Предупреждение, выводимое один раз за запуск"""
+    if message not in _warnings:
+        _warnings.add(message)
+        print(f"Внимание: {message}")
+
+def cache_mode(mode=None):
+    """Режим кэша: аргумент или BENCHMARK_CONFIG['cache_mode']"""
+    mode = mode or BENCHMARK_CONFIG.get('cache_mode', 'none')
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Неизвестный режим кэша {mode}, допустимы: {', '.join(CACHE_MODES)}")
+    return mode
+
+def _function_exists(cursor, name):
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_proc WHERE proname = %s)", (name,))
+    return cursor.fetchone()[0]
+
+def ensure_extension(cursor, name):
+    """Создание расширения при необходимости; False, если оно недоступно"""
+    try:
+        cursor.execute(f"CREATE EXTENSION IF NOT EXISTS {name}")
+        return True
+    except Exception as e:
+        _warn_once(f"расширение {name} недоступно ({str(e).strip().splitlines()[0]})")
+        return False
+
+def plan_relations(cursor, sql):
+    """Таблицы и индексы плана запроса (EXPLAIN без выполнения)"""
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+    result = cursor.fetchone()[0]
+    if isinstance(result, str):
+        result = json.loads(result)
+    stack = [result[0]['Plan']]
+    relations = []
+    while stack:
+        node = stack.pop()
+        for key in ('Relation Name', 'Index Name'):
+            if key in node and node[key] not in relations:
+                relations.append(node[key])
+        stack.extend(node.get('Plans', []))
+    return relations
+
+def prewarm(cursor, relations):
+    """Загрузка отношений в shared_buffers; возвращает число прочитанных блоков"""
+    if not ensure_extension(cursor, 'pg_prewarm'):
+        _warn_once("режим warm без pg_prewarm: кэш прогревается только прогревочными запусками")
+        return 0
+    blocks = 0
+    for relation in relations:
+        cursor.execute("SELECT pg_prewarm(%s::regclass)", (relation,))
+        blocks += cursor.fetchone()[0]
+    return blocks
+
+def evict_shared_buffers(cursor, relations):
+    """Вытеснение страниц отношений из shared_buffers; False, если это невозможно"""
+    if not ensure_extension(cursor, 'pg_buffercache'):
+        return False
+    if _function_exists(cursor, 'pg_buffercache_evict_relation'):
+        for relation in relations:
+            cursor.execute("SELECT pg_buffercache_evict_relation(%s::regclass)", (relation,))
+        return True
+    if _function_exists(cursor, 'pg_buffercache_evict'):
+        for relation in relations:
+            cursor.execute("""
+                SELECT count(pg_buffercache_evict(bufferid))
+                FROM pg_buffercache
+                WHERE relfilenode = pg_relation_filenode(%s::regclass)
+                  AND reldatabase = (SELECT oid FROM pg_database WHERE datname = current_database())
+            """, (relation,))
+        return True
+    return False
+
+def drop_os_cache(cursor, relations):
+    """Вытеснение файлов отношений из кэша ОС; False, если это невозможно"""
+    command = BENCHMARK_CONFIG.get('drop_os_cache_command')
+    if command:
+        result = subprocess.run(command, shell=True, capture_output=True, text=True)
+        if result.returncode != 0:
+            _warn_once(f"команда очистки кэша ОС завершилась с ошибкой: {result.stderr.strip()}")
+            return False
+        return True
+    if not hasattr(os, 'posix_fadvise'):
+        _warn_once("posix_fadvise недоступен, кэш ОС не очищается")
+        return False
+    try:
+        cursor.execute("SHOW data_directory")
+        data_directory = cursor.fetchone()[0]
+        for relation in relations:
+            cursor.execute("SELECT pg_relation_filepath(%s::regclass), pg_relation_size(%s::regclass)",
+                           (relation, relation))
+            path, size = cursor.fetchone()
+            for segment in range(size // SEGMENT_SIZE + 1):
+                name = os.path.join(data_directory, path) + (f".{segment}" if segment else '')
+                descriptor = os.open(name, os.O_RDONLY)
+                try:
+                    os.posix_fadvise(descriptor, 0, 0, os.POSIX_FADV_DONTNEED)
+                finally:
+                    os.close(descriptor)
+        return True
+    except Exception as e:
+        _warn_once(f"кэш ОС не очищается: файлы данных недоступны ({str(e).strip()})")
+        return False
+
+def restart_cluster(setup):
+    """Перезапуск тестового кластера командой из конфигурации; новое соединение с setup"""
+    command = BENCHMARK_CONFIG['cold_restart_command']
+    result = subprocess.run(command, shell=True, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Перезапуск кластера не удался: {result.stderr.strip()}")
+    for _ in range(30):
+        try:
+            conn = psycopg2.connect(**DB_CONFIG)
+            break
+        except psycopg2.OperationalError:
+            time.sleep(1)
+    else:
+        raise RuntimeError("Кластер не принимает соединения после перезапуска")
+    conn.autocommit = True
+    cursor = conn.cursor()
+    for statement in setup:
+        cursor.execute(statement)
+    return cursor
+
+def make_cold(cursor, relations, setup):
+    """Подготовка холодного замера; возвращает курсор (после перезапуска - новый)"""
+    if not evict_shared_buffers(cursor, relations):
+        if BENCHMARK_CONFIG.get('cold_restart_command'):
+            cursor.connection.close()
+            cursor = restart_cluster(setup)
+        else:
+            _warn_once("pg_buffercache_evict недоступна (нужен PostgreSQL 17+) и cold_restart_command "
+                       "не задана: shared_buffers не очищаются")
+    drop_os_cache(cursor, relations)
+    return cursor
@@ -0,0 +1,233 @@
+"""
+Сравнение запросов до и после создания индексов
+
+Запрос N из 03_queries_before_indexes.sql сопоставляется с запросом N из
+05_queries_after_indexes.sql (по результатам shared/benchmark.py). Для каждой
+пары считаются ускорение по медиане времени выполнения и отношение числа
+затронутых буферов (shared hit + read), а также размеры индексов, которые
+использует план "после", и таблиц, которые он читает.
+
+Индексы исследования - индексы схемы, не обслуживающие PRIMARY KEY и UNIQUE
+(то есть созданные 04_create_indexes.sql). Запрос помечается, если его план
+после создания индексов не использует ни одного из них; отдельно выводятся
+индексы, которые не использовал ни один запрос.
+
+По умолчанию берутся последние результаты 03/05 из каталога результатов.
+С --run стадия выполняется целиком: замер 03, 04_create_indexes.sql, замер 05
+(схема должна быть загружена и еще не иметь индексов исследования).
+
+Пример:
+    python shared/compare.py                  # все семь исследований
+    python shared/compare.py 6_BRIN --run
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+
+from database_config import BENCHMARK_CONFIG
+from utils import get_db_connection
+from benchmark import QUERY_FILES, reconnect, run_benchmark, split_statements, write_output, write_results
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+STUDIES = ['1_B-tree', '2_Hash', '3_GiST', '4_SP-GiST', '5_GIN', '6_BRIN', '7_Bloom']
+# Схемы, которые создает 01_create_tables.sql каждого исследования
+SCHEMAS = {'1_B-tree': 'Btree', '2_Hash': 'Hash', '3_GiST': 'GiST', '4_SP-GiST': 'SPGiST',
+           '5_GIN': 'GIN', '6_BRIN': 'BRIN', '7_Bloom': 'Bloom'}
+INDEX_FILE = '04_create_indexes.sql'
+
+def latest_result(study, query_file, results_dir=None):
+    """Путь к последнему JSON-результату файла запросов исследования или None"""
+    results_dir = results_dir or BENCHMARK_CONFIG['output_dir']
+    stem = os.path.splitext(query_file)[0]
+    paths = sorted(glob.glob(os.path.join(results_dir, f"{study}_{stem}_*.json")))
+    return paths[-1] if paths else None
+
+def load_result(path):
+    """Результат shared/benchmark.py из JSON"""
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def study_indexes(conn, schema):
+    """Индексы исследования в схеме (без индексов PRIMARY KEY/UNIQUE): имя -> размер в байтах"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT i.relname, pg_relation_size(i.oid)
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN pg_namespace n ON n.oid = i.relnamespace
+            WHERE n.nspname = %s
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+        """, (schema,))
+        return dict(cursor.fetchall())
+
+def table_sizes(conn, schema):
+    """Размеры таблиц схемы: имя -> размер в байтах"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT c.relname, pg_relation_size(c.oid)
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s AND c.relkind = 'r'
+        """, (schema,))
+        return dict(cursor.fetchall())
+
+def _ratio(before, after):
+    """Отношение before / after (None, если посчитать нельзя)"""
+    if before is None or not after:
+        return None
+    return before / after
+
+def _median_ms(query):
+    """Медиана времени выполнения или None, если замер запроса завершился ошибкой"""
+    return ((query['stats'] or {}).get('execution_ms') or {}).get('median')
+
+def _buffers(query):
+    """Медиана затронутых буферов запроса (shared hit + read) или None"""
+    stats = query['stats']
+    if not stats:
+        return None
+    return (stats['shared_hit'] or {}).get('median', 0) + (stats['shared_read'] or {}).get('median', 0)
+
+def compare_results(before, after, indexes, tables):
+    """Строки сравнения по парам запросов с одинаковым идентификатором"""
+    before_queries = {query['id']: query for query in before['queries']}
+    rows = []
+    for query in after['queries']:
+        old = before_queries.get(query['id'])
+        if old is None:
+            continue
+        used = [name for name in query['indexes'] if name in indexes]
+        before_ms = _median_ms(old)
+        after_ms = _median_ms(query)
+        rows.append({
+            'study': after['study'],
+            'query_id': query['id'],
+            'title': query['title'],
+            'cache_mode': after.get('cache_mode', 'none'),
+            'before_ms': before_ms,
+            'after_ms': after_ms,
+            'speedup': _ratio(before_ms, after_ms),
+            'before_buffers': _buffers(old),
+            'after_buffers': _buffers(query),
+            'buffers_ratio': _ratio(_buffers(old), _buffers(query)),
+            'before_node': old['node_type'],
+            'after_node': query['node_type'],
+            'indexes_used': ' '.join(used),
+            'index_size': sum(indexes[name] for name in used),
+            'table_size': sum(tables.get(name, 0) for name in query.get('relations', [])),
+            'index_not_used': not used and query['stats'] is not None,
+            'error': query.get('error') or old.get('error')
+        })
+    return rows
+
+def unused_indexes(rows, indexes):
+    """Индексы исследования, которые не использовал ни один запрос"""
+    used = {name for row in rows for name in row['indexes_used'].split()}
+    return sorted(name for name in indexes if name not in used)
+
+def _size(value):
+    """Размер в удобных единицах"""
+    for unit in ('Б', 'КБ', 'МБ'):
+        if value < 1024:
+            return f"{value:.0f} {unit}"
+        value /= 1024
+    return f"{value:.1f} ГБ"
+
+def _ms(value):
+    """Время в мс или '-', если запрос не выполнился"""
+    return f"{value:.3f}" if value is not None else '-'
+
+def _times(value):
+    """Отношение в виде 12.3x"""
+    return f"{value:.1f}x" if value is not None else '-'
+
+def print_report(study, rows, unused):
+    """Вывод таблицы ускорения исследования"""
+    print(f"=== {study} ===")
+    print(f"{'запрос':<7} {'до, мс':>10} {'после, мс':>10} {'ускорение':>10} {'буферы':>8} "
+          f"{'индекс':>9} {'таблица':>9}  план после")
+    for row in rows:
+        flag = '  <- индекс не используется' if row['index_not_used'] else ''
+        print(f"{row['query_id']:<7} {_ms(row['before_ms']):>10} {_ms(row['after_ms']):>10} "
+              f"{_times(row['speedup']):>10} {_times(row['buffers_ratio']):>8} "
+              f"{_size(row['index_size']):>9} {_size(row['table_size']):>9}  {row['after_node'] or '-'}"
+              f"{' (' + row['indexes_used'] + ')' if row['indexes_used'] else ''}{flag}"
+              f"{'  ошибка: ' + row['error'] if row.get('error') else ''}")
+    if unused:
+        print(f"Индексы, не использованные ни одним запросом: {', '.join(unused)}")
+
+def create_indexes(conn, path):
+    """Выполнение файла создания индексов по одной команде в режиме autocommit
+
+    CREATE INDEX CONCURRENTLY нельзя выполнять внутри блока транзакции,
+    поэтому файл не отправляется одним вызовом, как в execute_sql_file.
+    """
+    conn.autocommit = True
+    with open(path, 'r', encoding='utf-8') as file:
+        statements = split_statements(file.read())
+    with conn.cursor() as cursor:
+        for _, statement in statements:
+            cursor.execute(statement)
+    print(f"Файл {path} успешно выполнен")
+
+def run_study(conn, study, runs=None, warmups=None, results_dir=None):
+    """Полный цикл исследования: замер 03, создание индексов 04, замер 05
+
+    Возвращает соединение (после перезапуска кластера в режиме cold - новое) и оба результата.
+    """
+    directory = os.path.join(ROOT, study)
+    before = run_benchmark(conn, os.path.join(directory, QUERY_FILES[0]), runs, warmups)
+    write_results(before, results_dir)
+    conn = reconnect(conn, before)
+    create_indexes(conn, os.path.join(directory, INDEX_FILE))
+    after = run_benchmark(conn, os.path.join(directory, QUERY_FILES[1]), runs, warmups)
+    write_results(after, results_dir)
+    return reconnect(conn, after), before, after
+
+def write_report(rows, output_dir=None):
+    """Запись сводной таблицы всех исследований в CSV; возвращает путь"""
+    return write_output('speedup', rows, rows, output_dir, 'csv', store=False)[0]
+
+def main():
+    parser = argparse.ArgumentParser(description="Ускорение запросов после создания индексов")
+    parser.add_argument('studies', nargs='*', default=STUDIES, help="каталоги исследований")
+    parser.add_argument('--run', action='store_true',
+                        help="выполнить замер 03, создание индексов 04 и замер 05 перед сравнением")
+    parser.add_argument('--runs', type=int, help="число замеров (для --run)")
+    parser.add_argument('--warmups', type=int, help="число прогревочных запусков (для --run)")
+    parser.add_argument('--results-dir', default=BENCHMARK_CONFIG['output_dir'],
+                        help="каталог результатов benchmark.py")
+    options = parser.parse_args()
+
+    conn = get_db_connection()
+    all_rows = []
+    try:
+        for study in options.studies:
+            study = os.path.basename(os.path.normpath(study))
+            if options.run:
+                conn, before, after = run_study(conn, study, options.runs, options.warmups,
+                                                options.results_dir)
+            else:
+                paths = [latest_result(study, name, options.results_dir) for name in QUERY_FILES]
+                if None in paths:
+                    print(f"{study}: нет результатов 03/05 в {options.results_dir}, пропуск")
+                    continue
+                before, after = [load_result(path) for path in paths]
+            schema = after['schema']
+            indexes = study_indexes(conn, schema)
+            rows = compare_results(before, after, indexes, table_sizes(conn, schema))
+            print_report(study, rows, unused_indexes(rows, indexes))
+            all_rows += rows
+        if all_rows:
+            print(f"Сводная таблица: {write_report(all_rows, options.results_dir)}")
+    except Exception as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import os
+
 # Конфигурация подключения к БД
 DB_CONFIG = {
     'dbname': 'indexes_study',
@@ -9,7 +11,108 @@ DB_CONFIG = {
 
 # Настройки генерации данных
 GENERATION_CONFIG = {
+    # Масштаб данных (как SF в TPC): число строк всех таблиц и диапазоны внешних ключей
+    # заданы в скриптах для scale_factor = 1 и умножаются на него
+    'scale_factor': 1,
     'batch_size': 1000,
+    'copy_batch_size': 50000,  # строк на один COPY (и один commit) при scale_factor = 1
+    'max_copy_batch_size': 500000,  # верхняя граница copy_batch_size при росте масштаба
     'log_progress': True,
-    'total_records': 1000000  # 1M записей для тестов
+    'progress_every': 10000,  # интервал сообщений генераторов о прогрессе при scale_factor = 1
+    'load_method': 'copy',  # 'copy' - COPY FROM STDIN, 'insert' - старый executemany
+    'copy_format': 'text',  # формат COPY: 'text' или 'csv'
+    'seed': 42,  # общий seed, из него выводятся seed-ы шардов
+    'workers': 1,  # число процессов генерации (> 1 - параллельная генерация по шардам)
+    'shard_size': 10000,  # строк в шарде; от него (а не от workers) зависят данные
+    # 'direct' - загрузка в таблицы как есть; 'phased' - UNLOGGED без PK/UNIQUE, загрузка,
+    # затем ограничения, ANALYZE и SET LOGGED (время каждой фазы выводится)
+    'load_mode': 'direct',
+    'load_connections': 1,  # соединений для параллельной загрузки (таблиц или частей одной таблицы)
+    'parallel_copy_bytes': 4 * 1024 ** 2,  # байт на один COPY при загрузке частей таблицы по соединениям
+    'backend': 'numpy',  # 'numpy' - векторные генераторы там, где они есть; 'python' - построчные
+    'vector_block_size': 100000,  # строк в блоке векторной генерации
+    'reference_date': None,  # опорное "сейчас" ('2024-06-30 00:00:00'); None - начало текущих суток
+    'cache_dir': os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.cache'),
+    'faker_locale': 'en_US',
+    # Кардинальность пулов значений Faker (число различных значений на провайдер)
+    'pool_sizes': {
+        'default': 10000,
+        'user_name': 50000,
+        'email': 50000,
+        'company': 5000,
+        'city': 1000,
+        'user_agent': 2000,
+        'ipv4': 50000,
+        'word': 1000,
+        'sentence': 20000,
+        'uri_path': 5000
+    },
+    'dataset_cache': True,  # сохранять сгенерированные таблицы на диск и загружать их повторно
+    'dataset_cache_max_bytes': 20 * 1024 ** 3,  # предел объема кэша наборов, старые наборы вытесняются
+    'dataset_cache_verify': True,  # сверять SHA-256 набора перед загрузкой из кэша
+    'pool_skew': {},  # перекос выбора по провайдерам, например {'city': 2.0}; по умолчанию равномерно
+    # Порядок строк во времени для time_series_data и access_logs (6_BRIN, shared/time_order.py):
+    # 'random' - метки времени в случайном порядке, 'append' - по возрастанию, как при дозаписи
+    'time_order': 'random',
+    'late_fraction': 0.0,  # доля "опоздавших" строк в режиме append
+    'late_max_delay': 3600,  # наибольшее опоздание, секунд
+    'time_jitter': 0  # разброс времени соседних строк в режиме append, +- секунд
+}
+
+# Настройки замеров запросов (shared/benchmark.py)
+BENCHMARK_CONFIG = {
+    'runs': 5,  # измеряемых запусков каждого запроса
+    'warmups': 1,  # прогревочных запусков перед замерами
+    'statement_timeout': None,  # ограничение времени запроса, например '60s'
+    'keep_plans': True,  # сохранять план последнего запуска в JSON
+    'cache_mode': 'none',  # 'none', 'warm' (pg_prewarm) или 'cold' (см. shared/cache_modes.py)
+    'cold_restart_command': None,  # перезапуск тестового кластера для режима cold, например 'pg_ctl -D ... restart -m fast -w'
+    'drop_os_cache_command': None,  # очистка кэша ОС, например 'sync && echo 3 > /proc/sys/vm/drop_caches'
+    'output_format': 'both',  # 'json', 'csv' или 'both'
+    'output_dir': os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'results'),
+    # База SQLite, в которую сохраняется каждый запуск (shared/results_store.py); None - не сохранять
+    'results_store': os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'results', 'results.sqlite'),
+    'regression_threshold': 0.1,  # относительное ухудшение, начиная с которого оно считается регрессией
+    'regression_alpha': 0.05,  # уровень значимости критерия Манна-Уитни для отдельных замеров
+    'throughput_clients': [1, 2, 4, 8, 16, 32],  # число параллельных клиентов (shared/throughput.py)
+    'throughput_duration': 10,  # секунд замера на каждое число клиентов
+    'throughput_warmup': 2,  # секунд прогрева перед замером
+    'throughput_keys': 10000,  # ключей, выбираемых из таблицы для точечных запросов
+    'workload_iterations': 1000,  # наборов параметров на шаблон запроса (shared/workload.py)
+    'workload_warmup': 20,  # прогревочных выполнений шаблона
+    'workload_sample': 10000,  # строк, из которых выбираются значения параметров
+    # Доли строк для перебора селективности (shared/selectivity.py): от 0.001% до 50%
+    'selectivity_levels': [0.00001, 0.0001, 0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5],
+    'selectivity_runs': 3,  # замеров каждого условия в каждом режиме плана
+    # Масштабы данных для shared/scaling.py (геометрический ряд scale_factor)
+    'scaling_factors': [0.1, 0.3, 1, 3, 10, 30],
+    'brin_order_late_fractions': [0, 0.001, 0.01, 0.05, 0.2, 0.5],  # доли опоздавших строк (shared/brin_order.py)
+    'brin_order_windows': [1, 24, 168],  # ширины окон запросов, часов
+    'brin_order_queries': 20,  # запросов на каждую ширину окна
+    # Варианты BRIN-индексов для shared/brin_tuning.py
+    'brin_tuning_pages_per_range': [8, 16, 32, 64, 128, 256],
+    'brin_tuning_values_per_range': [8, 32, 128],  # для minmax_multi (по умолчанию в PostgreSQL 32)
+    'brin_tuning_runs': 3,  # замеров каждого запроса для варианта
+    'brin_tuning_draws': 5,  # наборов параметров на шаблон workload.py
+    'brin_tuning_tolerance': 0.1,  # допустимое отставание по времени от лучшего варианта ради меньшего индекса
+    # Непрерывная дозапись и суммаризация BRIN (shared/brin_stream.py)
+    'brin_stream_modes': ['autosummarize', 'function', 'vacuum', 'none'],
+    'brin_stream_rate': 2000,  # строк в секунду
+    'brin_stream_duration': 180,  # секунд на режим (больше autovacuum_naptime)
+    'brin_stream_window': 10,  # окно свежих данных для запросов, секунд
+    'brin_stream_read_interval': 1.0,  # период запросов читателя, секунд
+    'brin_stream_summarize_interval': 10,  # период brin_summarize_new_values() и VACUUM, секунд
+    'brin_stream_initial_rows': 100000,  # строк в копии до начала дозаписи
+    # Вставка в таблицы с GIN-индексами (shared/gin_pending.py)
+    'gin_pending_limits': [64, 4096, 65536],  # gin_pending_list_limit, кБ (4096 - по умолчанию)
+    'gin_pending_rows': 20000,  # вставляемых строк на конфигурацию
+    'gin_pending_batch': 10,  # строк в одной команде INSERT
+    'gin_pending_initial_rows': 20000,  # строк в копии до вставки
+    'gin_pending_search_every': 200,  # поиск через каждые N команд INSERT
+    'gin_pending_searches': 5,  # запросов на шаблон при каждом поиске
+    'jsonb_opclass_runs': 3,  # замеров каждого набора значений (shared/jsonb_opclass.py)
+    'jsonb_opclass_draws': 5,  # наборов значений на горячий путь JSONB
+    'build_work_mem': ['64MB', '256MB', '1GB'],  # значения maintenance_work_mem (shared/index_build.py)
+    'build_parallel_workers': [0, 2, 4],  # значения max_parallel_maintenance_workers
+    'build_concurrently': [False, True]  # обычное построение и CONCURRENTLY
 }
\ No newline at end of file
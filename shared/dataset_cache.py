@@ -0,0 +1,227 @@
+"""
+Кэш сгенерированных наборов данных
+
+Каждая таблица при первой генерации параллельно с загрузкой записывается на
+диск в виде готового потока COPY. Ключ набора - хэш от имени генератора,
+исходного кода генератора и общих модулей, которые он использует
+(DATA_MODULES: пулы значений, уникальные ключи, порядок времени, векторная
+генерация, шарды и кодирование COPY), его параметров, числа строк и
+настроек, от которых зависят данные (seed, формат COPY, размер шарда/блока, опорная дата,
+пулы Faker). Повторный запуск с тем же ключом загружает файл напрямую, без
+генерации.
+
+Рядом с файлом данных лежит манифест (JSON) с SHA-256, размером, числом
+строк и разбиением на блоки: блоки воспроизводятся в том же виде, в каком
+были записаны, поэтому загрузка из кэша идет теми же COPY, что и при
+генерации. Манифест записывается последним - набор без манифеста считается
+незавершенным. Перед загрузкой файл сверяется с манифестом; поврежденный
+набор удаляется и генерируется заново.
+
+Общий объем кэша ограничен GENERATION_CONFIG['dataset_cache_max_bytes'];
+при превышении удаляются наборы, которые дольше всего не использовались.
+"""
+
+import glob
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+
+from database_config import GENERATION_CONFIG
+from utils import reference_now
+
+READ_BUFFER_SIZE = 1024 * 1024
+# Общие модули, код которых влияет на сгенерированные данные
+DATA_MODULES = ['value_pools.py', 'unique_keys.py', 'time_order.py', 'vectorized.py', 'sharding.py', 'utils.py']
+
+_modules_hash = None
+
+def cache_enabled():
+    """Включен ли кэш наборов данных (работает только для загрузки через COPY)"""
+    return (GENERATION_CONFIG.get('dataset_cache', True)
+            and GENERATION_CONFIG.get('load_method', 'copy') == 'copy')
+
+def cache_directory():
+    """Каталог наборов данных в кэше"""
+    return os.path.join(GENERATION_CONFIG['cache_dir'], 'datasets')
+
+def _generator_source(generator):
+    """Исходный код генератора: изменение кода делает старые наборы недействительными"""
+    try:
+        return inspect.getsource(generator)
+    except (OSError, TypeError):
+        return ''
+
+def _data_modules_source():
+    """Хэш исходного кода DATA_MODULES (считается один раз за запуск)"""
+    global _modules_hash
+    if _modules_hash is None:
+        digest = hashlib.sha256()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in DATA_MODULES:
+            digest.update(name.encode())
+            with open(os.path.join(directory, name), 'rb') as file:
+                digest.update(file.read())
+        _modules_hash = digest.hexdigest()
+    return _modules_hash
+
+def dataset_key(generator, num_records, args=(), mode='python'):
+    """Ключ набора данных (hex) и описание параметров, из которых он получен
+
+    mode - способ генерации ('python', 'single' или 'numpy'): от него зависит
+    разбиение на шарды/блоки, а значит и сами данные.
+    """
+    params = {
+        'generator': generator.__name__,
+        'source': hashlib.sha256(_generator_source(generator).encode()).hexdigest(),
+        'modules': _data_modules_source(),
+        'args': list(args),
+        'num_records': num_records,
+        'mode': mode,
+        'seed': GENERATION_CONFIG['seed'],
+        'copy_format': GENERATION_CONFIG.get('copy_format', 'text'),
+        'shard_size': GENERATION_CONFIG['shard_size'],
+        'vector_block_size': GENERATION_CONFIG.get('vector_block_size'),
+        'reference_date': reference_now().isoformat(),
+        'faker_locale': GENERATION_CONFIG.get('faker_locale'),
+        'pool_sizes': GENERATION_CONFIG.get('pool_sizes'),
+        'pool_skew': GENERATION_CONFIG.get('pool_skew')
+    }
+    encoded = json.dumps(params, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest(), params
+
+def _paths(name, key):
+    """Пути к файлу данных и манифесту набора"""
+    base = os.path.join(cache_directory(), f"{name}-{key[:16]}")
+    return base + '.copy', base + '.json'
+
+def _file_sha256(path):
+    """SHA-256 файла"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(READ_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _read_manifest(manifest_path):
+    """Манифест набора или None, если его нет или он не читается"""
+    try:
+        with open(manifest_path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def remove_dataset(data_path, manifest_path):
+    """Удаление набора (сначала манифест, чтобы набор не считался готовым)"""
+    for path in (manifest_path, data_path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Набор мог удалить другой процесс или поток
+            pass
+
+def verify_dataset(data_path, manifest):
+    """Проверка файла данных по манифесту: размер и (если включено) SHA-256"""
+    if not os.path.exists(data_path) or os.path.getsize(data_path) != manifest['bytes']:
+        return False
+    if GENERATION_CONFIG.get('dataset_cache_verify', True):
+        return _file_sha256(data_path) == manifest['sha256']
+    return True
+
+def _iter_cached_blocks(data_path, manifest):
+    """Блоки COPY из файла набора в том же разбиении, в каком они были записаны"""
+    with open(data_path, 'rb') as file:
+        for rows, size in manifest['blocks']:
+            yield rows, file.read(size)
+
+def _write_dataset(blocks, data_path, manifest_path, params):
+    """Пропуск блоков дальше в загрузчик с одновременной записью набора на диск
+
+    Файлы пишутся во временные и переименовываются только после того, как
+    генератор выдал все блоки; при ошибке временный файл удаляется.
+    """
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    tmp_path = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    digest = hashlib.sha256()
+    layout = []
+    total_rows = 0
+    total_bytes = 0
+    try:
+        with open(tmp_path, 'wb') as file:
+            for rows, data in blocks:
+                file.write(data)
+                digest.update(data)
+                layout.append((rows, len(data)))
+                total_rows += rows
+                total_bytes += len(data)
+                yield rows, data
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    manifest = {
+        'params': params,
+        'rows': total_rows,
+        'bytes': total_bytes,
+        'sha256': digest.hexdigest(),
+        'blocks': layout,
+        'created': time.time()
+    }
+    os.replace(tmp_path, data_path)
+    tmp_manifest = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_manifest, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file)
+    os.replace(tmp_manifest, manifest_path)
+    evict_datasets()
+
+def cached_blocks(generator, num_records, args, mode, make_blocks):
+    """Блоки COPY для таблицы: из кэша, если набор уже есть, иначе генерация с записью
+
+    make_blocks() - функция без аргументов, возвращающая блоки (пары
+    (число строк, байты)) из генератора.
+    """
+    if not cache_enabled():
+        return make_blocks()
+
+    key, params = dataset_key(generator, num_records, args, mode)
+    data_path, manifest_path = _paths(generator.__name__, key)
+    manifest = _read_manifest(manifest_path)
+    if manifest is not None:
+        if verify_dataset(data_path, manifest):
+            if GENERATION_CONFIG.get('log_progress', True):
+                print(f"Набор {generator.__name__} загружается из кэша ({manifest['rows']:,} строк)")
+            # Время доступа манифеста - основа вытеснения давно не использованных наборов
+            os.utime(manifest_path)
+            return _iter_cached_blocks(data_path, manifest)
+        print(f"Набор {generator.__name__} в кэше поврежден, генерация заново")
+        remove_dataset(data_path, manifest_path)
+    return _write_dataset(make_blocks(), data_path, manifest_path, params)
+
+def list_datasets():
+    """Готовые наборы в кэше: (время последнего использования, размер, файл данных, манифест)"""
+    datasets = []
+    for manifest_path in glob.glob(os.path.join(cache_directory(), '*.json')):
+        data_path = manifest_path[:-len('.json')] + '.copy'
+        try:
+            size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+            datasets.append((os.path.getmtime(manifest_path), size, data_path, manifest_path))
+        except FileNotFoundError:
+            continue
+    return datasets
+
+def evict_datasets(max_bytes=None):
+    """Удаление давно не использованных наборов, пока кэш больше max_bytes"""
+    if max_bytes is None:
+        max_bytes = GENERATION_CONFIG.get('dataset_cache_max_bytes')
+    if not max_bytes:
+        return
+    datasets = sorted(list_datasets())
+    total = sum(size for _, size, _, _ in datasets)
+    for _, size, data_path, manifest_path in datasets:
+        if total <= max_bytes:
+            break
+        remove_dataset(data_path, manifest_path)
+        total -= size
+        print(f"Набор {os.path.basename(data_path)} удален из кэша ({size / 1024 / 1024:.1f} МБ)")
@@ -0,0 +1,271 @@
+"""
+Стоимость GIN-индексов при непрерывной вставке: fastupdate и pending list
+
+С fastupdate = on новые ключи GIN сначала попадают в список ожидания
+(pending list), а в основную структуру индекса переносятся, когда список
+превышает gin_pending_list_limit (этим занимается вставка, которая его
+переполнила), при VACUUM или вызове gin_clean_pending_list(). Поиск при этом
+просматривает весь список ожидания. С fastupdate = off каждая вставка сразу
+обновляет основную структуру.
+
+Для таблиц 5_GIN (по умолчанию log_entries и products) в копию
+gin_pending_<таблица> загружается BENCHMARK_CONFIG['gin_pending_initial_rows']
+строк генератора исследования, строятся GIN-индексы таблицы из
+04_create_indexes.sql с параметрами конфигурации, после чего строки
+вставляются по одной команде INSERT на gin_pending_batch строк (каждая -
+отдельная транзакция; последняя команда - с остатком строк). Конфигурации: fastupdate = off и fastupdate = on с
+каждым gin_pending_list_limit из gin_pending_limits (кБ). Autovacuum для
+копии отключен, чтобы список очищали только вставки.
+
+Для каждой конфигурации записываются:
+    скорость вставки (строк в секунду), медиана, p99 и максимум времени
+    команды INSERT, число выбросов (дольше медианы в SPIKE_FACTOR раз -
+    как правило, перенос списка ожидания);
+    время поиска по шаблонам workload.py для этой таблицы каждые
+    gin_pending_search_every команд вставки и в конце вставки;
+    время gin_clean_pending_list() по всем индексам и время поиска после него;
+    размер индексов и, если доступно расширение pgstattuple, наибольшее число
+    страниц списка ожидания (pgstatginindex).
+
+Пример:
+    python shared/gin_pending.py
+    python shared/gin_pending.py --tables log_entries --limits 64 4096 --rows 50000
+"""
+
+import argparse
+import itertools
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from database_config import BENCHMARK_CONFIG, GENERATION_CONFIG
+from utils import get_db_connection
+from benchmark import percentile, write_output
+from cache_modes import ensure_extension
+from compare import INDEX_FILE, ROOT, SCHEMAS
+from index_build import parse_index_file
+from ingest import copy_index_sql, create_copy, study_module
+from sharding import load_generated
+from throughput import histogram
+from workload import WORKLOADS
+
+STUDY = '5_GIN'
+TABLES = ['log_entries', 'products']
+# Выброс - команда INSERT дольше медианы во столько раз
+SPIKE_FACTOR = 10
+
+def configurations(limits):
+    """Конфигурации индексов: (название, параметры WITH)"""
+    result = [('fastupdate off', 'fastupdate = off')]
+    result += [(f"fastupdate on, {limit} кБ", f"fastupdate = on, gin_pending_list_limit = {int(limit)}")
+               for limit in limits]
+    return result
+
+def create_indexes(cursor, indexes, copy, with_options):
+    """GIN-индексы таблицы на копии с параметрами; возвращает имена построенных"""
+    names = []
+    for index in indexes:
+        name = f"{index['name']}_pending"[:63]
+        cursor.execute("SAVEPOINT pending_index")
+        try:
+            cursor.execute(f"{copy_index_sql(index, name, copy)} WITH ({with_options})")
+            cursor.execute("RELEASE SAVEPOINT pending_index")
+            names.append(name)
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT pending_index")
+            print(f"  индекс {index['name']} пропущен: {str(e).strip().splitlines()[0]}")
+    return names
+
+def table_searches(cursor, table, copy, count):
+    """Поисковые запросы шаблонов workload.py к копии с параметрами из исходной таблицы"""
+    queries = []
+    for template in WORKLOADS[STUDY]['queries']:
+        if not re.search(rf'\bFROM\s+{table}\b', template['sql']):
+            continue
+        rng = random.Random(f"{GENERATION_CONFIG['seed']}:{template['id']}")
+        draws = [prepare(cursor, rng, BENCHMARK_CONFIG['workload_sample']) for prepare in template['params']]
+        sql = re.sub(rf'\b{table}\b', copy, template['sql'])
+        for _ in range(count):
+            params = {}
+            for draw in draws:
+                params.update(draw())
+            queries.append(cursor.mogrify(sql, params).decode())
+    return queries
+
+def insert_sql(copy, columns, count):
+    """Команда INSERT на count строк"""
+    row = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    return f"INSERT INTO {copy} ({', '.join(columns)}) VALUES {', '.join([row] * count)}"
+
+def search_ms(cursor, queries):
+    """Медиана времени поисковых запросов, мс"""
+    if not queries:
+        return None
+    latencies = []
+    for sql in queries:
+        start_time = time.perf_counter()
+        cursor.execute(sql)
+        cursor.fetchall()
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    return statistics.median(latencies)
+
+def pending_pages(cursor, names, available):
+    """Страниц в списках ожидания индексов (pgstatginindex) или None"""
+    if not available:
+        return None
+    total = 0
+    for name in names:
+        cursor.execute("SELECT pending_pages FROM pgstatginindex(%s::regclass)", (name,))
+        total += cursor.fetchone()[0]
+    return total
+
+def measure_configuration(conn, task, indexes, name, with_options, settings):
+    """Вставка в копию с индексами одной конфигурации"""
+    table = task['table']
+    copy = f"gin_pending_{table}"
+    initial_rows = min(task['num_records'], settings.initial_rows)
+    print(f"--- {table}: {name} ---")
+    create_copy(conn, table, copy, [], [])
+    load_generated(conn, copy, task['columns'], task['generator'], initial_rows,
+                   args=task.get('args', ()), vectorized=task.get('vectorized'))
+    with conn.cursor() as cursor:
+        names = create_indexes(cursor, indexes, copy, with_options)
+        cursor.execute(f"ALTER TABLE {copy} SET (autovacuum_enabled = off)")
+        cursor.execute(f"ANALYZE {copy}")
+        searches = table_searches(cursor, table, copy, settings.searches)
+    conn.commit()
+
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            stats_available = ensure_extension(cursor, 'pgstattuple')
+            sql = insert_sql(copy, task['columns'], settings.batch)
+            rows = iter(task['generator'](settings.rows, *task.get('args', ()), start=initial_rows))
+            latencies = []
+            during = []
+            max_pending = pending_pages(cursor, names, stats_available)
+            inserted = 0
+            search_seconds = 0.0
+            start_time = time.perf_counter()
+            # Пачки по settings.batch строк; последняя - остаток
+            for batch in iter(lambda: list(itertools.islice(rows, settings.batch)), []):
+                statement = sql if len(batch) == settings.batch else insert_sql(copy, task['columns'], len(batch))
+                statement_start = time.perf_counter()
+                cursor.execute(statement, [value for row in batch for value in row])
+                latencies.append(time.perf_counter() - statement_start)
+                inserted += len(batch)
+                if len(latencies) % settings.search_every == 0:
+                    # Поиск и опрос списка ожидания в скорость вставки не входят
+                    search_start = time.perf_counter()
+                    during.append(search_ms(cursor, searches))
+                    pending = pending_pages(cursor, names, stats_available)
+                    if pending is not None:
+                        max_pending = max(max_pending, pending)
+                    search_seconds += time.perf_counter() - search_start
+            seconds = time.perf_counter() - start_time - search_seconds
+
+            full_ms = search_ms(cursor, searches)
+            clean_start = time.perf_counter()
+            cleaned = 0
+            for index in names:
+                cursor.execute("SELECT gin_clean_pending_list(%s::regclass)", (index,))
+                cleaned += cursor.fetchone()[0]
+            clean_seconds = time.perf_counter() - clean_start
+            clean_ms = search_ms(cursor, searches)
+            cursor.execute("SELECT pg_indexes_size(%s::regclass)", (copy,))
+            index_size = cursor.fetchone()[0]
+    finally:
+        conn.autocommit = False
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {copy}")
+        conn.commit()
+
+    ordered = sorted(latencies)
+    median = percentile(ordered, 0.5)
+    during = [value for value in during if value is not None]
+    return {
+        'table': table,
+        'configuration': name,
+        'indexes': ' '.join(names),
+        'rows': inserted,
+        'seconds': seconds,
+        'rows_per_second': inserted / max(seconds, 1e-9),
+        'insert_p50_ms': median * 1000 if ordered else None,
+        'insert_p99_ms': percentile(ordered, 0.99) * 1000 if ordered else None,
+        'insert_max_ms': ordered[-1] * 1000 if ordered else None,
+        'spikes': sum(1 for latency in ordered if latency > median * SPIKE_FACTOR),
+        'insert_histogram_us': histogram(ordered),
+        'search_ms_during': statistics.median(during) if during else None,
+        'search_ms_full': full_ms,
+        'clean_seconds': clean_seconds,
+        'clean_pages': cleaned,
+        'search_ms_clean': clean_ms,
+        'max_pending_pages': max_pending,
+        'index_size': index_size
+    }
+
+def _ms(value):
+    return f"{value:.3f}" if value is not None else '-'
+
+def print_table(rows):
+    """Вывод конфигураций одной таблицы"""
+    print(f"{'конфигурация':<26} {'строк/с':>9} {'p50, мс':>8} {'p99, мс':>8} {'max, мс':>8} {'выбросы':>8} "
+          f"{'поиск, мс':>10} {'в конце':>8} {'очистка, с':>11} {'после':>7} {'индексы, МБ':>12}")
+    for row in rows:
+        print(f"{row['configuration']:<26} {row['rows_per_second']:>9,.0f} {_ms(row['insert_p50_ms']):>8} "
+              f"{_ms(row['insert_p99_ms']):>8} {_ms(row['insert_max_ms']):>8} {row['spikes']:>8} "
+              f"{_ms(row['search_ms_during']):>10} {_ms(row['search_ms_full']):>8} {row['clean_seconds']:>11.3f} "
+              f"{_ms(row['search_ms_clean']):>7} {row['index_size'] / 1024 / 1024:>12.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Вставка в таблицы с GIN-индексами: fastupdate и pending list")
+    parser.add_argument('--tables', nargs='+', default=TABLES, help="таблицы 5_GIN")
+    parser.add_argument('--limits', nargs='+', type=int, default=BENCHMARK_CONFIG['gin_pending_limits'],
+                        help="значения gin_pending_list_limit, кБ")
+    parser.add_argument('--rows', type=int, default=BENCHMARK_CONFIG['gin_pending_rows'],
+                        help="вставляемых строк на конфигурацию")
+    parser.add_argument('--batch', type=int, default=BENCHMARK_CONFIG['gin_pending_batch'],
+                        help="строк в одной команде INSERT")
+    parser.add_argument('--initial-rows', type=int, default=BENCHMARK_CONFIG['gin_pending_initial_rows'],
+                        help="строк в копии до вставки")
+    parser.add_argument('--search-every', type=int, default=BENCHMARK_CONFIG['gin_pending_search_every'],
+                        help="поиск через каждые N команд INSERT")
+    parser.add_argument('--searches', type=int, default=BENCHMARK_CONFIG['gin_pending_searches'],
+                        help="запросов на шаблон при каждом поиске")
+    parser.add_argument('--output-dir', default=BENCHMARK_CONFIG['output_dir'], help="каталог результатов")
+    options = parser.parse_args()
+
+    conn = get_db_connection()
+    started = datetime.now().isoformat(timespec='seconds')
+    rows = []
+    try:
+        _, indexes = parse_index_file(os.path.join(ROOT, STUDY, INDEX_FILE))
+        with conn.cursor() as cursor:
+            cursor.execute(f"SET search_path TO {SCHEMAS[STUDY]}")
+        conn.commit()
+        for task in study_module(STUDY).load_tasks():
+            if task['table'] not in options.tables:
+                continue
+            gin_indexes = [index for index in indexes if index['table'] == task['table'] and index['method'] == 'gin']
+            print(f"=== {STUDY}: {task['table']} ({len(gin_indexes)} GIN-индексов) ===")
+            table_rows = [measure_configuration(conn, task, gin_indexes, name, with_options, options)
+                          for name, with_options in configurations(options.limits)]
+            print_table(table_rows)
+            rows += table_rows
+        result = {'started': started, 'study': STUDY, 'batch': options.batch, 'pending': rows}
+        csv_rows = [{key: value for key, value in row.items() if key != 'insert_histogram_us'} for row in rows]
+        for output in write_output('gin_pending', result, csv_rows, options.output_dir):
+            print(f"Результаты: {output}")
+    except Exception as e:
+        conn.rollback()
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
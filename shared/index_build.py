@@ -0,0 +1,256 @@
+"""
+Время построения индексов из 04_create_indexes.sql
+
+Каждый CREATE INDEX файла исследования строится заново для всех сочетаний
+maintenance_work_mem (BENCHMARK_CONFIG['build_work_mem']),
+max_parallel_maintenance_workers (build_parallel_workers) и режима
+построения - обычного или CONCURRENTLY (build_concurrently). Для каждого
+построения записываются время, размер индекса и временные файлы по
+pg_stat_database (temp_files, temp_bytes; счетчики общие для базы, поэтому
+замер стоит запускать без параллельной нагрузки).
+
+Параллельное построение PostgreSQL поддерживает не для всех методов (B-tree,
+в новых версиях также BRIN и GIN) - для остальных число рабочих процессов
+не влияет на время. Остальные команды файла (SET search_path, CREATE
+EXTENSION) выполняются один раз перед замерами, ANALYZE пропускается.
+Индексы, существовавшие до замера, в конце создаются заново исходной
+командой.
+
+Пример:
+    python shared/index_build.py 5_GIN 6_BRIN
+    python shared/index_build.py 6_BRIN --work-mem 64MB 1GB --workers 0 --plain-only
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+from database_config import BENCHMARK_CONFIG
+from utils import get_db_connection
+from benchmark import split_statements, write_output
+from compare import INDEX_FILE, ROOT, STUDIES
+
+INDEX_STATEMENT = re.compile(
+    r'^\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+(CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s+'
+    r'ON\s+(?:ONLY\s+)?([\w.]+)\s*(?:USING\s+(\w+))?', re.I)
+# Опрос счетчиков временных файлов до PostgreSQL 15: число попыток и период, секунд
+TEMP_USAGE_POLLS = 10
+TEMP_USAGE_POLL_INTERVAL = 0.5
+
+def parse_index_file(path):
+    """Команды файла индексов: (подготовительные команды, список индексов)
+
+    Индекс - словарь с именем, таблицей, методом и командой без CONCURRENTLY.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        statements = split_statements(file.read())
+    setup = []
+    indexes = []
+    for _, statement in statements:
+        match = INDEX_STATEMENT.match(statement)
+        if match:
+            plain = statement
+            if match.group(1):
+                plain = statement[:match.start(1)] + statement[match.end(1):]
+            indexes.append({
+                'name': match.group(2),
+                'table': match.group(3),
+                'method': (match.group(4) or 'btree').lower(),
+                'sql': plain
+            })
+        elif not statement.lstrip().upper().startswith('ANALYZE'):
+            setup.append(statement)
+    return setup, indexes
+
+def _concurrent_sql(sql):
+    """Команда CREATE INDEX с CONCURRENTLY"""
+    return re.sub(r'\bINDEX\b', 'INDEX CONCURRENTLY', sql, count=1, flags=re.I)
+
+def _read_temp_usage(cursor):
+    cursor.execute("SELECT pg_stat_clear_snapshot()")
+    cursor.execute("""
+        SELECT temp_files, temp_bytes FROM pg_stat_database WHERE datname = current_database()
+    """)
+    return cursor.fetchone()
+
+def temp_usage(cursor):
+    """Счетчики временных файлов базы: (число файлов, байт)
+
+    Счетчики обновляются с задержкой: с PostgreSQL 15 процесс сбрасывает
+    накопленную статистику не чаще раза в секунду, поэтому сброс
+    запрашивается pg_stat_force_next_flush() (выполняется, когда соединение
+    простаивает вне транзакции, - нужен autocommit). В более ранних версиях
+    статистику собирает отдельный процесс, и счетчики опрашиваются, пока не
+    перестанут меняться.
+    """
+    cursor.execute("SHOW server_version_num")
+    if int(cursor.fetchone()[0]) >= 150000:
+        cursor.execute("SELECT pg_stat_force_next_flush()")
+        return _read_temp_usage(cursor)
+    usage = _read_temp_usage(cursor)
+    for _ in range(TEMP_USAGE_POLLS):
+        time.sleep(TEMP_USAGE_POLL_INTERVAL)
+        previous, usage = usage, _read_temp_usage(cursor)
+        if usage == previous:
+            break
+    return usage
+
+def existing_indexes(cursor):
+    """Имена индексов текущей схемы"""
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema() AND c.relkind = 'i'
+    """)
+    return {row[0] for row in cursor.fetchall()}
+
+def build_index(cursor, study, index, work_mem, workers, concurrently):
+    """Одно построение индекса с заданными параметрами; возвращает строку результата"""
+    row = {
+        'study': study,
+        'index': index['name'],
+        'table': index['table'],
+        'method': index['method'],
+        'work_mem': work_mem,
+        'workers': workers,
+        'concurrently': concurrently,
+        'seconds': None,
+        'size': None,
+        'temp_files': None,
+        'temp_bytes': None,
+        'error': None
+    }
+    cursor.execute(f"DROP INDEX IF EXISTS {index['name']}")
+    cursor.execute("SET maintenance_work_mem = %s", (work_mem,))
+    cursor.execute(f"SET max_parallel_maintenance_workers = {int(workers)}")
+    files_before, bytes_before = temp_usage(cursor)
+    start_time = time.time()
+    try:
+        cursor.execute(_concurrent_sql(index['sql']) if concurrently else index['sql'])
+    except Exception as e:
+        row['error'] = str(e).strip()
+        cursor.execute(f"DROP INDEX IF EXISTS {index['name']}")
+        return row
+    row['seconds'] = time.time() - start_time
+    files_after, bytes_after = temp_usage(cursor)
+    row['temp_files'] = files_after - files_before
+    row['temp_bytes'] = bytes_after - bytes_before
+    cursor.execute("SELECT pg_relation_size(%s::regclass)", (index['name'],))
+    row['size'] = cursor.fetchone()[0]
+    cursor.execute(f"DROP INDEX {index['name']}")
+    return row
+
+def benchmark_study(conn, study, work_mems, workers_list, modes, names=None):
+    """Замер построения всех (или указанных) индексов исследования"""
+    setup, indexes = parse_index_file(os.path.join(ROOT, study, INDEX_FILE))
+    if names:
+        indexes = [index for index in indexes if index['name'] in names]
+    conn.autocommit = True
+    rows = []
+    with conn.cursor() as cursor:
+        for statement in setup:
+            cursor.execute(statement)
+        existed = existing_indexes(cursor)
+        try:
+            for index in indexes:
+                print(f"--- {index['name']} ({index['method']}, {index['table']}) ---")
+                for work_mem in work_mems:
+                    for workers in workers_list:
+                        for concurrently in modes:
+                            row = build_index(cursor, study, index, work_mem, workers, concurrently)
+                            rows.append(row)
+                            print_row(row)
+        finally:
+            cursor.execute("RESET maintenance_work_mem")
+            cursor.execute("RESET max_parallel_maintenance_workers")
+            for index in indexes:
+                if index['name'] in existed:
+                    cursor.execute(f"DROP INDEX IF EXISTS {index['name']}")
+                    cursor.execute(index['sql'])
+    return rows
+
+def print_row(row):
+    """Строка результата одного построения"""
+    mode = 'CONCURRENTLY' if row['concurrently'] else 'обычное'
+    settings = f"  {row['work_mem']:>6} x{row['workers']} {mode:<12}"
+    if row['error']:
+        print(f"{settings} ошибка: {row['error']}")
+        return
+    print(f"{settings} {row['seconds']:>8.2f} с  {row['size'] / 1024 / 1024:>8.1f} МБ  "
+          f"временные файлы: {row['temp_files']} ({row['temp_bytes'] / 1024 / 1024:.1f} МБ)")
+
+def summarize_methods(rows):
+    """Итог по методам доступа: лучшее и худшее суммарное время при одинаковых параметрах"""
+    totals = {}
+    for row in rows:
+        if row['error']:
+            continue
+        key = (row['method'], row['work_mem'], row['workers'], row['concurrently'])
+        total = totals.setdefault(key, {'seconds': 0.0, 'size': 0, 'temp_bytes': 0})
+        total['seconds'] += row['seconds']
+        total['size'] += row['size']
+        total['temp_bytes'] += row['temp_bytes']
+    summary = {}
+    for (method, work_mem, workers, concurrently), total in totals.items():
+        settings = {'work_mem': work_mem, 'workers': workers, 'concurrently': concurrently, **total}
+        entry = summary.setdefault(method, {'best': settings, 'worst': settings})
+        if settings['seconds'] < entry['best']['seconds']:
+            entry['best'] = settings
+        if settings['seconds'] > entry['worst']['seconds']:
+            entry['worst'] = settings
+    return summary
+
+def print_summary(summary):
+    """Вывод итога по методам доступа"""
+    print("=== Итог по методам доступа (сумма по индексам метода) ===")
+    for method, entry in sorted(summary.items()):
+        for label in ('best', 'worst'):
+            settings = entry[label]
+            mode = 'CONCURRENTLY' if settings['concurrently'] else 'обычное'
+            print(f"  {method:<7} {'лучшее' if label == 'best' else 'худшее':<7} {settings['seconds']:>8.2f} с  "
+                  f"{settings['work_mem']:>6} x{settings['workers']} {mode:<12} "
+                  f"временные файлы {settings['temp_bytes'] / 1024 / 1024:.1f} МБ")
+
+def main():
+    parser = argparse.ArgumentParser(description="Время построения индексов из 04_create_indexes.sql")
+    parser.add_argument('studies', nargs='*', default=STUDIES, help="каталоги исследований")
+    parser.add_argument('--indexes', nargs='*', help="имена индексов (по умолчанию все)")
+    parser.add_argument('--work-mem', nargs='+', default=BENCHMARK_CONFIG['build_work_mem'],
+                        help="значения maintenance_work_mem")
+    parser.add_argument('--workers', nargs='+', type=int, default=BENCHMARK_CONFIG['build_parallel_workers'],
+                        help="значения max_parallel_maintenance_workers")
+    parser.add_argument('--plain-only', action='store_true', help="только обычное построение")
+    parser.add_argument('--output-dir', default=BENCHMARK_CONFIG['output_dir'], help="каталог результатов")
+    options = parser.parse_args()
+    modes = [False] if options.plain_only else BENCHMARK_CONFIG['build_concurrently']
+
+    conn = get_db_connection()
+    started = datetime.now().isoformat(timespec='seconds')
+    rows = []
+    try:
+        for study in options.studies:
+            study = os.path.basename(os.path.normpath(study))
+            print(f"=== {study} ===")
+            rows += benchmark_study(conn, study, options.work_mem, options.workers, modes, options.indexes)
+        summary = summarize_methods(rows)
+        print_summary(summary)
+        result = {
+            'started': started,
+            'studies': options.studies,
+            'builds': rows,
+            'methods': summary
+        }
+        for output in write_output('index_build', result, rows, options.output_dir):
+            print(f"Результаты: {output}")
+    except Exception as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Стоимость индексов при записи: скорость загрузки и объем WAL
+
+Генератор таблицы исследования (load_tasks() из 02_generate_data.py)
+повторно загружается в копию таблицы ingest_<таблица> с уже созданными
+индексами. Для каждой конфигурации копии измеряются строки в секунду и
+объем WAL по разнице pg_current_wal_lsn() до и после загрузки, а также
+размер индексов после нее. Конфигурации:
+    none         - без индексов и ограничений (база для сравнения);
+    constraints  - PRIMARY KEY и UNIQUE исходной таблицы;
+    <метод>      - ограничения и индексы этого метода из 04_create_indexes.sql;
+    all          - ограничения и все индексы таблицы из 04_create_indexes.sql.
+Замедление и рост WAL считаются относительно none.
+
+Перед замерами копия один раз загружается без индексов: так набор данных
+попадает в кэш (см. dataset_cache.py), и время генерации не входит в
+сравнение. Перед каждой загрузкой выполняется CHECKPOINT (нужны права
+суперпользователя или роль pg_checkpoint), чтобы первые изменения страниц
+после контрольной точки (full page writes) одинаково попадали во все замеры.
+Столбцы, которые 02_generate_data.py заполняет после загрузки (ключ
+'computed' задачи, например search_vector), в копии вычисляет триггер
+BEFORE INSERT, так что их расчет и индексы по ним входят в замер.
+Копия - обычная (LOGGED) таблица в схеме исследования; после замера она
+удаляется, исходная таблица не меняется.
+
+Пример:
+    python shared/ingest.py 5_GIN
+    python shared/ingest.py 7_Bloom --tables security_logs --rows 50000
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from datetime import datetime
+
+from database_config import BENCHMARK_CONFIG
+from utils import get_db_connection
+from benchmark import write_output
+from compare import INDEX_FILE, ROOT, STUDIES
+from index_build import INDEX_STATEMENT, parse_index_file
+from load_phases import table_constraints
+from sharding import load_generated
+
+GENERATOR_FILE = '02_generate_data.py'
+
+def study_module(study):
+    """Модуль 02_generate_data.py исследования (без запуска main)"""
+    path = os.path.join(ROOT, study, GENERATOR_FILE)
+    name = 'study_' + study.replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def copy_index_sql(index, name, table):
+    """Команда создания индекса index для другой таблицы и под другим именем"""
+    sql = index['sql']
+    match = INDEX_STATEMENT.match(sql)
+    return sql[:match.start(2)] + name + sql[match.end(2):match.start(3)] + table + sql[match.end(3):]
+
+def configurations(indexes, constraints):
+    """Конфигурации копии: список (название, индексы из 04, с ограничениями ли)"""
+    methods = sorted({index['method'] for index in indexes})
+    result = [('none', [], False)]
+    if constraints:
+        result.append(('constraints', [], True))
+    result += [(method, [index for index in indexes if index['method'] == method], True) for method in methods]
+    if len(methods) > 1:
+        result.append(('all', indexes, True))
+    return result
+
+def create_copy(conn, table, copy, constraints, indexes, computed=None):
+    """Пустая копия таблицы с заданными ограничениями и индексами
+
+    computed - {столбец: SQL-выражение над столбцами строки}: такие столбцы
+    вычисляет триггер BEFORE INSERT (функция {copy}_computed, удаляется drop_copy).
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {copy}")
+        cursor.execute(f"CREATE TABLE {copy} (LIKE {table} INCLUDING DEFAULTS INCLUDING GENERATED)")
+        # Столбцы SERIAL копии не должны расходовать последовательность исходной таблицы
+        cursor.execute("""
+            SELECT a.attname
+            FROM pg_attrdef d
+            JOIN pg_attribute a ON a.attrelid = d.adrelid AND a.attnum = d.adnum
+            WHERE d.adrelid = %s::regclass AND pg_get_expr(d.adbin, d.adrelid) LIKE 'nextval(%%'
+        """, (table,))
+        for (column,) in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {copy} ALTER COLUMN {column} DROP DEFAULT, "
+                           f"ALTER COLUMN {column} ADD GENERATED BY DEFAULT AS IDENTITY")
+        for _, definition in constraints:
+            cursor.execute(f"ALTER TABLE {copy} ADD {definition}")
+        for index in indexes:
+            cursor.execute(copy_index_sql(index, f"{index['name']}_ingest"[:63], copy))
+        if computed:
+            cursor.execute(f"""
+                CREATE OR REPLACE FUNCTION {copy}_computed() RETURNS trigger LANGUAGE plpgsql AS $$
+                BEGIN
+                    SELECT {', '.join(computed.values())} INTO {', '.join('NEW.' + column for column in computed)}
+                    FROM (SELECT NEW.*) AS new_row;
+                    RETURN NEW;
+                END $$
+            """)
+            cursor.execute(f"CREATE TRIGGER {copy}_computed BEFORE INSERT ON {copy} "
+                           f"FOR EACH ROW EXECUTE FUNCTION {copy}_computed()")
+    conn.commit()
+
+def drop_copy(conn, copy):
+    """Удаление копии и функции ее триггера"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {copy}")
+        cursor.execute(f"DROP FUNCTION IF EXISTS {copy}_computed()")
+    conn.commit()
+
+def checkpoint(conn):
+    """CHECKPOINT перед замером; False, если прав не хватает"""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("CHECKPOINT")
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"CHECKPOINT не выполнен ({str(e).strip()}), замеры WAL менее точны")
+        return False
+
+def wal_lsn(conn):
+    """Текущая позиция WAL"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_current_wal_lsn()")
+        return cursor.fetchone()[0]
+
+def measure_ingest(conn, task, copy, num_records, connections):
+    """Загрузка в копию: (строк, секунд, байт WAL, размер индексов)"""
+    start_lsn = wal_lsn(conn)
+    start_time = time.time()
+    stats = load_generated(conn, copy, task['columns'], task['generator'], num_records,
+                           args=task.get('args', ()), vectorized=task.get('vectorized'),
+                           connections=connections)
+    conn.commit()
+    seconds = time.time() - start_time
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s), pg_indexes_size(%s::regclass)",
+                       (start_lsn, copy))
+        wal_bytes, index_size = cursor.fetchone()
+    conn.commit()
+    return stats['rows'], seconds, int(wal_bytes), index_size
+
+def benchmark_table(conn, study, task, indexes, num_records, connections, warmup=True):
+    """Замеры всех конфигураций одной таблицы"""
+    table = task['table']
+    copy = f"ingest_{table}"
+    constraints = table_constraints(conn, table)
+    rows = []
+    can_checkpoint = True
+    try:
+        if warmup:
+            print(f"Прогрев: загрузка {num_records:,} {task['title']} без индексов...")
+            create_copy(conn, table, copy, [], [], task.get('computed'))
+            measure_ingest(conn, task, copy, num_records, connections)
+        for name, config_indexes, with_constraints in configurations(indexes, constraints):
+            try:
+                create_copy(conn, table, copy, constraints if with_constraints else [], config_indexes,
+                            task.get('computed'))
+            except Exception as e:
+                conn.rollback()
+                print(f"Конфигурация {name} пропущена: {str(e).strip()}")
+                continue
+            if can_checkpoint:
+                can_checkpoint = checkpoint(conn)
+            loaded, seconds, wal_bytes, index_size = measure_ingest(conn, task, copy, num_records, connections)
+            rows.append({
+                'study': study,
+                'table': table,
+                'configuration': name,
+                'indexes': ' '.join(index['name'] for index in config_indexes),
+                'constraints': len(constraints) if with_constraints else 0,
+                'rows': loaded,
+                'seconds': seconds,
+                'rows_per_second': loaded / max(seconds, 1e-9),
+                'wal_bytes': wal_bytes,
+                'wal_per_row': wal_bytes / max(loaded, 1),
+                'index_size': index_size
+            })
+    finally:
+        conn.rollback()
+        drop_copy(conn, copy)
+    # Без замера none (конфигурация пропущена) сравнивать не с чем
+    base = next((row for row in rows if row['configuration'] == 'none'), None)
+    for row in rows:
+        row['slowdown'] = base['rows_per_second'] / row['rows_per_second'] if base else None
+        row['wal_amplification'] = row['wal_bytes'] / max(base['wal_bytes'], 1) if base else None
+    return rows
+
+def _times(value):
+    return f"{value:.2f}x" if value is not None else '-'
+
+def print_table(rows):
+    """Вывод замеров одной таблицы"""
+    print(f"{'конфигурация':<13} {'индексов':>8} {'строк/с':>10} {'WAL, МБ':>9} {'WAL/строка':>11} "
+          f"{'индексы, МБ':>12} {'замедление':>11} {'рост WAL':>9}")
+    for row in rows:
+        count = len(row['indexes'].split()) + row['constraints']
+        print(f"{row['configuration']:<13} {count:>8} {row['rows_per_second']:>10,.0f} "
+              f"{row['wal_bytes'] / 1024 / 1024:>9.1f} {row['wal_per_row']:>9.0f} Б "
+              f"{row['index_size'] / 1024 / 1024:>12.1f} {_times(row['slowdown']):>11} {_times(row['wal_amplification']):>9}")
+
+def benchmark_study(conn, study, tables=None, max_rows=None, connections=1, warmup=True):
+    """Замеры записи для таблиц исследования"""
+    module = study_module(study)
+    setup, indexes = parse_index_file(os.path.join(ROOT, study, INDEX_FILE))
+    with conn.cursor() as cursor:
+        for statement in setup:
+            cursor.execute(statement)
+    conn.commit()
+    rows = []
+    for task in module.load_tasks():
+        if tables and task['table'] not in tables:
+            continue
+        num_records = min(task['num_records'], max_rows) if max_rows else task['num_records']
+        print(f"=== {study}: {task['table']} ===")
+        table_rows = benchmark_table(conn, study, task,
+                                     [index for index in indexes if index['table'] == task['table']],
+                                     num_records, connections, warmup)
+        print_table(table_rows)
+        rows += table_rows
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость загрузки и объем WAL при разных наборах индексов")
+    parser.add_argument('studies', nargs='*', default=STUDIES, help="каталоги исследований")
+    parser.add_argument('--tables', nargs='*', help="таблицы (по умолчанию все таблицы исследования)")
+    parser.add_argument('--rows', type=int, help="ограничение числа строк на таблицу")
+    parser.add_argument('--connections', type=int, default=1, help="соединений для загрузки одной таблицы")
+    parser.add_argument('--no-warmup', action='store_true', help="без прогревочной загрузки")
+    parser.add_argument('--output-dir', default=BENCHMARK_CONFIG['output_dir'], help="каталог результатов")
+    options = parser.parse_args()
+
+    conn = get_db_connection()
+    started = datetime.now().isoformat(timespec='seconds')
+    rows = []
+    try:
+        for study in options.studies:
+            study = os.path.basename(os.path.normpath(study))
+            rows += benchmark_study(conn, study, options.tables, options.rows, options.connections,
+                                    not options.no_warmup)
+        result = {'started': started, 'studies': options.studies, 'ingest': rows}
+        for output in write_output('ingest', result, rows, options.output_dir):
+            print(f"Результаты: {output}")
+    except Exception as e:
+        conn.rollback()
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Сравнение классов операторов GIN для JSONB-столбцов 5_GIN
+
+Для каждого JSONB-столбца с GIN-индексом из 04_create_indexes.sql
+(user_profiles.profile_data, articles.metadata, documents.properties,
+log_entries.context) строятся варианты:
+    none           - без индекса (база для сравнения);
+    jsonb_ops      - GIN с классом по умолчанию: индексирует ключи и значения
+                     по отдельности;
+    jsonb_path_ops - GIN с хешами путей до значений: меньше и быстрее для @>,
+                     но не поддерживает операторы существования ключей;
+    btree_paths    - B-tree по выражениям для "горячих" путей HOT_PATHS
+                     (например, profile_data->'address'->>'city').
+
+Запросы - формы условий для каждого горячего пути, значения путей берутся из
+существующих строк (BENCHMARK_CONFIG['jsonb_opclass_draws'] наборов,
+одинаковых для всех вариантов):
+    containment   - col @> '{"a": {"b": значение}}';
+    key_exists    - col ? 'a';
+    keys_any      - col ?| array['a', <отсутствующий ключ>];
+    jsonpath      - col @@ '$.a.b == значение';
+    path_exists   - col @? '$.a.b';
+    path_equality - col->'a'->>'b' = 'значение'.
+
+Вариант строится в транзакции, в которой остальные индексы таблицы (кроме
+индексов ограничений) удалены; в конце транзакция откатывается. Для варианта
+записываются время построения и размер, для каждой формы запроса - медиана
+времени выполнения (BENCHMARK_CONFIG['jsonb_opclass_runs'] замеров каждого
+набора значений), выбрал ли планировщик индекс варианта (used) и может ли
+индекс вообще обслужить эту форму (served - индекс есть в плане при
+отключенном Seq Scan). Формы, которые вариант не обслуживает, выводятся
+отдельно.
+
+Пример:
+    python shared/jsonb_opclass.py
+    python shared/jsonb_opclass.py --targets user_profiles.profile_data --variants jsonb_ops jsonb_path_ops
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from database_config import BENCHMARK_CONFIG, GENERATION_CONFIG
+from utils import get_db_connection
+from benchmark import _plan_nodes, explain_query, write_output
+from brin_tuning import droppable_indexes
+from compare import INDEX_FILE, ROOT, SCHEMAS
+from index_build import parse_index_file
+from workload import existing
+
+STUDY = '5_GIN'
+VARIANTS = ['none', 'jsonb_ops', 'jsonb_path_ops', 'btree_paths']
+SHAPES = ['containment', 'key_exists', 'keys_any', 'jsonpath', 'path_exists', 'path_equality']
+# Часто запрашиваемые пути JSONB-столбцов (таблица.столбец -> пути)
+HOT_PATHS = {
+    'user_profiles.profile_data': [('address', 'city'), ('personal', 'gender'), ('employment', 'industry')],
+    'articles.metadata': [('category',)],
+    'documents.properties': [('status',), ('department',)],
+    'log_entries.context': [('method',), ('status_code',)]
+}
+GIN_COLUMN = re.compile(r'USING\s+GIN\s*\(\s*(\w+)\s*\)', re.I)
+MISSING_KEY = 'no_such_key'
+VARIANT_INDEX = 'jsonb_opclass_variant'
+
+def jsonb_targets():
+    """JSONB-столбцы с GIN-индексами файла 04, для которых заданы горячие пути"""
+    _, indexes = parse_index_file(os.path.join(ROOT, STUDY, INDEX_FILE))
+    targets = []
+    for index in indexes:
+        match = GIN_COLUMN.search(index['sql'])
+        target = f"{index['table']}.{match.group(1)}" if match else None
+        if target in HOT_PATHS and target not in targets:
+            targets.append(target)
+    return targets
+
+def path_text(column, path):
+    """Выражение текстового значения пути: col->'a'->>'b'"""
+    keys = [f"'{key}'" for key in path]
+    return '->'.join([column] + keys[:-1]) + '->>' + keys[-1]
+
+def variant_indexes(variant, table, column, paths):
+    """Команды CREATE INDEX варианта"""
+    if variant == 'jsonb_ops':
+        return [f"CREATE INDEX {VARIANT_INDEX} ON {table} USING GIN ({column})"]
+    if variant == 'jsonb_path_ops':
+        return [f"CREATE INDEX {VARIANT_INDEX} ON {table} USING GIN ({column} jsonb_path_ops)"]
+    if variant == 'btree_paths':
+        return [f"CREATE INDEX {VARIANT_INDEX}_{number} ON {table} USING BTREE (({path_text(column, path)}))"
+                for number, path in enumerate(paths, 1)]
+    return []
+
+def shape_condition(shape, column, path, value, text):
+    """Условие формы запроса для пути и его значения (json - значение, text - его текст)"""
+    nested = value
+    for key in reversed(path):
+        nested = {key: nested}
+    conditions = {
+        'containment': (f"{column} @> %s::jsonb", json.dumps(nested)),
+        'key_exists': (f"{column} ? %s", path[0]),
+        'keys_any': (f"{column} ?| %s::text[]", [path[0], MISSING_KEY]),
+        'jsonpath': (f"{column} @@ %s::jsonpath", f"$.{'.'.join(path)} == {json.dumps(value)}"),
+        'path_exists': (f"{column} @? %s::jsonpath", f"$.{'.'.join(path)}"),
+        'path_equality': (f"{path_text(column, path)} = %s", text)
+    }
+    return conditions[shape]
+
+def target_queries(cursor, table, column, paths, draws):
+    """Запросы всех форм для горячих путей: [(путь, форма, [SQL, ...]), ...]"""
+    queries = []
+    for path in paths:
+        json_path = '{' + ','.join(path) + '}'
+        prepare = existing(table, [f"{column} #> '{json_path}'", f"{column} #>> '{json_path}'"], ['value', 'text'])
+        draw = prepare(cursor, random.Random(f"{GENERATION_CONFIG['seed']}:{table}:{json_path}"),
+                       BENCHMARK_CONFIG['workload_sample'])
+        values = [draw() for _ in range(draws)]
+        for shape in SHAPES:
+            sqls = []
+            for params in values:
+                condition, argument = shape_condition(shape, column, path, params['value'], params['text'])
+                sqls.append(cursor.mogrify(f"SELECT count(*) FROM {table} WHERE {condition}", (argument,)).decode())
+            queries.append(('.'.join(path), shape, sqls))
+    return queries
+
+def plan_indexes(cursor, sql):
+    """Индексы плана запроса (EXPLAIN без выполнения)"""
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+    result = cursor.fetchone()[0]
+    if isinstance(result, str):
+        result = json.loads(result)
+    return {node['Index Name'] for node in _plan_nodes(result[0]['Plan']) if 'Index Name' in node}
+
+def _is_variant(names):
+    return any(name.startswith(VARIANT_INDEX) for name in names)
+
+def measure_shape(cursor, path, shape, sqls, runs):
+    """Замер одной формы запроса: медиана времени, выбор и применимость индекса"""
+    for sql in sqls:
+        explain_query(cursor, sql)
+    samples = [explain_query(cursor, sql) for _ in range(runs) for sql in sqls]
+    cursor.execute("SET LOCAL enable_seqscan = off")
+    served = all(_is_variant(plan_indexes(cursor, sql)) for sql in sqls)
+    cursor.execute("SET LOCAL enable_seqscan = on")
+    return {
+        'path': path,
+        'shape': shape,
+        'execution_ms': statistics.median(sample['execution_ms'] for sample in samples),
+        'used': all(_is_variant(sample['indexes']) for sample in samples),
+        'served': served
+    }
+
+def measure_variant(conn, target, variant, queries, paths, runs):
+    """Построение и замер варианта в откатываемой транзакции"""
+    table, column = target.split('.')
+    row = {'target': target, 'variant': variant, 'build_seconds': 0.0, 'size': 0, 'shapes': [], 'error': None}
+    try:
+        with conn.cursor() as cursor:
+            for name in droppable_indexes(cursor, table):
+                cursor.execute(f"DROP INDEX {name}")
+            for sql in variant_indexes(variant, table, column, paths):
+                start_time = time.time()
+                cursor.execute(sql)
+                row['build_seconds'] += time.time() - start_time
+            cursor.execute("""
+                SELECT coalesce(sum(pg_relation_size(indexrelid)), 0) FROM pg_index
+                WHERE indrelid = %s::regclass AND indexrelid::regclass::text LIKE %s
+            """, (table, f"{VARIANT_INDEX}%"))
+            row['size'] = int(cursor.fetchone()[0])
+            row['shapes'] = [measure_shape(cursor, path, shape, sqls, runs) for path, shape, sqls in queries]
+    except Exception as e:
+        row['error'] = str(e).strip().splitlines()[0]
+    finally:
+        conn.rollback()
+    return row
+
+def print_target(target, rows):
+    """Таблица времени форм запросов по вариантам и формы, которые варианты не обслуживают"""
+    measured = [row for row in rows if not row['error']]
+    for row in rows:
+        if row['error']:
+            print(f"  {row['variant']}: ошибка: {row['error']}")
+    print(f"  {'':<32}" + ''.join(f"{row['variant']:>16}" for row in measured))
+    print(f"  {'размер, КБ':<32}" + ''.join(f"{row['size'] / 1024:>16.0f}" for row in measured))
+    print(f"  {'построение, с':<32}" + ''.join(f"{row['build_seconds']:>16.3f}" for row in measured))
+    if not measured:
+        return
+    for position, shape in enumerate(measured[0]['shapes']):
+        cells = []
+        for row in measured:
+            result = row['shapes'][position]
+            mark = '' if row['variant'] == 'none' or result['used'] else ('*' if result['served'] else '-')
+            cells.append(f"{result['execution_ms']:>14.3f}{mark:<2}")
+        print(f"  {shape['path'] + ' ' + shape['shape']:<32}" + ''.join(cells))
+    print("  (* - индекс применим, но не выбран планировщиком; - - индекс не обслуживает форму)")
+    for row in measured:
+        if row['variant'] == 'none':
+            continue
+        unserved = sorted({result['shape'] for result in row['shapes'] if not result['served']})
+        print(f"  {row['variant']} не обслуживает: {', '.join(unserved) or '-'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="jsonb_ops, jsonb_path_ops и B-tree по путям для JSONB 5_GIN")
+    parser.add_argument('--targets', nargs='+', help="таблица.столбец (по умолчанию все JSONB-столбцы файла 04)")
+    parser.add_argument('--variants', nargs='+', default=VARIANTS, choices=VARIANTS, help="варианты индексов")
+    parser.add_argument('--runs', type=int, default=BENCHMARK_CONFIG['jsonb_opclass_runs'],
+                        help="замеров каждого набора значений")
+    parser.add_argument('--draws', type=int, default=BENCHMARK_CONFIG['jsonb_opclass_draws'],
+                        help="наборов значений на путь")
+    parser.add_argument('--output-dir', default=BENCHMARK_CONFIG['output_dir'], help="каталог результатов")
+    options = parser.parse_args()
+
+    targets = jsonb_targets()
+    if options.targets:
+        targets = [target for target in targets if target in options.targets]
+
+    conn = get_db_connection()
+    started = datetime.now().isoformat(timespec='seconds')
+    rows = []
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SET search_path TO {SCHEMAS[STUDY]}")
+        conn.commit()
+        for target in targets:
+            table, column = target.split('.')
+            paths = HOT_PATHS[target]
+            with conn.cursor() as cursor:
+                queries = target_queries(cursor, table, column, paths, options.draws)
+            conn.commit()
+            print(f"=== {target}: пути {', '.join('.'.join(path) for path in paths)} ===")
+            target_rows = [measure_variant(conn, target, variant, queries, paths, options.runs)
+                           for variant in options.variants]
+            print_target(target, target_rows)
+            rows += target_rows
+        result = {'started': started, 'study': STUDY, 'runs': options.runs, 'draws': options.draws,
+                  'opclasses': rows}
+        csv_rows = [{'target': row['target'], 'variant': row['variant'], 'build_seconds': row['build_seconds'],
+                     'size': row['size'], 'error': row['error'], **shape}
+                    for row in rows for shape in row['shapes'] or [{}]]
+        for output in write_output('jsonb_opclass', result, csv_rows, options.output_dir):
+            print(f"Результаты: {output}")
+    except Exception as e:
+        conn.rollback()
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Загрузка данных всех исследований одновременно
+
+Схемы семи исследований независимы, поэтому их скрипты 02_generate_data.py
+можно запускать параллельно отдельными процессами. Одновременно работает
+не больше --parallel скриптов; вывод каждого скрипта печатается целиком
+после его завершения.
+
+Пример:
+    python shared/load_all.py --parallel 3
+    python shared/load_all.py 6_BRIN 7_Bloom
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+STUDIES = ['1_B-tree', '2_Hash', '3_GiST', '4_SP-GiST', '5_GIN', '6_BRIN', '7_Bloom']
+
+def run_study(study):
+    """Запуск скрипта генерации одного исследования: (исследование, код возврата, вывод, секунды)"""
+    start_time = time.time()
+    script = os.path.join(ROOT, study, '02_generate_data.py')
+    result = subprocess.run([sys.executable, script], cwd=os.path.join(ROOT, study),
+                            capture_output=True, text=True)
+    return study, result.returncode, result.stdout + result.stderr, time.time() - start_time
+
+def main():
+    parser = argparse.ArgumentParser(description="Параллельная загрузка данных всех исследований")
+    parser.add_argument('studies', nargs='*', default=STUDIES, help="каталоги исследований")
+    parser.add_argument('--parallel', type=int, default=len(STUDIES),
+                        help="сколько скриптов выполнять одновременно")
+    options = parser.parse_args()
+
+    start_time = time.time()
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(options.parallel, 1)) as executor:
+        for study, code, output, seconds in executor.map(run_study, options.studies):
+            print(f"===== {study} ({seconds:.1f} с) =====")
+            print(output)
+            # Скрипты сообщают об ошибке в выводе, а не кодом возврата
+            if code != 0 or "Данные успешно сгенерированы" not in output:
+                failed.append(study)
+
+    print(f"Всего: {time.time() - start_time:.1f} с")
+    if failed:
+        print(f"Ошибки в исследованиях: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
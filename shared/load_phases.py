@@ -0,0 +1,124 @@
+"""
+Фазы загрузки схемы и их время
+
+В режиме GENERATION_CONFIG['load_mode'] = 'phased' таблицы схемы перед
+загрузкой переводятся в UNLOGGED, а их PRIMARY KEY и UNIQUE ограничения
+снимаются (определения сохраняются). После загрузки ограничения создаются
+заново одним построением индекса на таблицу, выполняется ANALYZE, и таблицы
+возвращаются в LOGGED. Так строки при загрузке не пишутся в WAL и не
+обновляют B-tree индексы ограничений.
+
+В обычном режиме ('direct') таблицы не меняются, но время загрузки и ANALYZE
+тоже измеряется - чтобы можно было сравнить время до готовой к тестам схемы
+в обоих режимах.
+
+Использование в скрипте генерации:
+    phases = prepare_load(conn)
+    ... загрузка таблиц ...
+    finalize_load(conn, phases)
+"""
+
+import time
+
+from database_config import GENERATION_CONFIG
+
+PHASES = [
+    ('prepare', 'перевод в UNLOGGED, снятие ограничений'),
+    ('load', 'загрузка данных'),
+    ('constraints', 'создание PRIMARY KEY и UNIQUE'),
+    ('analyze', 'ANALYZE'),
+    ('set_logged', 'перевод в LOGGED')
+]
+
+def phased_mode():
+    """Включен ли режим загрузки по фазам"""
+    return GENERATION_CONFIG.get('load_mode', 'direct') == 'phased'
+
+def schema_tables(conn):
+    """Таблицы первой схемы search_path соединения"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT c.relname
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = current_schema() AND c.relkind = 'r'
+            ORDER BY c.relname
+        """)
+        return [row[0] for row in cursor.fetchall()]
+
+def table_constraints(conn, table):
+    """PRIMARY KEY и UNIQUE ограничения таблицы: список (имя, определение)"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT conname, pg_get_constraintdef(oid)
+            FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype IN ('p', 'u')
+            ORDER BY contype, conname
+        """, (table,))
+        return cursor.fetchall()
+
+def _run_phase(conn, phases, phase, statements):
+    """Выполнение команд фазы с фиксацией и замером времени"""
+    start_time = time.time()
+    with conn.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+    conn.commit()
+    phases['timings'][phase] = time.time() - start_time
+
+def prepare_load(conn, tables=None):
+    """Подготовка таблиц схемы к загрузке; возвращает состояние для finalize_load
+
+    Изменения фиксируются сразу: таблицы могут загружаться через другие
+    соединения (load_tables_parallel).
+    """
+    phases = {
+        'tables': tables or schema_tables(conn),
+        'constraints': {},
+        'phased': phased_mode(),
+        'timings': {}
+    }
+    if phases['phased']:
+        statements = []
+        for table in phases['tables']:
+            constraints = table_constraints(conn, table)
+            phases['constraints'][table] = constraints
+            statements += [f"ALTER TABLE {table} DROP CONSTRAINT {name}" for name, _ in constraints]
+            statements.append(f"ALTER TABLE {table} SET UNLOGGED")
+        _run_phase(conn, phases, 'prepare', statements)
+    else:
+        conn.commit()
+    phases['load_start'] = time.time()
+    return phases
+
+def finalize_load(conn, phases):
+    """Завершение загрузки: ограничения, ANALYZE, LOGGED; возвращает время фаз (секунды)"""
+    conn.commit()
+    timings = phases['timings']
+    timings['load'] = time.time() - phases['load_start']
+    tables = phases['tables']
+
+    if phases['phased']:
+        print("Создание PRIMARY KEY и UNIQUE ограничений...")
+        _run_phase(conn, phases, 'constraints', [
+            f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}"
+            for table in tables
+            for name, definition in phases['constraints'].get(table, [])
+        ])
+    print("Сбор статистики (ANALYZE)...")
+    _run_phase(conn, phases, 'analyze', [f"ANALYZE {table}" for table in tables])
+    if phases['phased']:
+        print("Перевод таблиц в LOGGED...")
+        _run_phase(conn, phases, 'set_logged', [f"ALTER TABLE {table} SET LOGGED" for table in tables])
+
+    report_phases(timings, phases['phased'])
+    return timings
+
+def report_phases(timings, phased=True):
+    """Вывод времени фаз и общего времени до готовой схемы"""
+    mode = 'по фазам (UNLOGGED)' if phased else 'прямая'
+    print(f"Время фаз загрузки, режим: {mode}")
+    for phase, description in PHASES:
+        if phase in timings:
+            print(f"  {phase:<12} {timings[phase]:>9.2f} с  - {description}")
+    print(f"  {'total':<12} {sum(timings.values()):>9.2f} с  - до готовой к тестам схемы")
@@ -0,0 +1,444 @@
+"""
+Хранилище результатов замеров (SQLite) и поиск регрессий
+
+Каждый результат, записанный через benchmark.write_output (benchmark.py,
+workload.py, throughput.py, index_build.py, ingest.py), дополнительно
+сохраняется как запуск в базу SQLite BENCHMARK_CONFIG['results_store']
+(None - не сохранять). Вместе с результатом записываются условия замера:
+версия PostgreSQL, параметры сервера (измененные относительно значений по
+умолчанию и основные параметры планировщика и памяти), scale_factor и seed
+генерации, определения и размеры индексов, размеры таблиц и сведения о
+машине.
+
+Из результата извлекаются измерения - значения метрик по ключам (запрос,
+шаблон, конфигурация индексов, индекс). Вид метрики задает, что считается
+ухудшением:
+    latency    - время, больше - хуже;
+    size       - размер или число буферов, больше - хуже;
+    throughput - пропускная способность, больше - лучше.
+
+Команда compare сравнивает запуск с базовым по общим ключам. Ухудшение
+больше BENCHMARK_CONFIG['regression_threshold'] считается регрессией, если
+для метрики есть отдельные замеры (execution_ms из benchmark.py) и
+различие значимо по критерию Манна-Уитни (p < regression_alpha), либо если
+у метрики одно значение (размеры, перцентили нагрузки). Так после
+обновления PostgreSQL или изменения postgresql.conf достаточно повторить
+замеры и сравнить новые запуски с сохраненными.
+
+Пример:
+    python shared/results_store.py list
+    python shared/results_store.py compare 12            # с последним запуском того же названия
+    python shared/results_store.py compare 12 31 --threshold 0.2
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import sqlite3
+import sys
+from datetime import datetime
+
+from database_config import BENCHMARK_CONFIG, GENERATION_CONFIG
+from utils import get_db_connection
+
+# Направление метрик: True - больше значит хуже
+WORSE_IF_HIGHER = {'latency': True, 'size': True, 'throughput': False}
+# Параметры сервера, которые записываются всегда (даже со значением по умолчанию)
+KEY_SETTINGS = [
+    'shared_buffers', 'work_mem', 'maintenance_work_mem', 'effective_cache_size', 'random_page_cost',
+    'seq_page_cost', 'effective_io_concurrency', 'max_parallel_workers_per_gather',
+    'max_parallel_maintenance_workers', 'jit', 'default_statistics_target', 'huge_pages'
+]
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    recorded TEXT NOT NULL,
+    started TEXT,
+    pg_version TEXT,
+    settings TEXT,
+    scale_factor REAL,
+    seed INTEGER,
+    indexes TEXT,
+    tables TEXT,
+    host TEXT,
+    result TEXT
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    value REAL,
+    samples TEXT,
+    PRIMARY KEY (run_id, key, metric)
+);
+"""
+
+def open_store(path=None):
+    """Соединение с хранилищем (создается при первом обращении)"""
+    path = path or BENCHMARK_CONFIG['results_store']
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    store = sqlite3.connect(path)
+    store.row_factory = sqlite3.Row
+    store.executescript(STORE_SCHEMA)
+    return store
+
+def server_info(conn):
+    """Версия сервера, параметры, индексы и таблицы пользовательских схем"""
+    with conn.cursor() as cursor:
+        cursor.execute("SHOW server_version")
+        version = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT name, current_setting(name)
+            FROM pg_settings
+            WHERE source NOT IN ('default', 'override') OR name = ANY(%s)
+            ORDER BY name
+        """, (KEY_SETTINGS,))
+        settings = dict(cursor.fetchall())
+        cursor.execute("""
+            SELECT schemaname || '.' || indexname, indexdef,
+                   pg_relation_size(format('%I.%I', schemaname, indexname)::regclass)
+            FROM pg_indexes
+            WHERE schemaname NOT IN ('pg_catalog', 'information_schema')
+            ORDER BY 1
+        """)
+        indexes = {name: {'definition': definition, 'size': size} for name, definition, size in cursor.fetchall()}
+        cursor.execute("""
+            SELECT n.nspname || '.' || c.relname, pg_relation_size(c.oid), c.reltuples::bigint
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relkind = 'r' AND n.nspname NOT IN ('pg_catalog', 'information_schema', 'pg_toast')
+            ORDER BY 1
+        """)
+        tables = {name: {'size': size, 'rows': rows} for name, size, rows in cursor.fetchall()}
+    conn.rollback()
+    return version, settings, indexes, tables
+
+def host_info():
+    """Сведения о машине, на которой запускались замеры"""
+    info = {
+        'node': platform.node(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count()
+    }
+    if hasattr(os, 'sysconf') and 'SC_PHYS_PAGES' in os.sysconf_names:
+        info['memory_bytes'] = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    return info
+
+def _benchmark_measurements(result):
+    stem = os.path.splitext(os.path.basename(result['file']))[0]
+    for query in result['queries']:
+        if not query['stats']:
+            continue
+        key = f"{result['study']}/{stem}/{query['id']}/{result.get('cache_mode', 'none')}"
+        samples = [sample['execution_ms'] for sample in query['samples']]
+        yield key, 'execution_ms', 'latency', query['stats']['execution_ms']['median'], samples
+        buffers = [sample['shared_hit'] + sample['shared_read'] for sample in query['samples']]
+        yield key, 'buffers', 'size', sorted(buffers)[len(buffers) // 2], None
+
+def _workload_measurements(result):
+    for query in result['queries']:
+        for metric in ('p50_ms', 'p99_ms'):
+            yield f"{result['study']}/{query['id']}", metric, 'latency', query[metric], None
+
+def _throughput_measurements(result):
+    for configuration in result['configurations']:
+        key = f"{result['target']}/{configuration['method']}"
+        if configuration['index_size'] is not None:
+            yield key, 'index_size', 'size', configuration['index_size'], None
+        for row in configuration['results']:
+            yield f"{key}/{row['clients']}", 'qps', 'throughput', row['qps'], None
+            yield f"{key}/{row['clients']}", 'p99_ms', 'latency', row['p99_ms'], None
+
+def _build_measurements(result):
+    for row in result['builds']:
+        if row['error']:
+            continue
+        mode = 'concurrently' if row['concurrently'] else 'plain'
+        key = f"{row['study']}/{row['index']}/{row['work_mem']}/{row['workers']}/{mode}"
+        yield key, 'seconds', 'latency', row['seconds'], None
+        yield key, 'size', 'size', row['size'], None
+
+def _ingest_measurements(result):
+    for row in result['ingest']:
+        key = f"{row['study']}/{row['table']}/{row['configuration']}"
+        yield key, 'rows_per_second', 'throughput', row['rows_per_second'], None
+        yield key, 'wal_bytes', 'size', row['wal_bytes'], None
+        yield key, 'index_size', 'size', row['index_size'], None
+
+def _selectivity_measurements(result):
+    for row in result['sweep']:
+        key = f"{row['study']}/{row['table']}.{row['column']}/{row['condition']}/{row['mode']}"
+        yield key, 'median_ms', 'latency', row['median_ms'], None
+        yield key, 'buffers', 'size', row['buffers'], None
+
+def _brin_order_measurements(result):
+    for row in result['brin_order']:
+        key = f"{row['table']}/{row['order']}/{row['window_hours']:g}"
+        yield key, 'heap_blocks', 'size', row['heap_blocks'], None
+        yield key, 'amplification', 'size', row['amplification'], None
+        yield key, 'execution_ms', 'latency', row['execution_ms'], None
+
+def _brin_tuning_measurements(result):
+    for row in result['variants']:
+        if row['error']:
+            continue
+        key = f"{row['table']}.{row['column']}/{row['opclass']}/{row['values_per_range']}/{row['pages_per_range']}"
+        yield key, 'build_seconds', 'latency', row['build_seconds'], None
+        yield key, 'index_size', 'size', row['index_size'], None
+        yield key, 'total_ms', 'latency', row['total_ms'], None
+
+def _brin_stream_measurements(result):
+    for row in result['stream']:
+        key = f"{row['table']}/{row['mode']}/{result['rate']}"
+        yield key, 'p50_ms', 'latency', row['p50_ms'], [sample['execution_ms'] for sample in row['timeline']]
+        yield key, 'unsummarized_blocks', 'size', row['unsummarized_blocks'], None
+        yield key, 'summarize_seconds', 'latency', row['summarize_seconds'], None
+
+def _gin_pending_measurements(result):
+    for row in result['pending']:
+        key = f"{row['table']}/{row['configuration']}/{result['batch']}"
+        yield key, 'rows_per_second', 'throughput', row['rows_per_second'], None
+        yield key, 'insert_p99_ms', 'latency', row['insert_p99_ms'], None
+        yield key, 'search_ms_during', 'latency', row['search_ms_during'], None
+        yield key, 'clean_seconds', 'latency', row['clean_seconds'], None
+
+def _jsonb_opclass_measurements(result):
+    for row in result['opclasses']:
+        if row['error']:
+            continue
+        yield f"{row['target']}/{row['variant']}", 'size', 'size', row['size'], None
+        for shape in row['shapes']:
+            key = f"{row['target']}/{row['variant']}/{shape['path']}/{shape['shape']}"
+            yield key, 'execution_ms', 'latency', shape['execution_ms'], None
+
+def _scaling_measurements(result):
+    for factor in result['measurements']:
+        prefix = f"{result['study']}/{factor['factor']:g}"
+        yield prefix, 'load_seconds', 'latency', factor['load_seconds'], None
+        for row in factor['indexes']:
+            if row['error']:
+                continue
+            yield f"{prefix}/{row['index']}", 'build_seconds', 'latency', row['build_seconds'], None
+            yield f"{prefix}/{row['index']}", 'size', 'size', row['size'], None
+        for row in factor['queries']:
+            yield f"{prefix}/{row['query']}", 'execution_ms', 'latency', row['execution_ms'], None
+            yield f"{prefix}/{row['query']}", 'buffers', 'size', row['buffers'], None
+
+def measurements(result):
+    """Измерения результата: (ключ, метрика, вид, значение, отдельные замеры или None)"""
+    if 'file' in result and 'queries' in result:
+        extractor = _benchmark_measurements
+    elif 'queries' in result:
+        extractor = _workload_measurements
+    elif 'configurations' in result:
+        extractor = _throughput_measurements
+    elif 'builds' in result:
+        extractor = _build_measurements
+    elif 'ingest' in result:
+        extractor = _ingest_measurements
+    elif 'sweep' in result:
+        extractor = _selectivity_measurements
+    elif 'brin_order' in result:
+        extractor = _brin_order_measurements
+    elif 'variants' in result:
+        extractor = _brin_tuning_measurements
+    elif 'stream' in result:
+        extractor = _brin_stream_measurements
+    elif 'pending' in result:
+        extractor = _gin_pending_measurements
+    elif 'opclasses' in result:
+        extractor = _jsonb_opclass_measurements
+    elif 'measurements' in result and 'fits' in result:
+        extractor = _scaling_measurements
+    else:
+        return []
+    return [row for row in extractor(result) if row[3] is not None]
+
+def record_run(name, result, store_path=None):
+    """Сохранение результата с условиями замера; возвращает номер запуска"""
+    conn = get_db_connection()
+    try:
+        version, settings, indexes, tables = server_info(conn)
+    finally:
+        conn.close()
+    rows = measurements(result)
+    rows += [(f"index/{index}", 'size', 'size', info['size'], None) for index, info in indexes.items()]
+    rows += [(f"table/{table}", 'size', 'size', info['size'], None) for table, info in tables.items()]
+    store = open_store(store_path)
+    try:
+        with store:
+            cursor = store.execute("""
+                INSERT INTO runs (name, recorded, started, pg_version, settings, scale_factor, seed,
+                                  indexes, tables, host, result)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (name, datetime.now().isoformat(timespec='seconds'), result.get('started'), version,
+                  json.dumps(settings), GENERATION_CONFIG.get('scale_factor', 1), GENERATION_CONFIG['seed'],
+                  json.dumps(indexes), json.dumps(tables), json.dumps(host_info()),
+                  json.dumps(result, ensure_ascii=False, default=str)))
+            run_id = cursor.lastrowid
+            store.executemany("INSERT OR REPLACE INTO measurements VALUES (?, ?, ?, ?, ?, ?)", [
+                (run_id, key, metric, kind, float(value), json.dumps(samples) if samples else None)
+                for key, metric, kind, value, samples in rows
+            ])
+        return run_id
+    finally:
+        store.close()
+
+def mann_whitney(before, after):
+    """Двусторонний p критерия Манна-Уитни (нормальное приближение с поправкой на связки)"""
+    values = sorted([(value, 0) for value in before] + [(value, 1) for value in after])
+    total = len(values)
+    ranks = [0.0] * total
+    ties = 0.0
+    i = 0
+    while i < total:
+        j = i
+        while j + 1 < total and values[j + 1][0] == values[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        count = j - i + 1
+        ties += count ** 3 - count
+        i = j + 1
+    n1, n2 = len(before), len(after)
+    u = sum(rank for rank, (_, group) in zip(ranks, values) if group == 0) - n1 * (n1 + 1) / 2
+    variance = n1 * n2 / 12 * ((total + 1) - ties / (total * (total - 1)))
+    if variance <= 0:
+        return 1.0
+    deviation = abs(u - n1 * n2 / 2) - 0.5
+    z = max(deviation, 0) / math.sqrt(variance)
+    return math.erfc(z / math.sqrt(2))
+
+def find_run(store, run_id=None, name=None, exclude=None):
+    """Запуск по номеру, иначе последний запуск с названием name, кроме запуска exclude"""
+    if run_id is not None:
+        row = store.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+    else:
+        row = store.execute("SELECT * FROM runs WHERE name = ? AND id != ? ORDER BY id DESC LIMIT 1",
+                            (name, -1 if exclude is None else exclude)).fetchone()
+    if row is None:
+        raise ValueError(f"Запуск {run_id if run_id is not None else name} не найден в хранилище")
+    return row
+
+def _load_measurements(store, run_id):
+    rows = store.execute("SELECT key, metric, kind, value, samples FROM measurements WHERE run_id = ?", (run_id,))
+    return {(row['key'], row['metric']): row for row in rows}
+
+def compare_runs(store, baseline_id, candidate_id, threshold=None, alpha=None):
+    """Сравнение запуска с базовым по общим измерениям; возвращает строки сравнения"""
+    threshold = BENCHMARK_CONFIG['regression_threshold'] if threshold is None else threshold
+    alpha = BENCHMARK_CONFIG['regression_alpha'] if alpha is None else alpha
+    baseline = _load_measurements(store, baseline_id)
+    candidate = _load_measurements(store, candidate_id)
+    rows = []
+    for key in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[key], candidate[key]
+        if not before['value']:
+            continue
+        change = (after['value'] - before['value']) / before['value']
+        worse = change if WORSE_IF_HIGHER[before['kind']] else -change
+        p_value = None
+        if before['samples'] and after['samples']:
+            before_samples, after_samples = json.loads(before['samples']), json.loads(after['samples'])
+            if len(before_samples) > 1 and len(after_samples) > 1:
+                p_value = mann_whitney(before_samples, after_samples)
+        significant = p_value is None or p_value < alpha
+        rows.append({
+            'key': key[0],
+            'metric': key[1],
+            'kind': before['kind'],
+            'baseline': before['value'],
+            'candidate': after['value'],
+            'change': change,
+            'p_value': p_value,
+            'status': ('regression' if worse > threshold and significant else
+                       'improvement' if worse < -threshold and significant else 'same')
+        })
+    return rows
+
+def settings_diff(baseline, candidate):
+    """Различия условий замера двух запусков: параметр -> (база, запуск)"""
+    diff = {}
+    for field in ('pg_version', 'scale_factor', 'seed'):
+        if baseline[field] != candidate[field]:
+            diff[field] = (baseline[field], candidate[field])
+    before, after = json.loads(baseline['settings'] or '{}'), json.loads(candidate['settings'] or '{}')
+    for name in sorted(before.keys() | after.keys()):
+        if before.get(name) != after.get(name):
+            diff[name] = (before.get(name), after.get(name))
+    return diff
+
+def print_comparison(baseline, candidate, rows, diff):
+    """Вывод регрессий и улучшений"""
+    print(f"База: запуск {baseline['id']} {baseline['name']} ({baseline['recorded']}, PostgreSQL {baseline['pg_version']})")
+    print(f"Запуск: {candidate['id']} {candidate['name']} ({candidate['recorded']}, PostgreSQL {candidate['pg_version']})")
+    if diff:
+        print("Различия условий:")
+        for name, (before, after) in diff.items():
+            print(f"  {name}: {before} -> {after}")
+    for status, title in (('regression', 'Регрессии'), ('improvement', 'Улучшения')):
+        selected = [row for row in rows if row['status'] == status]
+        print(f"{title}: {len(selected)}")
+        for row in sorted(selected, key=lambda row: -abs(row['change'])):
+            p_value = f", p = {row['p_value']:.3f}" if row['p_value'] is not None else ''
+            print(f"  {row['key']} {row['metric']}: {row['baseline']:,.3f} -> {row['candidate']:,.3f} "
+                  f"({row['change'] * 100:+.1f}%{p_value})")
+    print(f"Без изменений: {sum(1 for row in rows if row['status'] == 'same')} из {len(rows)} измерений")
+
+def print_runs(store, name=None, limit=50):
+    """Список сохраненных запусков"""
+    query = "SELECT id, name, recorded, pg_version, scale_factor FROM runs"
+    params = ()
+    if name:
+        query += " WHERE name = ?"
+        params = (name,)
+    for row in store.execute(query + " ORDER BY id DESC LIMIT ?", params + (limit,)):
+        print(f"{row['id']:>5}  {row['recorded']}  PostgreSQL {row['pg_version']:<8} SF {row['scale_factor']:<6g} "
+              f"{row['name']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Хранилище результатов замеров и поиск регрессий")
+    parser.add_argument('--store', default=BENCHMARK_CONFIG['results_store'], help="файл SQLite")
+    commands = parser.add_subparsers(dest='command', required=True)
+    list_parser = commands.add_parser('list', help="сохраненные запуски")
+    list_parser.add_argument('--name', help="только запуски с этим названием")
+    list_parser.add_argument('--limit', type=int, default=50, help="сколько последних запусков вывести")
+    compare_parser = commands.add_parser('compare', help="сравнение запуска с базовым")
+    compare_parser.add_argument('baseline', type=int, help="номер базового запуска")
+    compare_parser.add_argument('candidate', type=int, nargs='?',
+                                help="номер запуска (по умолчанию последний с тем же названием)")
+    compare_parser.add_argument('--threshold', type=float, default=BENCHMARK_CONFIG['regression_threshold'],
+                                help="относительное ухудшение, начиная с которого это регрессия")
+    compare_parser.add_argument('--alpha', type=float, default=BENCHMARK_CONFIG['regression_alpha'],
+                                help="уровень значимости критерия Манна-Уитни")
+    options = parser.parse_args()
+
+    if not options.store:
+        print("Ошибка: хранилище не задано (BENCHMARK_CONFIG['results_store'] или --store)")
+        sys.exit(1)
+    store = open_store(options.store)
+    try:
+        if options.command == 'list':
+            print_runs(store, options.name, options.limit)
+        else:
+            baseline = find_run(store, options.baseline)
+            candidate = (find_run(store, options.candidate) if options.candidate is not None
+                         else find_run(store, name=baseline['name'], exclude=baseline['id']))
+            rows = compare_runs(store, baseline['id'], candidate['id'], options.threshold, options.alpha)
+            print_comparison(baseline, candidate, rows, settings_diff(baseline, candidate))
+            if any(row['status'] == 'regression' for row in rows):
+                sys.exit(2)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Рост стоимости индексов с объемом данных
+
+Схема исследования пересоздается (01_create_tables.sql) и заново
+заполняется 02_generate_data.py для каждого масштаба из
+BENCHMARK_CONFIG['scaling_factors'] (GENERATION_CONFIG['scale_factor'],
+геометрический ряд; при масштабе 1 таблицы исследований содержат от 10 тыс.
+до 500 тыс. строк, ряд до 30 дает 10+ млн строк). На каждом масштабе:
+    - индексы из 04_create_indexes.sql строятся обычным CREATE INDEX с
+      замером времени и размера, для B-tree записывается число уровней;
+    - выполняется 05_queries_after_indexes.sql (shared/benchmark.py) и, с
+      --workload, шаблоны shared/workload.py.
+
+По точкам всех масштабов подбирается степенная зависимость y = a * n^b
+(метод наименьших квадратов в логарифмах) для размера и времени построения
+каждого индекса от числа строк таблицы и для времени и буферов каждого
+запроса от числа строк самой большой таблицы плана. Показатель b задает
+характер роста (около 0 - постоянный или логарифмический, около 1 -
+линейный), а 2^b - во сколько раз вырастет величина при удвоении таблицы.
+Для методов выводится средний показатель по их индексам, для B-tree -
+объемы данных, при которых дерево получает новый уровень.
+
+Число уровней B-tree берется из bt_metap (расширение pageinspect), а без
+него - из метастраницы файла индекса (pg_read_binary_file после
+CHECKPOINT, нужны права суперпользователя).
+
+Замер пересоздает схему исследования: после него в ней остаются данные
+последнего масштаба ряда.
+
+Пример:
+    python shared/scaling.py 1_B-tree --factors 0.1 0.3 1 3
+    python shared/scaling.py 6_BRIN 5_GIN --workload
+"""
+
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from database_config import BENCHMARK_CONFIG, GENERATION_CONFIG
+from utils import execute_sql_file, get_db_connection
+from benchmark import QUERY_FILES, reconnect, run_benchmark, write_output
+from cache_modes import ensure_extension
+from compare import INDEX_FILE, ROOT, SCHEMAS, STUDIES
+from index_build import parse_index_file
+from ingest import study_module
+from workload import run_workload
+
+SCHEMA_FILE = '01_create_tables.sql'
+# Смещение btm_magic и btm_level в метастранице B-tree (после PageHeaderData)
+BTREE_META_MAGIC = 0x053162
+BTREE_META_OFFSET = 24
+# Границы показателя степени для описания характера роста
+GROWTH_CLASSES = [(0.2, 'постоянный/логарифмический'), (0.8, 'сублинейный'),
+                  (1.2, 'линейный'), (math.inf, 'сверхлинейный')]
+
+def load_study(conn, study, factor):
+    """Пересоздание и заполнение схемы исследования при заданном масштабе"""
+    previous = GENERATION_CONFIG['scale_factor']
+    GENERATION_CONFIG['scale_factor'] = factor
+    try:
+        execute_sql_file(os.path.join(ROOT, study, SCHEMA_FILE), conn)
+        start_time = time.time()
+        study_module(study).main()
+        return time.time() - start_time
+    finally:
+        GENERATION_CONFIG['scale_factor'] = previous
+
+def table_rows(cursor):
+    """Число строк таблиц текущей схемы (по статистике после ANALYZE)"""
+    cursor.execute("""
+        SELECT c.relname, GREATEST(c.reltuples, 0)::bigint
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema() AND c.relkind = 'r'
+    """)
+    return dict(cursor.fetchall())
+
+def btree_levels(cursor, index):
+    """Число уровней B-tree (1 - корень является листом) или None"""
+    cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pageinspect'")
+    if cursor.fetchone():
+        cursor.execute("SELECT level FROM bt_metap(%s)", (index,))
+        return cursor.fetchone()[0] + 1
+    try:
+        cursor.execute("SELECT pg_read_binary_file(pg_relation_filepath(%s::regclass), %s, 16)",
+                       (index, BTREE_META_OFFSET))
+        meta = bytes(cursor.fetchone()[0])
+    except Exception:
+        return None
+    if int.from_bytes(meta[0:4], sys.byteorder) != BTREE_META_MAGIC:
+        return None
+    return int.from_bytes(meta[12:16], sys.byteorder) + 1
+
+def build_indexes(cursor, study):
+    """Построение индексов исследования: строки с временем, размером и уровнями"""
+    setup, indexes = parse_index_file(os.path.join(ROOT, study, INDEX_FILE))
+    for statement in setup:
+        cursor.execute(statement)
+    built = []
+    for index in indexes:
+        row = {'index': index['name'], 'table': index['table'], 'method': index['method'],
+               'build_seconds': None, 'size': None, 'levels': None, 'error': None}
+        start_time = time.time()
+        try:
+            cursor.execute(index['sql'])
+            row['build_seconds'] = time.time() - start_time
+            cursor.execute("SELECT pg_relation_size(%s::regclass)", (index['name'],))
+            row['size'] = cursor.fetchone()[0]
+        except Exception as e:
+            row['error'] = str(e).strip().splitlines()[0]
+            print(f"Индекс {index['name']} не построен: {row['error']}")
+        built.append(row)
+    cursor.execute("ANALYZE")
+    btrees = [row for row in built if row['method'] == 'btree' and not row['error']]
+    if btrees:
+        ensure_extension(cursor, 'pageinspect')
+        try:
+            # Метастраница читается из файла, поэтому она должна быть записана на диск
+            cursor.execute("CHECKPOINT")
+        except Exception:
+            pass
+        for row in btrees:
+            row['levels'] = btree_levels(cursor, row['index'])
+    return built
+
+def measure_factor(conn, study, factor, runs, warmups, workload):
+    """Загрузка, построение индексов и запросы на одном масштабе
+
+    Возвращает соединение (после перезапуска кластера в режиме cold - новое) и замеры.
+    """
+    print(f"=== {study}: масштаб {factor:g} ===")
+    load_seconds = load_study(conn, study, factor)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(f"SET search_path TO {SCHEMAS[study]}")
+        rows = table_rows(cursor)
+        if not any(rows.values()):
+            raise RuntimeError(f"{study}: таблицы пусты после загрузки при масштабе {factor:g}")
+        indexes = build_indexes(cursor, study)
+    for row in indexes:
+        row.update({'factor': factor, 'rows': rows.get(row['table'], 0)})
+        levels = f", уровней {row['levels']}" if row['levels'] else ''
+        if not row['error']:
+            print(f"  {row['index']:<45} {row['rows']:>11,} строк {row['build_seconds']:>8.2f} с "
+                  f"{row['size'] / 1024 / 1024:>9.1f} МБ{levels}")
+
+    queries = []
+    result = run_benchmark(conn, os.path.join(ROOT, study, QUERY_FILES[1]), runs, warmups)
+    conn = reconnect(conn, result)
+    conn.autocommit = True
+    for query in result['queries']:
+        if not query['stats']:
+            print(f"  запрос {query['id']} пропущен: {query['error']}")
+            continue
+        queries.append({
+            'factor': factor,
+            'query': query['id'],
+            'title': query['title'],
+            'rows': max((rows.get(relation, 0) for relation in query['relations']), default=0),
+            'execution_ms': query['stats']['execution_ms']['median'],
+            'buffers': query['stats']['shared_hit']['median'] + query['stats']['shared_read']['median'],
+            'node_type': query['node_type'],
+            'indexes': ' '.join(query['indexes'])
+        })
+    if workload:
+        largest = max(rows.values())
+        for template in run_workload(conn, study)['queries']:
+            queries.append({
+                'factor': factor,
+                'query': f"workload:{template['id']}",
+                'title': template['title'],
+                'rows': largest,
+                'execution_ms': template['p50_ms'],
+                'buffers': None,
+                'node_type': None,
+                'indexes': ''
+            })
+    return conn, {'factor': factor, 'load_seconds': load_seconds, 'tables': rows,
+                  'indexes': indexes, 'queries': queries}
+
+def fit_power(points):
+    """Степенная зависимость y = a * n^b по точкам (n, y); None, если точек меньше двух"""
+    points = [(math.log(n), math.log(y)) for n, y in points if n and y and n > 0 and y > 0]
+    if len({x for x, _ in points}) < 2:
+        return None
+    mean_x = statistics.mean(x for x, _ in points)
+    mean_y = statistics.mean(y for _, y in points)
+    sxx = sum((x - mean_x) ** 2 for x, _ in points)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    exponent = sxy / sxx
+    intercept = mean_y - exponent * mean_x
+    total = sum((y - mean_y) ** 2 for _, y in points)
+    residual = sum((y - intercept - exponent * x) ** 2 for x, y in points)
+    return {
+        'exponent': exponent,
+        'coefficient': math.exp(intercept),
+        'r2': 1 - residual / total if total else 1.0,
+        'doubling': 2 ** exponent,
+        'growth': next(label for limit, label in GROWTH_CLASSES if exponent < limit),
+        'points': len(points)
+    }
+
+def level_steps(rows):
+    """Переходы B-tree на новый уровень: (строк до, строк после, уровней после)"""
+    points = sorted((row['rows'], row['levels']) for row in rows if row['levels'])
+    return [(before[0], after[0], after[1]) for before, after in zip(points, points[1:]) if after[1] > before[1]]
+
+def fit_study(study, factors):
+    """Подбор кривых роста по результатам всех масштабов"""
+    fits = []
+
+    def add(kind, name, method, metric, points):
+        fit = fit_power(points)
+        if fit:
+            fits.append({'study': study, 'object': kind, 'name': name, 'method': method, 'metric': metric, **fit})
+
+    index_rows = [row for factor in factors for row in factor['indexes'] if not row['error']]
+    for name in sorted({row['index'] for row in index_rows}):
+        rows = [row for row in index_rows if row['index'] == name]
+        for metric in ('size', 'build_seconds'):
+            add('index', name, rows[0]['method'], metric, [(row['rows'], row[metric]) for row in rows])
+    query_rows = [row for factor in factors for row in factor['queries']]
+    for query in dict.fromkeys(row['query'] for row in query_rows):
+        rows = [row for row in query_rows if row['query'] == query]
+        for metric in ('execution_ms', 'buffers'):
+            add('query', query, None, metric, [(row['rows'], row[metric]) for row in rows])
+
+    methods = {}
+    for method in sorted({row['method'] for row in index_rows}):
+        summary = {}
+        for metric in ('size', 'build_seconds'):
+            exponents = [fit['exponent'] for fit in fits
+                         if fit['object'] == 'index' and fit['method'] == method and fit['metric'] == metric]
+            summary[metric] = statistics.mean(exponents) if exponents else None
+        sizes = [row['size'] / row['rows'] for row in index_rows if row['method'] == method and row['rows']]
+        summary['bytes_per_row'] = statistics.median(sizes) if sizes else None
+        if method == 'btree':
+            summary['level_steps'] = {name: level_steps([row for row in index_rows if row['index'] == name])
+                                      for name in sorted({row['index'] for row in index_rows
+                                                          if row['method'] == 'btree'})}
+        methods[method] = summary
+    return fits, methods
+
+def print_fits(fits, methods):
+    """Вывод кривых роста"""
+    print(f"{'объект':<45} {'метрика':<14} {'b':>6} {'R^2':>6} {'x2 строк':>9}  рост")
+    for fit in fits:
+        print(f"{fit['name'][:45]:<45} {fit['metric']:<14} {fit['exponent']:>6.2f} {fit['r2']:>6.2f} "
+              f"{fit['doubling']:>8.2f}x  {fit['growth']}")
+    print("По методам (средний показатель b по индексам метода):")
+    for method, summary in methods.items():
+        size = f"{summary['size']:.2f}" if summary['size'] is not None else '-'
+        build = f"{summary['build_seconds']:.2f}" if summary['build_seconds'] is not None else '-'
+        per_row = f"{summary['bytes_per_row']:.1f}" if summary['bytes_per_row'] is not None else '-'
+        print(f"  {method:<7} размер b={size}, построение b={build}, байт на строку {per_row}")
+        for name, steps in summary.get('level_steps', {}).items():
+            for before, after, levels in steps:
+                print(f"    {name}: {levels} уровня(ей) между {before:,} и {after:,} строк")
+
+def scale_study(conn, study, factors, runs, warmups, workload):
+    """Ряд масштабов для исследования и кривые роста; возвращает соединение и результат"""
+    measured = []
+    for factor in sorted(factors):
+        conn, row = measure_factor(conn, study, factor, runs, warmups, workload)
+        measured.append(row)
+    fits, methods = fit_study(study, measured)
+    print(f"=== {study}: кривые роста ===")
+    print_fits(fits, methods)
+    return conn, {
+        'study': study,
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'factors': sorted(factors),
+        'measurements': measured,
+        'fits': fits,
+        'methods': methods
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Рост размера, времени построения и запросов с объемом данных")
+    parser.add_argument('studies', nargs='*', default=STUDIES, help="каталоги исследований")
+    parser.add_argument('--factors', nargs='+', type=float, default=BENCHMARK_CONFIG['scaling_factors'],
+                        help="масштабы данных (scale_factor)")
+    parser.add_argument('--runs', type=int, default=BENCHMARK_CONFIG['runs'], help="замеров каждого запроса")
+    parser.add_argument('--warmups', type=int, default=BENCHMARK_CONFIG['warmups'], help="прогревочных запусков")
+    parser.add_argument('--workload', action='store_true', help="также выполнять шаблоны shared/workload.py")
+    parser.add_argument('--output-dir', default=BENCHMARK_CONFIG['output_dir'], help="каталог результатов")
+    options = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        for study in options.studies:
+            study = os.path.basename(os.path.normpath(study))
+            conn, result = scale_study(conn, study, options.factors, options.runs, options.warmups, options.workload)
+            for output in write_output(f"scaling_{study}", result, result['fits'], options.output_dir):
+                print(f"Результаты: {output}")
+    except Exception as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
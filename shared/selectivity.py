@@ -0,0 +1,415 @@
+"""
+Перебор селективности: где индекс перестает быть быстрее последовательного чтения
+
+Для каждого столбца, проиндексированного 04_create_indexes.sql (индексы
+схемы, не обслуживающие PRIMARY KEY и UNIQUE), строятся условия с долей
+подходящих строк из BENCHMARK_CONFIG['selectivity_levels'] (от 0.001% до 50%):
+    range    - col <= граница, граница - квантиль столбца (B-tree, BRIN, SP-GiST
+               на числах, датах, строках и адресах);
+    equality - col = значение с подходящей частотой (Hash, Bloom);
+    contains - col @> ARRAY[элемент] с подходящей частотой элемента (GIN по массиву).
+Для равенства и вхождения нужная доля достижима, только если в данных есть
+значение с такой частотой, поэтому берется ближайшее, а в результат
+записывается фактическая селективность.
+
+Каждое условие выполняется как SELECT * FROM таблица WHERE условие в
+четырех режимах: planner - план, который выбирает планировщик, и seqscan,
+indexscan, bitmapscan - план, навязанный параметрами enable_*. Если
+навязать план не удалось (например, у GIN и BRIN нет обычного Index Scan),
+замер режима не учитывается. По медианам времени находится точка
+пересечения - селективность, начиная с которой последовательное чтение не
+медленнее лучшего индексного плана (с интерполяцией в логарифмическом
+масштабе), и она сравнивается с селективностью, с которой на Seq Scan
+переходит сам планировщик.
+
+Графики времени и буферов от селективности строятся, если установлен
+matplotlib; без него выводится только таблица.
+
+Пример:
+    python shared/selectivity.py 1_B-tree
+    python shared/selectivity.py 6_BRIN --columns financial_transactions.transaction_date
+"""
+
+import argparse
+import math
+import os
+import sys
+from datetime import datetime
+
+try:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+except ImportError:  # matplotlib необязателен: без него графики не строятся
+    plt = None
+
+from database_config import BENCHMARK_CONFIG
+from utils import get_db_connection
+from benchmark import benchmark_query, write_output
+from compare import SCHEMAS, STUDIES
+
+# Параметры, которыми навязывается тип плана
+PLAN_SETTINGS = {
+    'planner': {},
+    'seqscan': {'enable_indexscan': 'off', 'enable_indexonlyscan': 'off', 'enable_bitmapscan': 'off'},
+    'indexscan': {'enable_seqscan': 'off', 'enable_bitmapscan': 'off'},
+    'bitmapscan': {'enable_seqscan': 'off', 'enable_indexscan': 'off', 'enable_indexonlyscan': 'off'}
+}
+INDEX_MODES = ['indexscan', 'bitmapscan']
+# Узел чтения таблицы -> тип плана
+SCAN_MODES = {
+    'Seq Scan': 'seqscan',
+    'Index Scan': 'indexscan',
+    'Index Only Scan': 'indexscan',
+    'Bitmap Heap Scan': 'bitmapscan'
+}
+RANGE_METHODS = {'btree', 'brin', 'spgist'}
+EQUALITY_METHODS = {'hash', 'bloom'}
+# Методы, для которых условие может использовать не только первый столбец индекса
+ANY_COLUMN_METHODS = {'brin', 'bloom', 'gin'}
+# Категории типов pg_type.typcategory, для которых строятся условия-диапазоны
+RANGE_CATEGORIES = {'N', 'D', 'S', 'I'}
+
+def indexed_columns(conn, schema):
+    """Столбцы индексов исследования: список словарей table, column, type, kind, indexes"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT t.relname, a.attname, format_type(a.atttypid, a.atttypmod), ty.typcategory,
+                   am.amname, i.relname, k.position
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN pg_class t ON t.oid = x.indrelid
+            JOIN pg_am am ON am.oid = i.relam
+            CROSS JOIN LATERAL unnest(x.indkey::int2[]) WITH ORDINALITY k(attnum, position)
+            JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = k.attnum
+            JOIN pg_type ty ON ty.oid = a.atttypid
+            WHERE i.relnamespace = %s::regnamespace
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+            ORDER BY t.relname, a.attname, i.relname
+        """, (schema,))
+        rows = cursor.fetchall()
+    conn.commit()
+    columns = {}
+    for table, column, column_type, category, method, index, position in rows:
+        if position > 1 and method not in ANY_COLUMN_METHODS:
+            continue
+        if category == 'A' and method == 'gin':
+            kind = 'contains'
+        elif category in RANGE_CATEGORIES and method in RANGE_METHODS:
+            kind = 'range'
+        elif category not in ('A', 'U', 'G', 'R') and method in EQUALITY_METHODS:
+            kind = 'equality'
+        else:
+            continue
+        entry = columns.setdefault((table, column, kind), {
+            'table': table, 'column': column, 'type': column_type, 'kind': kind, 'indexes': []
+        })
+        entry['indexes'].append(index)
+    return list(columns.values())
+
+def _closest_by_frequency(frequencies, total, levels):
+    """Для каждой доли - значение с ближайшей (в логарифмическом масштабе) частотой"""
+    values = []
+    for level in levels:
+        target = max(level * total, 1)
+        count, value = min(frequencies, key=lambda item: abs(math.log(item[0] / target)))
+        if value not in values:
+            values.append(value)
+    return values
+
+def predicates(cursor, entry, levels):
+    """Условия для столбца: список SQL-условий, упорядоченных по селективности"""
+    table, column, kind = entry['table'], entry['column'], entry['kind']
+    cursor.execute(f"SELECT count(*) FROM {table}")
+    total = cursor.fetchone()[0]
+    if not total:
+        return []
+    if kind == 'range':
+        cursor.execute(f"""
+            SELECT percentile_disc(%s::float8[]) WITHIN GROUP (ORDER BY {column})::text[]
+            FROM {table}
+        """, (list(levels),))
+        bounds = []
+        for bound in cursor.fetchone()[0] or []:
+            if bound is not None and bound not in bounds:
+                bounds.append(bound)
+        return [cursor.mogrify(f"{column} <= %s::{entry['type']}", (bound,)).decode() for bound in bounds]
+    if kind == 'equality':
+        cursor.execute(f"""
+            SELECT c, min(value) FROM (SELECT {column}::text AS value, count(*) AS c
+                                       FROM {table} WHERE {column} IS NOT NULL GROUP BY {column}) f
+            GROUP BY c
+        """)
+        template = f"{column} = %s::{entry['type']}"
+    else:
+        cursor.execute(f"""
+            SELECT c, min(value) FROM (SELECT element::text AS value, count(*) AS c
+                                       FROM {table}, unnest({column}) element
+                                       WHERE element IS NOT NULL GROUP BY element) f
+            GROUP BY c
+        """)
+        template = f"{column} @> ARRAY[%s]::{entry['type']}"
+    frequencies = cursor.fetchall()
+    if not frequencies:
+        return []
+    return [cursor.mogrify(template, (value,)).decode()
+            for value in _closest_by_frequency(frequencies, total, levels)]
+
+def measure(cursor, sql, mode, runs, warmups):
+    """Замер запроса в режиме плана: время, буферы, фактический тип плана и индексы"""
+    for name, value in PLAN_SETTINGS[mode].items():
+        cursor.execute(f"SET {name} = {value}")
+    try:
+        result = benchmark_query(cursor, {'id': mode, 'title': mode, 'sql': sql}, runs, warmups)
+    finally:
+        for name in PLAN_SETTINGS[mode]:
+            cursor.execute(f"RESET {name}")
+    plan = next((SCAN_MODES[scan] for scan in result['scan_types'] if scan in SCAN_MODES), None)
+    hit, read = result['stats']['shared_hit'], result['stats']['shared_read']
+    return {
+        'plan': plan,
+        'indexes': ' '.join(result['indexes']),
+        'median_ms': result['stats']['execution_ms']['median'],
+        'buffers': (hit['median'] if hit else 0) + (read['median'] if read else 0)
+    }
+
+def _log_interpolate(previous, current):
+    """Селективность, при которой log(index_ms / seq_ms) проходит через ноль"""
+    (s1, ratio1), (s2, ratio2) = previous, current
+    if ratio1 == ratio2:
+        return s2
+    fraction = ratio1 / (ratio1 - ratio2)
+    return math.exp(math.log(s1) + (math.log(s2) - math.log(s1)) * fraction)
+
+def crossover(points):
+    """Точка пересечения по точкам (селективность, лучший индексный план, seqscan)
+
+    Возвращает (селективность или None, состояние): crossover - найдена,
+    index_always - индекс быстрее на всех долях, seq_always - индекс не быстрее
+    ни на одной, no_data - нет замеров обоих планов.
+    """
+    previous = None
+    for selectivity, index_ms, seq_ms in points:
+        if index_ms is None or seq_ms is None or selectivity <= 0:
+            continue
+        ratio = math.log(max(index_ms, 1e-6) / max(seq_ms, 1e-6))
+        if ratio >= 0:
+            if previous is None:
+                return None, 'seq_always'
+            return _log_interpolate(previous, (selectivity, ratio)), 'crossover'
+        previous = (selectivity, ratio)
+    return None, 'index_always' if previous else 'no_data'
+
+def planner_switch(points):
+    """Селективность, с которой планировщик выбирает Seq Scan (после индексного плана)"""
+    used_index = False
+    for selectivity, plan in points:
+        if plan == 'seqscan':
+            if used_index:
+                return selectivity
+        elif plan:
+            used_index = True
+    return None
+
+def sweep_column(cursor, study, entry, levels, runs, warmups):
+    """Замеры всех условий столбца во всех режимах; строки результата и итог"""
+    cursor.execute(f"SELECT count(*) FROM {entry['table']}")
+    total = cursor.fetchone()[0]
+    rows = []
+    for condition in predicates(cursor, entry, levels):
+        sql = f"SELECT * FROM {entry['table']} WHERE {condition}"
+        cursor.execute(f"SELECT count(*) FROM {entry['table']} WHERE {condition}")
+        matched = cursor.fetchone()[0]
+        for mode in PLAN_SETTINGS:
+            row = {
+                'study': study,
+                'table': entry['table'],
+                'column': entry['column'],
+                'kind': entry['kind'],
+                'condition': condition,
+                'rows': matched,
+                'selectivity': matched / total,
+                'mode': mode,
+                'error': None
+            }
+            try:
+                row.update(measure(cursor, sql, mode, runs, warmups))
+            except Exception as e:
+                row.update({'plan': None, 'indexes': '', 'median_ms': None, 'buffers': None})
+                row['error'] = str(e).strip().splitlines()[0]
+            rows.append(row)
+    return rows, summarize_column(entry, rows)
+
+def _by_selectivity(rows):
+    """Замеры столбца по условиям: [(селективность, {режим: строка}), ...] по возрастанию селективности
+
+    Условия с одинаковой селективностью остаются отдельными точками в порядке замера.
+    """
+    grouped = {}
+    for row in rows:
+        grouped.setdefault((row['selectivity'], row['condition']), {})[row['mode']] = row
+    return sorted(((selectivity, modes) for (selectivity, _), modes in grouped.items()), key=lambda item: item[0])
+
+def _forced_ms(modes, mode):
+    """Время навязанного плана, если он действительно был выбран"""
+    row = modes.get(mode)
+    return row['median_ms'] if row and row['plan'] == mode else None
+
+def summarize_column(entry, rows):
+    """Точка пересечения, переход планировщика и потери от его выбора"""
+    points = []
+    choices = []
+    worst = None
+    for selectivity, modes in _by_selectivity(rows):
+        index_times = [_forced_ms(modes, mode) for mode in INDEX_MODES]
+        index_times = [value for value in index_times if value is not None]
+        seq_ms = _forced_ms(modes, 'seqscan')
+        points.append((selectivity, min(index_times) if index_times else None, seq_ms))
+        planner = modes.get('planner')
+        choices.append((selectivity, planner['plan'] if planner else None))
+        best = min(index_times + ([seq_ms] if seq_ms is not None else []), default=None)
+        if planner and planner['median_ms'] is not None and best:
+            regret = planner['median_ms'] / best
+            if worst is None or regret > worst['regret']:
+                worst = {'selectivity': selectivity, 'plan': planner['plan'], 'regret': regret}
+    value, state = crossover(points)
+    return {
+        'table': entry['table'],
+        'column': entry['column'],
+        'kind': entry['kind'],
+        'indexes': entry['indexes'],
+        'crossover': value,
+        'state': state,
+        'planner_switch': planner_switch(choices),
+        'worst_planner_choice': worst
+    }
+
+def _percent(value):
+    return f"{value * 100:.4g}%" if value is not None else '-'
+
+def print_column(rows, summary):
+    """Таблица времени по селективности и итог столбца"""
+    print(f"--- {summary['table']}.{summary['column']} ({summary['kind']}; {', '.join(summary['indexes'])}) ---")
+    print(f"{'доля строк':>11} {'строк':>9} " + ' '.join(f"{mode:>11}" for mode in PLAN_SETTINGS) + "  план")
+    for selectivity, modes in _by_selectivity(rows):
+        matched = next(iter(modes.values()))['rows']
+        times = []
+        for mode in PLAN_SETTINGS:
+            value = modes[mode]['median_ms'] if mode == 'planner' else _forced_ms(modes, mode)
+            times.append(f"{value:>8.3f} мс" if value is not None else f"{'-':>11}")
+        planner = modes.get('planner', {}).get('plan') or '-'
+        print(f"{_percent(selectivity):>11} {matched:>9,} " + ' '.join(times) + f"  {planner}")
+    state = {
+        'crossover': f"индекс быстрее до {_percent(summary['crossover'])} строк",
+        'index_always': "индекс быстрее на всех долях",
+        'seq_always': "индекс не быстрее последовательного чтения ни на одной доле",
+        'no_data': "нет замеров индексного плана и Seq Scan"
+    }[summary['state']]
+    switch = (f"переходит на Seq Scan с {_percent(summary['planner_switch'])}" if summary['planner_switch']
+              else "не переходит с индексного плана на Seq Scan")
+    print(f"Пересечение: {state}; планировщик {switch}")
+    worst = summary['worst_planner_choice']
+    if worst and worst['regret'] > 1.1:
+        print(f"Худший выбор планировщика: {worst['plan']} при {_percent(worst['selectivity'])}, "
+              f"в {worst['regret']:.1f} раза медленнее лучшего плана")
+
+def plot_column(rows, summary, output_dir, study):
+    """График времени и буферов от селективности (PNG); возвращает путь или None"""
+    if plt is None:
+        return None
+    figure, (latency_axis, buffers_axis) = plt.subplots(1, 2, figsize=(12, 4.5))
+    grouped = _by_selectivity(rows)
+    for mode in PLAN_SETTINGS:
+        points = [(selectivity, modes[mode]) for selectivity, modes in grouped
+                  if mode in modes and modes[mode]['median_ms'] is not None
+                  and (mode == 'planner' or modes[mode]['plan'] == mode)]
+        if not points:
+            continue
+        style = {'linestyle': ':', 'marker': 'x'} if mode == 'planner' else {'marker': 'o'}
+        selectivities = [max(selectivity, 1e-7) * 100 for selectivity, _ in points]
+        latency_axis.plot(selectivities, [row['median_ms'] for _, row in points], label=mode, **style)
+        buffers_axis.plot(selectivities, [max(row['buffers'], 1) for _, row in points], label=mode, **style)
+    for axis, label in ((latency_axis, 'мс (медиана)'), (buffers_axis, 'буферов')):
+        axis.set_xscale('log')
+        axis.set_yscale('log')
+        axis.set_xlabel('доля строк, %')
+        axis.set_ylabel(label)
+        if summary['crossover']:
+            axis.axvline(summary['crossover'] * 100, color='gray', linestyle='--', label='пересечение')
+        if summary['planner_switch']:
+            axis.axvline(summary['planner_switch'] * 100, color='red', linestyle=':', label='переход планировщика')
+        axis.legend()
+    figure.suptitle(f"{study}: {summary['table']}.{summary['column']}")
+    figure.tight_layout()
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"selectivity_{study}_{summary['table']}_{summary['column']}_"
+                                    f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
+    figure.savefig(path)
+    plt.close(figure)
+    return path
+
+def sweep_study(conn, study, levels, runs, warmups, columns=None, output_dir=None):
+    """Перебор селективности для столбцов исследования"""
+    schema = SCHEMAS[study]
+    entries = indexed_columns(conn, schema)
+    if columns:
+        entries = [entry for entry in entries if f"{entry['table']}.{entry['column']}" in columns]
+    if not entries:
+        print(f"{study}: нет индексов исследования (выполните 04_create_indexes.sql)")
+    conn.autocommit = True
+    rows = []
+    summaries = []
+    with conn.cursor() as cursor:
+        cursor.execute(f"SET search_path TO {schema}")
+        if BENCHMARK_CONFIG.get('statement_timeout'):
+            cursor.execute(f"SET statement_timeout = '{BENCHMARK_CONFIG['statement_timeout']}'")
+        for entry in entries:
+            column_rows, summary = sweep_column(cursor, study, entry, levels, runs, warmups)
+            print_column(column_rows, summary)
+            chart = plot_column(column_rows, summary, output_dir or BENCHMARK_CONFIG['output_dir'], study)
+            if chart:
+                print(f"График: {chart}")
+            rows += column_rows
+            summaries.append(summary)
+    return {
+        'study': study,
+        'schema': schema,
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'runs': runs,
+        'levels': levels,
+        'columns': summaries,
+        'sweep': rows
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Селективность, при которой индекс перестает выигрывать у Seq Scan")
+    parser.add_argument('studies', nargs='*', default=STUDIES, help="каталоги исследований")
+    parser.add_argument('--columns', nargs='*', help="столбцы в виде таблица.столбец (по умолчанию все)")
+    parser.add_argument('--levels', nargs='+', type=float, default=BENCHMARK_CONFIG['selectivity_levels'],
+                        help="доли строк (0.00001 = 0.001%%)")
+    parser.add_argument('--runs', type=int, default=BENCHMARK_CONFIG['selectivity_runs'],
+                        help="замеров каждого условия в каждом режиме")
+    parser.add_argument('--warmups', type=int, default=BENCHMARK_CONFIG['warmups'],
+                        help="прогревочных запусков")
+    parser.add_argument('--output-dir', default=BENCHMARK_CONFIG['output_dir'], help="каталог результатов")
+    options = parser.parse_args()
+    if plt is None:
+        print("matplotlib не установлен: графики не строятся, выводится таблица")
+
+    conn = get_db_connection()
+    try:
+        for study in options.studies:
+            study = os.path.basename(os.path.normpath(study))
+            print(f"=== {study} ===")
+            result = sweep_study(conn, study, sorted(options.levels), options.runs, options.warmups,
+                                 options.columns, options.output_dir)
+            for output in write_output(f"selectivity_{study}", result, result['sweep'], options.output_dir):
+                print(f"Результаты: {output}")
+    except Exception as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Параллельная генерация данных по шардам
+
+Диапазон строк таблицы делится на шарды фиксированного размера
+(GENERATION_CONFIG['shard_size']). Каждый шард генерируется со своим seed,
+выведенным из общего seed, имени генератора и номера шарда, поэтому данные
+не зависят от числа процессов. В пуле шарды кодируются в формат COPY прямо
+в рабочих процессах и по порядку уходят в загрузчик.
+"""
+
+import hashlib
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from faker import Faker
+from database_config import GENERATION_CONFIG
+from dataset_cache import cached_blocks
+from utils import (bulk_load, bulk_load_blocks, bulk_load_blocks_parallel, current_search_path,
+                   encode_copy_rows, encode_row_blocks, pooled_connection, reference_now)
+
+def shard_seed(name, shard_index, base_seed=None):
+    """Детерминированный seed шарда"""
+    if base_seed is None:
+        base_seed = GENERATION_CONFIG['seed']
+    digest = hashlib.sha256(f"{base_seed}:{name}:{shard_index}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+def seed_generators(seed):
+    """Инициализация random и Faker seed-ом шарда"""
+    random.seed(seed)
+    Faker.seed(seed)
+
+def iter_shards(num_records, shard_size=None):
+    """Разбиение диапазона строк на шарды: (номер, первая строка, количество)"""
+    shard_size = shard_size or GENERATION_CONFIG['shard_size']
+    for index, start in enumerate(range(0, num_records, shard_size)):
+        yield index, start, min(shard_size, num_records - start)
+
+def _shard_rows(generator, args, index, start, count):
+    """Строки одного шарда"""
+    seed_generators(shard_seed(generator.__name__, index))
+    return generator(count, *args, start=start)
+
+def iter_sharded_rows(generator, num_records, args=(), shard_size=None):
+    """Последовательная генерация по шардам в текущем процессе (те же данные, что и в пуле)"""
+    for index, start, count in iter_shards(num_records, shard_size):
+        yield from _shard_rows(generator, args, index, start, count)
+
+def _init_worker(config):
+    """Инициализация рабочего процесса настройками родителя"""
+    GENERATION_CONFIG.update(config)
+
+def _generate_shard(task):
+    """Генерация и кодирование шарда в рабочем процессе"""
+    generator, args, index, start, count, copy_format = task
+    rows = list(_shard_rows(generator, args, index, start, count))
+    return len(rows), encode_copy_rows(rows, copy_format)
+
+def iter_sharded_blocks(generator, num_records, args=(), workers=None, copy_format=None,
+                        shard_size=None):
+    """Генерация шардов в пуле процессов, блоки COPY выдаются в порядке шардов
+
+    Вперед запускается не больше 2 * workers шардов, чтобы память не росла,
+    если загрузка медленнее генерации.
+    """
+    workers = workers or GENERATION_CONFIG['workers']
+    copy_format = copy_format or GENERATION_CONFIG.get('copy_format', 'text')
+    # Опорное время фиксируется до старта процессов и передается им вместе с настройками
+    reference_now()
+    config = dict(GENERATION_CONFIG)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(config,)) as pool:
+        pending = deque()
+        for index, start, count in iter_shards(num_records, shard_size):
+            task = (generator, args, index, start, count, copy_format)
+            pending.append(pool.submit(_generate_shard, task))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def load_generated(conn, table, columns, generator, num_records, args=(), sharded=True,
+                   vectorized=None, connections=None, isolated=False):
+    """Генерация и загрузка таблицы с учетом GENERATION_CONFIG['workers']
+
+    generator(num_records, *args, start=...) - ленивый генератор строк.
+    sharded=False - таблица генерируется одним шардом в текущем процессе
+    (для генераторов, которые обеспечивают уникальность значений множеством
+    внутри одного вызова).
+    vectorized - блочный генератор на NumPy (см. vectorized.py); используется
+    вместо generator, если GENERATION_CONFIG['backend'] == 'numpy' и NumPy установлен.
+    При загрузке через COPY набор берется из кэша (см. dataset_cache.py), если
+    он уже был сгенерирован с теми же параметрами.
+    connections > 1 (по умолчанию GENERATION_CONFIG['load_connections']) -
+    части таблицы загружаются параллельно по соединениям из общего пула.
+    isolated=True - построчная генерация только в рабочих процессах: нужно,
+    когда таблицы загружаются из нескольких потоков, так как random и Faker
+    общие для всех потоков процесса.
+    """
+    copy_load = GENERATION_CONFIG.get('load_method', 'copy') == 'copy'
+    if not copy_load:
+        shard_size = None if sharded else max(num_records, 1)
+        rows = iter_sharded_rows(generator, num_records, args, shard_size)
+        return bulk_load(conn, table, columns, rows)
+
+    copy_format = GENERATION_CONFIG.get('copy_format', 'text')
+    workers = GENERATION_CONFIG.get('workers', 1)
+    make_blocks = None
+    if vectorized is not None:
+        # Импорт здесь, а не в начале модуля: vectorized сам импортирует sharding
+        from vectorized import iter_vector_blocks, use_vectorized
+        if use_vectorized():
+            source, mode = vectorized, 'numpy'
+            def make_blocks():
+                return iter_vector_blocks(vectorized, num_records, args)
+    if make_blocks is None and not sharded:
+        source, mode = generator, 'single'
+        def make_blocks():
+            if isolated:
+                return iter_sharded_blocks(generator, num_records, args, 1,
+                                           shard_size=max(num_records, 1))
+            rows = iter_sharded_rows(generator, num_records, args, shard_size=max(num_records, 1))
+            return encode_row_blocks(rows, copy_format)
+    if make_blocks is None:
+        source, mode = generator, 'python'
+        def make_blocks():
+            if workers > 1 or isolated:
+                return iter_sharded_blocks(generator, num_records, args, workers)
+            return encode_row_blocks(iter_sharded_rows(generator, num_records, args), copy_format)
+
+    blocks = cached_blocks(source, num_records, args, mode, make_blocks)
+    connections = connections or GENERATION_CONFIG.get('load_connections', 1)
+    if connections > 1:
+        return bulk_load_blocks_parallel(table, columns, blocks, current_search_path(conn),
+                                         connections)
+    return bulk_load_blocks(conn, table, columns, blocks)
+
+def load_tables_parallel(conn, tables, connections=None):
+    """Загрузка нескольких независимых таблиц одновременно
+
+    tables - список словарей: 'title' (что загружается, для вывода после числа
+    строк, например 'пользователей'), необязательный 'ordered' (True - строки
+    должны лечь в таблицу в порядке генерации, таблица всегда загружается
+    одним соединением), необязательный 'computed' (столбцы, которые
+    02_generate_data.py заполняет после загрузки; здесь не используется) и
+    аргументы load_generated
+    (table, columns, generator, num_records, args, sharded, vectorized).
+    При одном соединении (GENERATION_CONFIG['load_connections'] == 1) таблицы
+    загружаются по очереди через conn. Иначе каждая таблица загружается в
+    своем потоке с тем же search_path, что и у conn; одновременно
+    загружается не больше connections таблиц. Если таблиц меньше, чем
+    соединений, свободные соединения делятся между таблицами (см.
+    connection_shares), и части таких таблиц загружаются параллельно.
+    Возвращает список статистик загрузки в порядке tables.
+    """
+    connections = connections or GENERATION_CONFIG.get('load_connections', 1)
+    if connections <= 1:
+        results = []
+        for task in tables:
+            task = dict(task)
+            task.pop('ordered', None)
+            task.pop('computed', None)
+            print(f"Генерация и загрузка {task['num_records']:,} {task.pop('title')}...")
+            results.append(load_generated(conn, connections=1, **task))
+        return results
+
+    search_path = current_search_path(conn)
+    # Опорное время фиксируется до старта потоков
+    reference_now()
+
+    def load_table(task, share):
+        task = dict(task)
+        task.pop('ordered', None)
+        task.pop('computed', None)
+        print(f"Генерация и загрузка {task['num_records']:,} {task.pop('title')}...")
+        if share > 1:
+            # Соединения берет из пула bulk_load_blocks_parallel; conn нужен только для search_path
+            return load_generated(conn, connections=share, isolated=True, **task)
+        with pooled_connection(search_path) as table_conn:
+            return load_generated(table_conn, connections=1, isolated=True, **task)
+
+    with ThreadPoolExecutor(max_workers=min(connections, len(tables)) or 1) as executor:
+        return list(executor.map(load_table, tables, connection_shares(tables, connections)))
+
+def connection_shares(tables, connections):
+    """Число соединений на каждую таблицу load_tables_parallel
+
+    Пока таблиц не меньше, чем соединений, у каждой таблицы одно соединение.
+    Иначе свободные соединения по одному отдаются таблице с наибольшим числом
+    строк на соединение; таблицы с 'ordered' остаются с одним соединением.
+    """
+    shares = [1] * len(tables)
+    candidates = [position for position, task in enumerate(tables) if not task.get('ordered')]
+    for _ in range(max(connections - len(tables), 0)):
+        if not candidates:
+            break
+        position = max(candidates, key=lambda position: tables[position]['num_records'] / shares[position])
+        shares[position] += 1
+    return shares
\ No newline at end of file
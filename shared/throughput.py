@@ -0,0 +1,291 @@
+"""
+Пропускная способность точечных запросов при параллельных клиентах
+
+M клиентов (процессы, у каждого свое соединение) в течение заданного времени
+выполняют подготовленный запрос SELECT * FROM table WHERE column = $1 со
+случайными ключами, заранее выбранными из таблицы. Для каждого числа
+клиентов из BENCHMARK_CONFIG['throughput_clients'] измеряются число запросов
+в секунду и задержки: p50, p99, p99.9, максимум и гистограмма по интервалам
+степеней двойки микросекунд. Первые throughput_warmup секунд в замер не
+входят.
+
+Конфигурации индексов задаются методами (hash, btree): для каждой из них
+индексы и ограничения PRIMARY KEY/UNIQUE, у которых column - первый столбец,
+временно удаляются (определения сохраняются), создается один индекс
+указанного метода, а после всех замеров исходные индексы и ограничения
+восстанавливаются. Метод current оставляет индексы как есть.
+
+Клиенты - отдельные процессы, чтобы GIL не ограничивал клиентскую сторону;
+все они начинают замер в общий момент времени после подключения. Клиенты
+работают на той же машине, что и генератор нагрузки, поэтому при числе
+клиентов больше числа ядер пределом может стать сама машина. Насыщение
+отмечается на числе клиентов, после которого пропускная способность растет
+меньше чем на 10%.
+
+Пример:
+    python shared/throughput.py                           # сессии и продукты 2_Hash
+    python shared/throughput.py hash.user_sessions.session_id --clients 1 4 16 --duration 5
+    python shared/throughput.py btree.users.email --methods current
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from database_config import BENCHMARK_CONFIG, GENERATION_CONFIG
+from utils import get_db_connection
+from benchmark import percentile, write_output
+
+TARGETS = ['hash.user_sessions.session_id', 'hash.products.product_code']
+METHODS = ['hash', 'btree']
+PERCENTILES = [('p50', 0.5), ('p99', 0.99), ('p999', 0.999)]
+# Прирост пропускной способности, ниже которого клиенты считаются насыщением
+SATURATION_GAIN = 1.1
+# Время на запуск процессов клиентов и подключение до общего старта (секунды)
+STARTUP_SECONDS = 1.0
+
+def parse_target(target):
+    """'schema.table.column' -> (schema, table, column)"""
+    parts = target.split('.')
+    if len(parts) != 3:
+        raise ValueError(f"Цель {target} должна иметь вид схема.таблица.столбец")
+    return tuple(parts)
+
+def sample_keys(conn, table, column, count):
+    """Случайные значения столбца для точечных запросов (повторяемые для seed)"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT setseed(%s)", ((GENERATION_CONFIG['seed'] % 1000) / 1000,))
+        cursor.execute(f"SELECT {column} FROM {table} ORDER BY random() LIMIT %s", (count,))
+        keys = [row[0] for row in cursor.fetchall()]
+    if not keys:
+        raise ValueError(f"Таблица {table} пуста")
+    return keys
+
+def column_indexes(conn, table, column):
+    """Индексы с column первым столбцом: список (имя, определение, ограничение, определение ограничения)"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT i.relname, pg_get_indexdef(x.indexrelid), c.conname, pg_get_constraintdef(c.oid)
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = x.indkey[0]
+            LEFT JOIN pg_constraint c ON c.conindid = x.indexrelid AND c.conrelid = x.indrelid
+            WHERE x.indrelid = %s::regclass AND a.attname = %s
+            ORDER BY i.relname
+        """, (table, column))
+        return cursor.fetchall()
+
+def _index_name(table, column, method):
+    """Имя временного индекса конфигурации (не длиннее 63 символов)"""
+    return f"tp_{table}_{column}_{method}"[:63]
+
+def drop_column_indexes(conn, table, column):
+    """Удаление индексов и ограничений столбца; возвращает их для restore_column_indexes"""
+    saved = column_indexes(conn, table, column)
+    with conn.cursor() as cursor:
+        for name, _, constraint, _ in saved:
+            if constraint:
+                cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT {constraint}")
+            else:
+                cursor.execute(f"DROP INDEX {name}")
+    return saved
+
+def restore_column_indexes(conn, table, saved):
+    """Восстановление индексов и ограничений, удаленных drop_column_indexes"""
+    with conn.cursor() as cursor:
+        for _, definition, constraint, constraint_definition in saved:
+            if constraint:
+                cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {constraint} {constraint_definition}")
+            else:
+                cursor.execute(definition)
+    print(f"Исходные индексы {table} восстановлены: {', '.join(row[0] for row in saved) or 'нет'}")
+
+def create_method_index(conn, table, column, method):
+    """Создание индекса конфигурации; возвращает (имя, размер в байтах)"""
+    name = _index_name(table, column, method)
+    start_time = time.time()
+    with conn.cursor() as cursor:
+        cursor.execute(f"CREATE INDEX {name} ON {table} USING {method} ({column})")
+        cursor.execute(f"ANALYZE {table}")
+        cursor.execute("SELECT pg_relation_size(%s::regclass)", (name,))
+        size = cursor.fetchone()[0]
+    print(f"Индекс {name} создан за {time.time() - start_time:.2f} с, размер {size / 1024 / 1024:.1f} МБ")
+    return name, size
+
+def _client(schema, table, column, keys, seed, start_at, warmup, duration):
+    """Один клиент: подготовленный запрос по случайным ключам до окончания замера
+
+    Возвращает задержки (секунды) запросов, начатых после прогрева.
+    """
+    conn = get_db_connection()
+    conn.autocommit = True
+    generator = random.Random(seed)
+    measured = []
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SET search_path TO {schema}")
+            cursor.execute(f"PREPARE lookup AS SELECT * FROM {table} WHERE {column} = $1")
+            time.sleep(max(start_at - time.time(), 0))
+            now = time.perf_counter()
+            measure_from = now + max(start_at + warmup - time.time(), 0)
+            deadline = measure_from + duration
+            while now < deadline:
+                key = generator.choice(keys)
+                cursor.execute("EXECUTE lookup(%s)", (key,))
+                cursor.fetchall()
+                finished = time.perf_counter()
+                if now >= measure_from:
+                    measured.append(finished - now)
+                now = finished
+    finally:
+        conn.close()
+    return measured
+
+def histogram(latencies):
+    """Гистограмма задержек: список [верхняя граница в мкс (степень двойки), число запросов]"""
+    buckets = {}
+    for latency in latencies:
+        upper = 2 ** max(math.ceil(math.log2(max(latency * 1e6, 1))), 0)
+        buckets[upper] = buckets.get(upper, 0) + 1
+    return [[upper, buckets[upper]] for upper in sorted(buckets)]
+
+def run_clients(schema, table, column, keys, clients, duration, warmup):
+    """Замер одного числа клиентов: пропускная способность, перцентили и гистограмма"""
+    start_at = time.time() + STARTUP_SECONDS + 0.05 * clients
+    latencies = []
+    with ProcessPoolExecutor(max_workers=clients) as executor:
+        futures = [
+            executor.submit(_client, schema, table, column, keys, GENERATION_CONFIG['seed'] + index,
+                            start_at, warmup, duration)
+            for index in range(clients)
+        ]
+        for future in futures:
+            latencies += future.result()
+
+    ordered = sorted(latencies)
+    result = {
+        'clients': clients,
+        'queries': len(ordered),
+        'qps': len(ordered) / duration
+    }
+    for name, fraction in PERCENTILES:
+        result[f"{name}_ms"] = percentile(ordered, fraction) * 1000 if ordered else None
+    result['max_ms'] = ordered[-1] * 1000 if ordered else None
+    result['histogram_us'] = histogram(ordered)
+    return result
+
+def saturation_point(results):
+    """Число клиентов, после которого пропускная способность растет меньше чем на 10%"""
+    for previous, current in zip(results, results[1:]):
+        if current['qps'] < previous['qps'] * SATURATION_GAIN:
+            return previous['clients']
+    return None
+
+def _ms(value):
+    return f"{value:.3f}" if value is not None else '-'
+
+def print_sweep(method, results):
+    """Вывод результатов одной конфигурации индексов"""
+    print(f"{'клиенты':>8} {'запросов/с':>11} {'p50, мс':>9} {'p99, мс':>9} {'p99.9, мс':>10} {'max, мс':>9}")
+    for row in results:
+        print(f"{row['clients']:>8} {row['qps']:>11.0f} {_ms(row['p50_ms']):>9} {_ms(row['p99_ms']):>9} "
+              f"{_ms(row['p999_ms']):>10} {_ms(row['max_ms']):>9}")
+    saturation = saturation_point(results)
+    if saturation:
+        print(f"Насыщение {method}: около {saturation} клиентов")
+
+def benchmark_target(conn, target, methods, clients, duration, warmup, key_count):
+    """Замеры всех конфигураций индексов для одного столбца"""
+    schema, table, column = parse_target(target)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(f"SET search_path TO {schema}")
+    keys = sample_keys(conn, table, column, key_count)
+    configurations = []
+    saved = None
+    try:
+        for method in methods:
+            print(f"=== {target}: {method} ===")
+            configuration = {'method': method, 'index': None, 'index_size': None}
+            if method == 'current':
+                if saved is not None:
+                    restore_column_indexes(conn, table, saved)
+                    saved = None
+                configuration['index'] = ', '.join(row[0] for row in column_indexes(conn, table, column))
+            else:
+                if saved is None:
+                    saved = drop_column_indexes(conn, table, column)
+                configuration['index'], configuration['index_size'] = create_method_index(conn, table, column, method)
+            configuration['results'] = [
+                run_clients(schema, table, column, keys, count, duration, warmup) for count in clients
+            ]
+            configuration['saturation_clients'] = saturation_point(configuration['results'])
+            print_sweep(method, configuration['results'])
+            if method != 'current':
+                with conn.cursor() as cursor:
+                    cursor.execute(f"DROP INDEX {configuration['index']}")
+            configurations.append(configuration)
+    finally:
+        if saved is not None:
+            restore_column_indexes(conn, table, saved)
+    return {
+        'target': target,
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'duration': duration,
+        'warmup': warmup,
+        'keys': len(keys),
+        'configurations': configurations
+    }
+
+def csv_rows(result):
+    """Строки CSV: одна строка на конфигурацию и число клиентов"""
+    for configuration in result['configurations']:
+        for row in configuration['results']:
+            yield {
+                'target': result['target'],
+                'method': configuration['method'],
+                'index': configuration['index'],
+                'index_size': configuration['index_size'],
+                **{key: value for key, value in row.items() if key != 'histogram_us'}
+            }
+
+def write_results(result, output_dir=None, output_format=None):
+    """Запись результата в JSON и/или CSV; возвращает пути к файлам"""
+    name = f"throughput_{result['target'].replace('.', '_')}"
+    return write_output(name, result, csv_rows(result), output_dir, output_format)
+
+def main():
+    parser = argparse.ArgumentParser(description="Пропускная способность точечных запросов при параллельных клиентах")
+    parser.add_argument('targets', nargs='*', default=TARGETS, help="столбцы в виде схема.таблица.столбец")
+    parser.add_argument('--methods', nargs='+', default=METHODS,
+                        help="методы индекса (hash, btree, ...) или current - индексы как есть")
+    parser.add_argument('--clients', nargs='+', type=int, default=BENCHMARK_CONFIG['throughput_clients'],
+                        help="числа параллельных клиентов")
+    parser.add_argument('--duration', type=float, default=BENCHMARK_CONFIG['throughput_duration'],
+                        help="секунд замера на каждое число клиентов")
+    parser.add_argument('--warmup', type=float, default=BENCHMARK_CONFIG['throughput_warmup'],
+                        help="секунд прогрева")
+    parser.add_argument('--keys', type=int, default=BENCHMARK_CONFIG['throughput_keys'],
+                        help="число ключей, выбираемых из таблицы")
+    parser.add_argument('--output-dir', default=BENCHMARK_CONFIG['output_dir'], help="каталог результатов")
+    options = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        for target in options.targets:
+            result = benchmark_target(conn, target, options.methods, options.clients,
+                                      options.duration, options.warmup, options.keys)
+            for output in write_results(result, options.output_dir):
+                print(f"Результаты: {output}")
+    except Exception as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
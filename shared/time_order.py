@@ -0,0 +1,80 @@
+"""
+Порядок строк во времени для генераторов с метками времени
+
+В режиме 'random' метка времени строки выбирается случайно в пределах
+периода, и физический порядок строк с временем не связан: корреляция
+столбца (pg_stats.correlation) около нуля - худший случай для BRIN.
+В режиме 'append' строки идут по возрастанию времени, как при дозаписи
+журнала: строка i из total получает время start + period * i / total,
+к которому добавляется ограниченный разброс +-time_jitter секунд, а доля
+late_fraction строк - "опоздавшие": их время сдвинуто в прошлое на
+случайную величину до late_max_delay секунд.
+
+Параметры задаются в GENERATION_CONFIG и передаются генераторам в args
+задачи загрузки, поэтому входят в ключ кэша наборов (dataset_cache.py).
+"""
+
+import random
+
+from database_config import GENERATION_CONFIG
+from vectorized import np
+
+ORDER_MODES = ['random', 'append']
+
+def time_order(mode=None, late_fraction=None, late_max_delay=None, jitter=None):
+    """Параметры порядка строк: (режим, доля опоздавших, наибольшее опоздание, разброс)"""
+    mode = GENERATION_CONFIG.get('time_order', 'random') if mode is None else mode
+    if mode not in ORDER_MODES:
+        raise ValueError(f"Неизвестный порядок строк {mode}, допустимы: {', '.join(ORDER_MODES)}")
+    return (
+        mode,
+        GENERATION_CONFIG.get('late_fraction', 0.0) if late_fraction is None else late_fraction,
+        GENERATION_CONFIG.get('late_max_delay', 3600) if late_max_delay is None else late_max_delay,
+        GENERATION_CONFIG.get('time_jitter', 0) if jitter is None else jitter
+    )
+
+def is_appended(order):
+    """Строки генерируются по возрастанию времени"""
+    return bool(order) and order[0] == 'append'
+
+def appended_seconds(index, total, period, order):
+    """Смещение от начала периода (секунд) для строки index в режиме append"""
+    _, late_fraction, late_max_delay, jitter = order
+    seconds = period * index / max(total, 1)
+    if jitter:
+        seconds += random.uniform(-jitter, jitter)
+    if late_fraction and random.random() < late_fraction:
+        seconds -= random.uniform(0, late_max_delay)
+    return int(min(max(seconds, 0), period - 1))
+
+def appended_seconds_block(rng, start, count, total, period, order):
+    """Смещения от начала периода (секунд) для строк start..start+count в режиме append (NumPy)"""
+    _, late_fraction, late_max_delay, jitter = order
+    seconds = period * (start + np.arange(count)) / max(total, 1)
+    if jitter:
+        seconds += rng.uniform(-jitter, jitter, count)
+    if late_fraction:
+        late = rng.random(count) < late_fraction
+        seconds -= np.where(late, rng.uniform(0, late_max_delay, count), 0)
+    return np.clip(seconds, 0, period - 1).astype('int64')
+
+def column_correlation(conn, table, column):
+    """Корреляция физического порядка строк со столбцом (pg_stats, после ANALYZE)"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT correlation FROM pg_stats
+            WHERE schemaname = current_schema() AND tablename = %s AND attname = %s
+        """, (table, column))
+        row = cursor.fetchone()
+    conn.commit()
+    return row[0] if row else None
+
+def report_correlation(conn, columns):
+    """Вывод корреляции столбцов [(таблица, столбец), ...]"""
+    order = time_order()
+    print(f"Порядок строк: {order[0]}" + (f", опоздавших {order[1] * 100:g}% (до {order[2]} с), "
+                                          f"разброс +-{order[3]} с" if is_appended(order) else ''))
+    for table, column in columns:
+        correlation = column_correlation(conn, table, column)
+        value = f"{correlation:.4f}" if correlation is not None else 'нет статистики'
+        print(f"  корреляция {table}.{column}: {value}")
@@ -0,0 +1,74 @@
+"""
+Уникальные ключи без повторных попыток
+
+Вместо "случайный код + проверка по множеству использованных" номер строки
+отображается в код перестановкой пространства ключей. Перестановка - сеть
+Фейстеля на ближайшем сверху пространстве из 2^(2k) значений с ключами
+раундов, выведенными из общего seed и имени ключа; значения за пределами
+нужного пространства проходят через сеть повторно (cycle walking), пока не
+попадут в него. Разные номера строк всегда дают разные коды, память не
+растет, а код зависит только от номера строки - поэтому шарды и рабочие
+процессы генерируют непересекающиеся коды без общего состояния.
+
+Коды выглядят как прежние случайные: prefix + width цифр без ведущего нуля
+(ORD123456). Ширина растет на одну цифру при каждом десятикратном росте
+scale_factor, чтобы пространство ключей оставалось с запасом больше таблицы.
+"""
+
+import hashlib
+import math
+
+from database_config import GENERATION_CONFIG
+
+FEISTEL_ROUNDS = 4
+# Нечетная 64-битная константа для перемешивания в функции раунда
+_MIX = 0x9E3779B97F4A7C15
+
+def _round_keys(name, seed):
+    """Ключи раундов сети Фейстеля из seed и имени ключа"""
+    digest = hashlib.sha256(f"{seed}:keys:{name}".encode()).digest()
+    return [int.from_bytes(digest[i * 8:(i + 1) * 8], 'big') for i in range(FEISTEL_ROUNDS)]
+
+def keyed_permutation(domain, name, seed=None):
+    """Биекция [0, domain) -> [0, domain), заданная seed и именем ключа
+
+    Возвращает функцию permute(index). В среднем на значение нужно меньше
+    четырех проходов сети: пространство сети меньше 4 * domain.
+    """
+    if seed is None:
+        seed = GENERATION_CONFIG['seed']
+    half_bits = max((max(domain - 1, 1).bit_length() + 1) // 2, 1)
+    mask = (1 << half_bits) - 1
+    keys = _round_keys(name, seed)
+
+    def permute(index):
+        if not 0 <= index < domain:
+            raise ValueError(f"Номер {index} вне пространства ключей {name} ({domain:,} значений)")
+        value = index
+        while True:
+            left, right = value >> half_bits, value & mask
+            for key in keys:
+                mixed = (((right ^ key) * _MIX) >> 29) & mask
+                left, right = right, left ^ mixed
+            value = (left << half_bits) | right
+            if value < domain:
+                return value
+
+    return permute
+
+def key_width(min_width):
+    """Число цифр кода: min_width при scale_factor <= 1 и +1 на каждый десятикратный рост"""
+    scale = GENERATION_CONFIG.get('scale_factor', 1)
+    if scale <= 1:
+        return min_width
+    return min_width + math.ceil(round(math.log10(scale), 9))
+
+def unique_codes(name, min_width, prefix=''):
+    """Функция index -> уникальный код prefix + цифры (без ведущего нуля)
+
+    index - глобальный номер строки таблицы (а не номер внутри шарда).
+    """
+    width = key_width(min_width)
+    low = 10 ** (width - 1)
+    permute = keyed_permutation(9 * low, name)
+    return lambda index: f"{prefix}{low + permute(index)}"
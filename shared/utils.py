@@ -1,7 +1,19 @@
 import psycopg2
+import itertools
+import json
+import threading
 import time
-from datetime import datetime
-from database_config import DB_CONFIG
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime
+from psycopg2 import pool as pg_pool
+from database_config import DB_CONFIG, GENERATION_CONFIG
+
+# Размер блока, которым psycopg2 читает поток COPY
+COPY_BUFFER_SIZE = 64 * 1024
+# Сколько строк кодируется в текст COPY за один раз
+COPY_ENCODE_ROWS = 1000
 
 def get_db_connection():
     """Создание подключения к БД"""
@@ -12,6 +24,57 @@ def get_db_connection():
         print(f"Ошибка подключения к БД: {e}")
         raise
 
+# Общий пул соединений процесса и семафор, ограничивающий число одновременно занятых соединений
+_connection_pool = None
+_connection_slots = None
+_pool_lock = threading.Lock()
+
+def get_connection_pool():
+    """Общий пул соединений на GENERATION_CONFIG['load_connections'] соединений"""
+    global _connection_pool, _connection_slots
+    with _pool_lock:
+        if _connection_pool is None or _connection_pool.closed:
+            size = max(GENERATION_CONFIG.get('load_connections', 1), 1)
+            _connection_pool = pg_pool.ThreadedConnectionPool(1, size, **DB_CONFIG)
+            _connection_slots = threading.BoundedSemaphore(size)
+        return _connection_pool
+
+@contextmanager
+def pooled_connection(search_path=None):
+    """Соединение из общего пула на время блока with
+
+    Если все соединения заняты, ожидает освобождения (ThreadedConnectionPool
+    в этом случае выбрасывает ошибку, поэтому очередь держит семафор).
+    При успешном выходе транзакция фиксируется, при ошибке - откатывается.
+    """
+    connection_pool = get_connection_pool()
+    with _connection_slots:
+        conn = connection_pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SET search_path TO {search_path or 'public'}")
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            connection_pool.putconn(conn)
+
+def close_connection_pool():
+    """Закрытие всех соединений общего пула"""
+    global _connection_pool
+    with _pool_lock:
+        if _connection_pool is not None and not _connection_pool.closed:
+            _connection_pool.closeall()
+        _connection_pool = None
+
+def current_search_path(conn):
+    """search_path соединения - чтобы соединения из пула работали с той же схемой"""
+    with conn.cursor() as cursor:
+        cursor.execute("SHOW search_path")
+        return cursor.fetchone()[0]
+
 def execute_sql_file(filename, connection):
     """Выполнение SQL файла"""
     try:
@@ -62,4 +125,285 @@ def setup_database():
         
     except Exception as e:
         print(f"Ошибка настройки БД: {e}")
-        raise
\ No newline at end of file
+        raise
+
+def scaled(count):
+    """Размер при текущем масштабе GENERATION_CONFIG['scale_factor']
+
+    Число строк таблиц и диапазоны внешних ключей в скриптах генерации
+    заданы для scale_factor = 1 и пересчитываются этой функцией.
+    """
+    return max(int(round(count * GENERATION_CONFIG.get('scale_factor', 1))), 1)
+
+def progress_interval(rows=None):
+    """Через сколько строк генератор сообщает о прогрессе (rows - интервал при scale_factor = 1)"""
+    return scaled(rows or GENERATION_CONFIG.get('progress_every', 10000))
+
+def copy_batch_rows():
+    """Строк на один COPY и commit: растет с масштабом, но не больше max_copy_batch_size"""
+    return min(scaled(GENERATION_CONFIG.get('copy_batch_size', 50000)),
+               GENERATION_CONFIG.get('max_copy_batch_size', 500000))
+
+def reference_now():
+    """Опорный момент "сейчас" для генераторов данных вместо datetime.now()
+
+    Фиксируется один раз на запуск (или задается через
+    GENERATION_CONFIG['reference_date']), чтобы все шарды и рабочие процессы
+    генерировали даты относительно одного и того же момента. По умолчанию -
+    начало текущих суток: опорная дата входит в ключ кэша наборов данных,
+    и повторные запуски в течение дня используют уже сгенерированные наборы.
+    """
+    value = GENERATION_CONFIG.get('reference_date')
+    if value is None:
+        value = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        GENERATION_CONFIG['reference_date'] = value
+    elif isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value
+
+def _copy_array_literal(values):
+    """Литерал массива PostgreSQL ({"a","b"}) для TEXT[]/NUMERIC[]"""
+    items = []
+    for value in values:
+        if value is None:
+            items.append('NULL')
+        elif isinstance(value, (list, tuple)):
+            items.append(_copy_array_literal(value))
+        elif isinstance(value, bool):
+            items.append('t' if value else 'f')
+        elif isinstance(value, (int, float)):
+            items.append(str(value))
+        else:
+            text = _copy_scalar(value).replace('\\', '\\\\').replace('"', '\\"')
+            items.append(f'"{text}"')
+    return '{' + ','.join(items) + '}'
+
+def _copy_scalar(value):
+    """Строковое представление значения без экранирования формата COPY"""
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return _copy_array_literal(value)
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return str(value)
+
+_COPY_TEXT_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+def copy_text_value(value):
+    """Значение поля для COPY в формате text (NULL -> \\N)"""
+    if value is None:
+        return '\\N'
+    return _copy_scalar(value).translate(_COPY_TEXT_ESCAPES)
+
+def copy_csv_value(value):
+    """Значение поля для COPY в формате csv (NULL -> пустое поле без кавычек)"""
+    if value is None:
+        return ''
+    return '"' + _copy_scalar(value).replace('"', '""') + '"'
+
+def encode_copy_rows(rows, copy_format='text'):
+    """Кодирование пачки кортежей в байты для COPY FROM STDIN"""
+    if copy_format == 'csv':
+        lines = [','.join(map(copy_csv_value, row)) for row in rows]
+    else:
+        lines = ['\t'.join(map(copy_text_value, row)) for row in rows]
+    if not lines:
+        return b''
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+class CopyStream:
+    """Файлоподобный объект для copy_expert поверх итератора байтовых блоков"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+        self._pos = 0
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self._buffer[self._pos:] + b''.join(self._chunks)
+            self._buffer, self._pos = b'', 0
+            self.bytes_read += len(data)
+            return data
+        while self._pos >= len(self._buffer):
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return b''
+            self._pos = 0
+        data = self._buffer[self._pos:self._pos + size]
+        self._pos += len(data)
+        self.bytes_read += len(data)
+        return data
+
+def iter_chunks(rows, size):
+    """Чтение итератора строк пачками фиксированного размера (последняя может быть короче)"""
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def encode_row_blocks(rows, copy_format='text'):
+    """Кодирование строк в блоки COPY по COPY_ENCODE_ROWS: пары (число строк, байты)"""
+    for chunk in iter_chunks(rows, COPY_ENCODE_ROWS):
+        yield len(chunk), encode_copy_rows(chunk, copy_format)
+
+def _group_blocks(blocks, batch_size, max_bytes=None):
+    """Группировка блоков по ~batch_size строк: одна группа - один COPY и один commit
+
+    max_bytes - группа закрывается и по объему данных (блок не делится, так что
+    группа из одного блока может быть больше).
+    """
+    iterator = iter(blocks)
+    for first in iterator:
+        def group(first=first):
+            yield first
+            rows = first[0]
+            size = len(first[1])
+            while rows < batch_size and (max_bytes is None or size < max_bytes):
+                block = next(iterator, None)
+                if block is None:
+                    return
+                rows += block[0]
+                size += len(block[1])
+                yield block
+        yield group()
+
+def _copy_blocks(conn, table, columns, blocks, copy_format):
+    """Один COPY ... FROM STDIN для группы блоков, возвращает (строк, байт)"""
+    counter = [0]
+
+    def payload():
+        for rows, data in blocks:
+            counter[0] += rows
+            yield data
+
+    stream = CopyStream(payload())
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT {copy_format})"
+    with conn.cursor() as cursor:
+        cursor.copy_expert(sql, stream, size=COPY_BUFFER_SIZE)
+    return counter[0], stream.bytes_read
+
+def report_load_stats(stats):
+    """Вывод пропускной способности загрузки таблицы"""
+    seconds = max(stats['seconds'], 1e-9)
+    # Для executemany объем переданных данных не измеряется
+    mb_per_second = (f"{stats['bytes'] / 1024 / 1024 / seconds:.2f} МБ/с"
+                     if stats['bytes'] is not None else "- МБ/с")
+    print(f"{stats['table']}: загружено {stats['rows']:,} строк за {stats['seconds']:.2f} с "
+          f"({stats['rows'] / seconds:,.0f} строк/с, {mb_per_second}, метод {stats['method']})")
+
+def _finish_load(table, total_rows, total_bytes, start_time, method):
+    """Статистика загрузки таблицы (с выводом, если включено логирование)"""
+    stats = {
+        'table': table,
+        'rows': total_rows,
+        'bytes': total_bytes,
+        'seconds': time.time() - start_time,
+        'method': method
+    }
+    if GENERATION_CONFIG.get('log_progress', True):
+        report_load_stats(stats)
+    return stats
+
+def _insert_load(conn, table, columns, rows, batch_size):
+    """Старый путь загрузки через executemany (для сравнения с COPY)"""
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    total_rows = 0
+    with conn.cursor() as cursor:
+        for batch in iter_chunks(rows, batch_size):
+            cursor.executemany(sql, batch)
+            conn.commit()
+            total_rows += len(batch)
+    return total_rows
+
+def bulk_load_blocks(conn, table, columns, blocks, copy_format=None, batch_size=None):
+    """Загрузка уже закодированных блоков COPY (пары (число строк, байты))
+
+    Блоки группируются примерно по batch_size строк, каждая группа уходит
+    отдельным COPY и фиксируется. Возвращает словарь со статистикой загрузки.
+    """
+    copy_format = copy_format or GENERATION_CONFIG.get('copy_format', 'text')
+    batch_size = batch_size or copy_batch_rows()
+    if copy_format not in ('text', 'csv'):
+        raise ValueError(f"Неизвестный формат COPY: {copy_format}")
+
+    start_time = time.time()
+    total_rows = 0
+    total_bytes = 0
+    for group in _group_blocks(blocks, batch_size):
+        group_rows, group_bytes = _copy_blocks(conn, table, columns, group, copy_format)
+        conn.commit()
+        total_rows += group_rows
+        total_bytes += group_bytes
+        if GENERATION_CONFIG.get('log_progress', True):
+            print(f"Загружено {total_rows:,} строк в {table}")
+    return _finish_load(table, total_rows, total_bytes, start_time, 'copy')
+
+def bulk_load_blocks_parallel(table, columns, blocks, search_path=None, connections=None,
+                              copy_format=None, batch_size=None):
+    """Загрузка блоков COPY одной таблицы по нескольким соединениям из общего пула
+
+    Группы по ~batch_size строк, но не больше
+    GENERATION_CONFIG['parallel_copy_bytes'] байт, раздаются потокам, каждая
+    группа - отдельный COPY и commit на своем соединении. Группа передается
+    потоку целиком, поэтому вперед набирается не больше 2 * connections групп:
+    в памяти не больше 2 * connections * parallel_copy_bytes (или блоков, если
+    блок больше), даже если генерация быстрее загрузки.
+    Физический порядок строк в таблице при этом не сохраняется.
+    """
+    copy_format = copy_format or GENERATION_CONFIG.get('copy_format', 'text')
+    batch_size = batch_size or copy_batch_rows()
+    connections = connections or GENERATION_CONFIG.get('load_connections', 1)
+    if copy_format not in ('text', 'csv'):
+        raise ValueError(f"Неизвестный формат COPY: {copy_format}")
+
+    def load_group(group):
+        with pooled_connection(search_path) as conn:
+            return _copy_blocks(conn, table, columns, group, copy_format)
+
+    start_time = time.time()
+    total_rows = 0
+    total_bytes = 0
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        pending = deque()
+        groups = _group_blocks(blocks, batch_size, GENERATION_CONFIG.get('parallel_copy_bytes', 4 * 1024 ** 2))
+        while True:
+            group = next(groups, None)
+            if group is not None:
+                pending.append(executor.submit(load_group, list(group)))
+            if pending and (group is None or len(pending) >= connections * 2):
+                group_rows, group_bytes = pending.popleft().result()
+                total_rows += group_rows
+                total_bytes += group_bytes
+                if GENERATION_CONFIG.get('log_progress', True):
+                    print(f"Загружено {total_rows:,} строк в {table}")
+            elif group is None:
+                break
+    return _finish_load(table, total_rows, total_bytes, start_time, f'copy x{connections}')
+
+def bulk_load(conn, table, columns, rows, copy_format=None, method=None, batch_size=None):
+    """Загрузка строк в таблицу через COPY ... FROM STDIN
+
+    rows - любой итерируемый объект кортежей в порядке columns, в том числе
+    ленивый генератор: строки читаются пачками по batch_size, каждая пачка
+    уходит отдельным COPY и фиксируется, поэтому память не растет с объемом.
+    copy_format: 'text' или 'csv' (по умолчанию из GENERATION_CONFIG).
+    method: 'copy' или 'insert' - старый путь через executemany для сравнения.
+    Возвращает словарь со статистикой загрузки.
+    """
+    copy_format = copy_format or GENERATION_CONFIG.get('copy_format', 'text')
+    method = method or GENERATION_CONFIG.get('load_method', 'copy')
+
+    if method == 'insert':
+        start_time = time.time()
+        total_rows = _insert_load(conn, table, columns, rows, GENERATION_CONFIG['batch_size'])
+        return _finish_load(table, total_rows, None, start_time, method)
+    return bulk_load_blocks(conn, table, columns, encode_row_blocks(rows, copy_format),
+                            copy_format, batch_size)
\ No newline at end of file
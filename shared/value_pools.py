@@ -0,0 +1,97 @@
+"""
+Пулы заранее сгенерированных значений Faker
+
+Большая часть времени генерации уходит на вызовы Faker, хотя значения
+(имена, компании, города, user agent, IP, слова) все равно сильно
+повторяются. Пул - это N различных значений одного провайдера Faker,
+сгенерированных один раз и сохраненных на диск (gzip + JSON) с ключом
+(провайдер, локаль, seed, размер). Генераторы берут из пула значения по
+индексу - равномерно или с перекосом к началу пула.
+
+Размер пула задает кардинальность столбца, поэтому он настраивается
+отдельно для каждого провайдера (GENERATION_CONFIG['pool_sizes']), чтобы
+эксперименты с селективностью индексов оставались осмысленными.
+"""
+
+import gzip
+import json
+import os
+import random
+
+from faker import Faker
+from database_config import GENERATION_CONFIG
+
+# Пулы, уже загруженные в текущем процессе
+_loaded_pools = {}
+
+def pool_size(provider):
+    """Размер пула (кардинальность) для провайдера из настроек"""
+    sizes = GENERATION_CONFIG.get('pool_sizes', {})
+    return sizes.get(provider, sizes.get('default', 10000))
+
+def pool_path(provider, size, locale, seed):
+    """Путь к файлу пула в кэше"""
+    directory = os.path.join(GENERATION_CONFIG['cache_dir'], 'pools')
+    return os.path.join(directory, f"{provider}-{locale}-{seed}-{size}.json.gz")
+
+def _generate_pool(provider, size, locale, seed):
+    """Генерация size различных значений провайдера Faker"""
+    fake = Faker(locale)
+    fake.seed_instance(seed)
+    method = getattr(fake, provider)
+    values = []
+    seen = set()
+    attempts = 0
+    # У некоторых провайдеров (города, слова) различных значений меньше size
+    while len(values) < size and attempts < size * 20:
+        value = method()
+        attempts += 1
+        if value not in seen:
+            seen.add(value)
+            values.append(value)
+    if len(values) < size:
+        print(f"Пул {provider}: получено только {len(values)} различных значений из {size}")
+    return values
+
+def load_pool(provider, size=None, locale=None, seed=None):
+    """Пул различных значений провайдера Faker (из кэша на диске или сгенерированный)"""
+    size = size or pool_size(provider)
+    locale = locale or GENERATION_CONFIG.get('faker_locale', 'en_US')
+    seed = GENERATION_CONFIG['seed'] if seed is None else seed
+    key = (provider, size, locale, seed)
+    if key in _loaded_pools:
+        return _loaded_pools[key]
+
+    path = pool_path(provider, size, locale, seed)
+    if os.path.exists(path):
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            values = json.load(file)
+    else:
+        values = _generate_pool(provider, size, locale, seed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись через временный файл: пул могут одновременно создавать несколько процессов
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as file:
+            json.dump(values, file)
+        os.replace(tmp_path, path)
+
+    _loaded_pools[key] = values
+    return values
+
+def pool_sampler(provider, size=None, skew=None):
+    """Функция без аргументов, возвращающая случайное значение из пула
+
+    skew - показатель перекоса: None или 1 - равномерный выбор, > 1 - индекс
+    берется как N * u ** skew, и значения в начале пула встречаются чаще.
+    По умолчанию берется из GENERATION_CONFIG['pool_skew'].
+    Случайность берется из модуля random, поэтому выбор воспроизводим
+    при том же seed шарда.
+    """
+    values = load_pool(provider, size)
+    if skew is None:
+        skew = GENERATION_CONFIG.get('pool_skew', {}).get(provider)
+    count = len(values)
+    rand = random.random
+    if not skew or skew == 1:
+        return lambda: values[int(rand() * count)]
+    return lambda: values[int(count * rand() ** skew)]
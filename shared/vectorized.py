@@ -0,0 +1,86 @@
+"""
+Векторизованная генерация данных на NumPy
+
+Числовые и временные столбцы генерируются целыми блоками (по умолчанию
+GENERATION_CONFIG['vector_block_size'] = 100k строк) в виде массивов NumPy,
+форматируются в строки векторно и сразу кодируются в поток COPY.
+Каждый блок получает свой генератор случайных чисел с seed-ом, выведенным
+так же, как для шардов, поэтому данные воспроизводимы.
+
+Значения, которые формируют блочные генераторы, не должны содержать
+табуляций, переводов строк, обратных слэшей и кавычек: это числа, даты и
+значения из фиксированных справочников, поэтому экранирование не выполняется.
+"""
+
+from functools import reduce
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен: без него используется обычный генератор
+    np = None
+
+from database_config import GENERATION_CONFIG
+from sharding import iter_shards, seed_generators, shard_seed
+
+def numpy_available():
+    """Доступен ли векторизованный бэкенд"""
+    return np is not None
+
+def use_vectorized():
+    """Включен ли векторизованный бэкенд в настройках и установлен ли NumPy"""
+    return GENERATION_CONFIG.get('backend', 'numpy') == 'numpy' and numpy_available()
+
+def choice(rng, values, size):
+    """Случайный выбор из справочника, результат - массив строк"""
+    values = np.asarray(values)
+    return values[rng.integers(0, len(values), size)]
+
+def concat(*parts):
+    """Поэлементная склейка строковых массивов и строк"""
+    return reduce(np.char.add, [np.asarray(part, dtype=str) for part in parts])
+
+def fmt_float(values, decimals):
+    """Округление и перевод в строки (формат, понятный NUMERIC)"""
+    return np.round(values, decimals).astype(str)
+
+def fmt_int(values):
+    """Перевод целых в строки"""
+    return np.asarray(values).astype(str)
+
+def fmt_bool(values):
+    """Логические значения в формате PostgreSQL"""
+    return np.where(values, 't', 'f')
+
+def fmt_timestamp(values):
+    """datetime64 -> 'YYYY-MM-DDTHH:MM:SS'"""
+    return np.datetime_as_string(values, unit='s')
+
+def fmt_date(values):
+    """datetime64 -> 'YYYY-MM-DD'"""
+    return np.datetime_as_string(values, unit='D')
+
+def encode_columns(columns, copy_format='text'):
+    """Кодирование блока строковых столбцов в байты COPY"""
+    if copy_format == 'csv':
+        columns = [concat('"', column, '"') for column in columns]
+        separator = ','
+    else:
+        separator = '\t'
+    lines = map(separator.join, zip(*[column.tolist() for column in columns]))
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+def iter_vector_blocks(block_generator, num_records, args=(), copy_format=None, block_size=None):
+    """Генерация таблицы блоками: пары (число строк, байты COPY) для bulk_load_blocks
+
+    block_generator(rng, count, start, *args) возвращает список строковых
+    массивов NumPy - по одному на столбец таблицы.
+    """
+    copy_format = copy_format or GENERATION_CONFIG.get('copy_format', 'text')
+    block_size = block_size or GENERATION_CONFIG.get('vector_block_size', 100000)
+    for index, start, count in iter_shards(num_records, block_size):
+        seed = shard_seed(block_generator.__name__, index)
+        # Faker тоже инициализируется: блочные генераторы могут брать из него справочники
+        seed_generators(seed)
+        rng = np.random.default_rng(seed)
+        columns = block_generator(rng, count, start, *args)
+        yield count, encode_columns(columns, copy_format)
@@ -0,0 +1,315 @@
+"""
+Параметризованная нагрузка: шаблоны запросов с параметрами из загруженных данных
+
+Запросы 03/05 используют фиксированные литералы (например, даты 2023 года),
+а генераторы строят даты относительно текущего дня, поэтому такие условия
+могут не находить ни одной строки. Здесь каждый запрос - шаблон с
+параметрами %(имя)s, значения которых выбираются из данных самой таблицы:
+существующие ключи, интервалы, начинающиеся со значения реальной строки,
+элементы массивов, которые действительно встречаются в таблице.
+
+Шаблон выполняется как подготовленный запрос (PREPARE/EXECUTE) с
+BENCHMARK_CONFIG['workload_iterations'] наборами параметров; для него
+выводятся распределение задержек (p50, p90, p99, p99.9, максимум,
+гистограмма) и число возвращенных строк, в том числе доля пустых
+результатов - чтобы было видно, не измеряется ли пустой просмотр.
+
+Пример:
+    python shared/workload.py 6_BRIN
+    python shared/workload.py 2_Hash 5_GIN --iterations 5000
+"""
+
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from database_config import BENCHMARK_CONFIG, GENERATION_CONFIG
+from utils import get_db_connection
+from benchmark import percentile, write_output
+from compare import STUDIES
+from throughput import histogram
+
+PARAMETER = re.compile(r'%\((\w+)\)s')
+PERCENTILES = [('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p999', 0.999)]
+
+def _sample_rows(cursor, table, expressions, sample_size, condition=None):
+    """Случайные строки таблицы (значения выражений), повторяемые для seed"""
+    where = f"WHERE {condition}" if condition else ''
+    cursor.execute("SELECT setseed(%s)", ((GENERATION_CONFIG['seed'] % 1000) / 1000,))
+    cursor.execute(f"SELECT {', '.join(expressions)} FROM {table} {where} ORDER BY random() LIMIT %s",
+                   (sample_size,))
+    rows = cursor.fetchall()
+    if not rows:
+        raise ValueError(f"В таблице {table} нет строк для выбора параметров")
+    return rows
+
+def existing(table, expressions, names=None):
+    """Значения выражений (столбцов) одной случайной существующей строки
+
+    names - имена параметров (по умолчанию сами выражения).
+    """
+    names = names or expressions
+
+    def prepare(cursor, rng, sample_size):
+        condition = ' AND '.join(f"({expression}) IS NOT NULL" for expression in expressions)
+        rows = _sample_rows(cursor, table, expressions, sample_size, condition)
+        return lambda: dict(zip(names, rng.choice(rows)))
+
+    return prepare
+
+def window(table, column, span, names=('start', 'end')):
+    """Интервал [значение существующей строки, значение + span]"""
+
+    def prepare(cursor, rng, sample_size):
+        values = [row[0] for row in _sample_rows(cursor, table, [column], sample_size, f"{column} IS NOT NULL")]
+        width = Decimal(str(span)) if isinstance(values[0], Decimal) else span
+
+        def draw():
+            start = rng.choice(values)
+            return {names[0]: start, names[1]: start + width}
+
+        return draw
+
+    return prepare
+
+def element(table, column, name):
+    """Элемент массива column, встречающийся в существующих строках"""
+
+    def prepare(cursor, rng, sample_size):
+        cursor.execute("SELECT setseed(%s)", ((GENERATION_CONFIG['seed'] % 1000) / 1000,))
+        cursor.execute(f"""
+            SELECT DISTINCT unnest({column})
+            FROM (SELECT {column} FROM {table} ORDER BY random() LIMIT %s) sample
+        """, (sample_size,))
+        values = sorted(row[0] for row in cursor.fetchall() if row[0] is not None)
+        if not values:
+            raise ValueError(f"В {table}.{column} нет элементов для выбора параметров")
+        return lambda: {name: rng.choice(values)}
+
+    return prepare
+
+# Шаблоны по исследованиям: схема и запросы с генераторами параметров
+WORKLOADS = {
+    '1_B-tree': {'schema': 'Btree', 'queries': [
+        {'id': 'age_range', 'title': 'Пользователи в диапазоне возраста',
+         'sql': "SELECT username, age, salary FROM users WHERE age BETWEEN %(low)s AND %(high)s "
+                "ORDER BY age LIMIT 100",
+         'params': [window('users', 'age', 2, ('low', 'high'))]},
+        {'id': 'orders_by_date', 'title': 'Заказы за неделю',
+         'sql': "SELECT id, user_id, amount FROM orders WHERE order_date BETWEEN %(start)s AND %(end)s "
+                "ORDER BY order_date LIMIT 100",
+         'params': [window('orders', 'order_date', timedelta(days=7))]},
+        {'id': 'user_orders', 'title': 'Заказы пользователя по дате',
+         'sql': "SELECT order_date, amount, status FROM orders WHERE user_id = %(user_id)s ORDER BY order_date",
+         'params': [existing('orders', ['user_id'])]}
+    ]},
+    '2_Hash': {'schema': 'Hash', 'queries': [
+        {'id': 'product_code', 'title': 'Продукт по коду',
+         'sql': "SELECT * FROM products WHERE product_code = %(product_code)s",
+         'params': [existing('products', ['product_code'])]},
+        {'id': 'session_id', 'title': 'Сессия по идентификатору',
+         'sql': "SELECT * FROM user_sessions WHERE session_id = %(session_id)s",
+         'params': [existing('user_sessions', ['session_id'])]},
+        {'id': 'config_key', 'title': 'Параметр конфигурации по ключу',
+         'sql': "SELECT config_value FROM config WHERE config_key = %(config_key)s",
+         'params': [existing('config', ['config_key'])]}
+    ]},
+    '3_GiST': {'schema': 'GiST', 'queries': [
+        {'id': 'event_overlap', 'title': 'События, пересекающиеся с периодом существующего события',
+         'sql': "SELECT event_name, event_period FROM events WHERE event_period && %(period)s "
+                "ORDER BY lower(event_period) LIMIT 10",
+         'params': [existing('events', ['event_period'], ['period'])]},
+        {'id': 'document_tag', 'title': 'Документы с тегом',
+         'sql': "SELECT title, tags FROM documents WHERE tags && ARRAY[%(tag)s]::text[] LIMIT 10",
+         'params': [element('documents', 'tags', 'tag')]}
+    ]},
+    '4_SP-GiST': {'schema': 'SPGiST', 'queries': [
+        {'id': 'nearest_points', 'title': 'Ближайшие соседи существующей точки',
+         'sql': "SELECT data_point, category FROM multidimensional_data "
+                "ORDER BY data_point <-> %(point)s::point LIMIT 10",
+         'params': [existing('multidimensional_data', ['data_point'], ['point'])]},
+        {'id': 'word_prefix', 'title': 'Слова по префиксу существующего слова',
+         'sql': "SELECT word, frequency FROM text_data WHERE word LIKE %(prefix)s::text || '%' "
+                "ORDER BY frequency DESC LIMIT 10",
+         'params': [existing('text_data', ['left(word, 3)'], ['prefix'])]}
+    ]},
+    '5_GIN': {'schema': 'GIN', 'queries': [
+        {'id': 'product_tag', 'title': 'Продукты с тегом из products.tags',
+         'sql': "SELECT name, tags FROM products WHERE tags @> ARRAY[%(tag)s]::text[] ORDER BY name LIMIT 10",
+         'params': [element('products', 'tags', 'tag')]},
+        {'id': 'product_category', 'title': 'Продукты с категорией из products.categories',
+         'sql': "SELECT name, categories FROM products WHERE categories && ARRAY[%(category)s]::text[] LIMIT 10",
+         'params': [element('products', 'categories', 'category')]},
+        {'id': 'profile_gender', 'title': 'Профили по значению вложенного JSONB',
+         'sql': "SELECT username FROM user_profiles "
+                "WHERE profile_data @> jsonb_build_object('personal', jsonb_build_object('gender', %(gender)s::text)) "
+                "LIMIT 10",
+         'params': [existing('user_profiles', ["profile_data->'personal'->>'gender'"], ['gender'])]},
+        {'id': 'log_tag_level', 'title': 'Логи по тегу и уровню',
+         'sql': "SELECT log_level, message FROM log_entries "
+                "WHERE tags && ARRAY[%(tag)s]::text[] AND log_level = %(level)s ORDER BY created_at DESC LIMIT 10",
+         'params': [existing('log_entries', ['tags[1]', 'log_level'], ['tag', 'level'])]}
+    ]},
+    '6_BRIN': {'schema': 'BRIN', 'queries': [
+        {'id': 'time_series_month', 'title': 'Временной ряд датчиков типа за месяц',
+         'sql': "SELECT sensor_id, measurement_time, value FROM time_series_data "
+                "WHERE measurement_time BETWEEN %(start)s AND %(end)s AND sensor_type = %(sensor_type)s "
+                "ORDER BY measurement_time LIMIT 100",
+         'params': [window('time_series_data', 'measurement_time', timedelta(days=30)),
+                    existing('time_series_data', ['sensor_type'])]},
+        {'id': 'access_errors_week', 'title': 'Ошибки доступа за неделю',
+         'sql': "SELECT user_id, access_time, resource_path, status_code FROM access_logs "
+                "WHERE access_time BETWEEN %(start)s AND %(end)s AND status_code >= 400 "
+                "ORDER BY access_time DESC LIMIT 100",
+         'params': [window('access_logs', 'access_time', timedelta(days=7))]},
+        {'id': 'transactions_quarter', 'title': 'Транзакции по дням за квартал',
+         'sql': "SELECT transaction_date, COUNT(*), SUM(amount) FROM financial_transactions "
+                "WHERE transaction_date BETWEEN %(start)s AND %(end)s GROUP BY transaction_date "
+                "ORDER BY transaction_date",
+         'params': [window('financial_transactions', 'transaction_date', timedelta(days=90))]},
+        {'id': 'metrics_week', 'title': 'Высокая загрузка CPU за неделю',
+         'sql': "SELECT server_id, metric_time, cpu_usage FROM system_metrics "
+                "WHERE metric_time BETWEEN %(start)s AND %(end)s AND cpu_usage > 80 "
+                "ORDER BY metric_time, server_id LIMIT 100",
+         'params': [window('system_metrics', 'metric_time', timedelta(days=7))]}
+    ]},
+    '7_Bloom': {'schema': 'Bloom', 'queries': [
+        {'id': 'security_event', 'title': 'Логи безопасности по трем атрибутам существующей записи',
+         'sql': "SELECT event_type, user_id, success FROM security_logs "
+                "WHERE event_type = %(event_type)s AND device_type = %(device_type)s AND browser = %(browser)s "
+                "LIMIT 100",
+         'params': [existing('security_logs', ['event_type', 'device_type', 'browser'])]},
+        {'id': 'product_attributes', 'title': 'Продукты по бренду, категории и цвету',
+         'sql': "SELECT product_code, name, price FROM products "
+                "WHERE brand = %(brand)s AND category = %(category)s AND color = %(color)s LIMIT 100",
+         'params': [existing('products', ['brand', 'category', 'color'])]},
+        {'id': 'inventory_location', 'title': 'Инвентарь на складе по коду места',
+         'sql': "SELECT sku, quantity FROM inventory "
+                "WHERE warehouse_id = %(warehouse_id)s AND location_code = %(location_code)s LIMIT 100",
+         'params': [existing('inventory', ['warehouse_id', 'location_code'])]}
+    ]}
+}
+
+def prepared_sql(sql):
+    """Шаблон с %(имя)s -> (текст с $1, $2, ..., порядок имен параметров)"""
+    names = []
+
+    def replace(match):
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return f"${names.index(match.group(1)) + 1}"
+
+    return PARAMETER.sub(replace, sql), names
+
+def run_template(cursor, template, iterations, warmup, sample_size):
+    """Выполнение шаблона с наборами параметров; возвращает статистику задержек и строк"""
+    rng = random.Random(f"{GENERATION_CONFIG['seed']}:{template['id']}")
+    draws = [prepare(cursor, rng, sample_size) for prepare in template['params']]
+    sql, names = prepared_sql(template['sql'])
+    cursor.execute("DEALLOCATE ALL")
+    cursor.execute(f"PREPARE workload_query AS {sql}")
+    execute = f"EXECUTE workload_query({', '.join(['%s'] * len(names))})"
+
+    latencies = []
+    row_counts = []
+    for iteration in range(warmup + iterations):
+        params = {}
+        for draw in draws:
+            params.update(draw())
+        start = time.perf_counter()
+        cursor.execute(execute, [params[name] for name in names])
+        rows = cursor.fetchall()
+        elapsed = time.perf_counter() - start
+        if iteration >= warmup:
+            latencies.append(elapsed)
+            row_counts.append(len(rows))
+
+    ordered = sorted(latencies)
+    result = {
+        'id': template['id'],
+        'title': template['title'],
+        'sql': template['sql'],
+        'iterations': iterations,
+        'mean_ms': statistics.mean(ordered) * 1000,
+        'max_ms': ordered[-1] * 1000
+    }
+    for name, fraction in PERCENTILES:
+        result[f"{name}_ms"] = percentile(ordered, fraction) * 1000
+    result['rows_mean'] = statistics.mean(row_counts)
+    result['empty_fraction'] = row_counts.count(0) / len(row_counts)
+    result['histogram_us'] = histogram(ordered)
+    return result
+
+def run_workload(conn, study, iterations=None, warmup=None, sample_size=None, template_ids=None):
+    """Все (или указанные) шаблоны исследования"""
+    workload = WORKLOADS[study]
+    iterations = iterations or BENCHMARK_CONFIG['workload_iterations']
+    warmup = BENCHMARK_CONFIG['workload_warmup'] if warmup is None else warmup
+    sample_size = sample_size or BENCHMARK_CONFIG['workload_sample']
+    conn.autocommit = True
+    results = []
+    with conn.cursor() as cursor:
+        cursor.execute(f"SET search_path TO {workload['schema']}")
+        for template in workload['queries']:
+            if template_ids and template['id'] not in template_ids:
+                continue
+            result = run_template(cursor, template, iterations, warmup, sample_size)
+            print(f"{result['id']:<22} p50 {result['p50_ms']:>8.3f} мс  p90 {result['p90_ms']:>8.3f}  "
+                  f"p99 {result['p99_ms']:>8.3f}  p99.9 {result['p999_ms']:>8.3f}  max {result['max_ms']:>8.3f}  "
+                  f"строк {result['rows_mean']:>6.1f}, пустых {result['empty_fraction'] * 100:.0f}%")
+            results.append(result)
+        cursor.execute("DEALLOCATE ALL")
+    return {
+        'study': study,
+        'schema': workload['schema'],
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'iterations': iterations,
+        'warmup': warmup,
+        'queries': results
+    }
+
+def csv_rows(result):
+    """Строки CSV: одна на шаблон"""
+    for query in result['queries']:
+        yield {'study': result['study'],
+               **{key: value for key, value in query.items() if key not in ('sql', 'histogram_us')}}
+
+def main():
+    parser = argparse.ArgumentParser(description="Параметризованная нагрузка с параметрами из загруженных данных")
+    parser.add_argument('studies', nargs='*', default=STUDIES, help="каталоги исследований")
+    parser.add_argument('--queries', nargs='*', help="идентификаторы шаблонов (по умолчанию все)")
+    parser.add_argument('--iterations', type=int, default=BENCHMARK_CONFIG['workload_iterations'],
+                        help="наборов параметров на шаблон")
+    parser.add_argument('--warmup', type=int, default=BENCHMARK_CONFIG['workload_warmup'],
+                        help="прогревочных выполнений шаблона")
+    parser.add_argument('--sample', type=int, default=BENCHMARK_CONFIG['workload_sample'],
+                        help="строк таблицы, из которых выбираются параметры")
+    parser.add_argument('--output-dir', default=BENCHMARK_CONFIG['output_dir'], help="каталог результатов")
+    options = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        for study in options.studies:
+            study = os.path.basename(os.path.normpath(study))
+            if study not in WORKLOADS:
+                print(f"{study}: шаблоны нагрузки не заданы, пропуск")
+                continue
+            print(f"=== {study} ===")
+            result = run_workload(conn, study, options.iterations, options.warmup, options.sample,
+                                  options.queries)
+            for output in write_output(f"workload_{study}", result, csv_rows(result), options.output_dir):
+                print(f"Результаты: {output}")
+    except Exception as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()